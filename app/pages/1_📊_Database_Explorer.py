@@ -17,9 +17,11 @@ ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
 sys.path.append(ROOT_DIR)
 
 import db_chembl
-import db_chembl.utils as db_chembl_utils
+import db_chembl.target_index as db_chembl_target_index
 import db_mg_fragments
 import db_mg_fragments.handlers.mols as db_mgf_mols_handlers
+import db_mg_fragments.handlers.targets as db_mgf_targets_handlers
+import db_mg_fragments.importer as db_mgf_importer
 
 ss = st.session_state
 sb = st.sidebar
@@ -35,31 +37,23 @@ def import_mol_by_targets_from_chem_db(target_id_list: list[str]) -> None:
     Args:
         target_id_list (list[str]): list of target IDs to import mols for
     """
-    db_chembl_connection = db_chembl.get_db_connection()
-    mgf_db_connection = db_mg_fragments.get_db_connection()
-    for i, target_id in enumerate(target_id_list, start=1):
-        st.toast(
-            f"Importing mols associated to target {target_id} from ChemDB to MGF DB"
-        )
-        for mol in db_chembl_utils.get_mols_from_target_id(
-            db_chembl_connection, target_id
-        ):
-            db_mgf_mols_handlers.insert(mgf_db_connection, mol)
-            st.toast(
-                f"Target ID: {target_id} [{i}/{len(target_id_list)}] \
-                - Inserted mol: {mol['chembl_id']}"
-            )
-    db_chembl_connection.close()
-    mgf_db_connection.close()
+    st.toast(
+        f"Importing mols associated to {len(target_id_list)} targets from ChemDB to MGF DB"
+    )
+    for item in db_mgf_importer.import_targets(target_id_list):
+        if "log" in item:
+            st.toast(item["log"])
     st.info("All mols imported from ChemDB to MGF DB")
 
 
 st.set_page_config(page_title="DB Explorer", page_icon="📊", layout="wide")
 st.title("📊 Database Explorer")
 
-action = sb.selectbox("Actions", ["Import target", "Remove Target"])
+action = sb.selectbox(
+    "Actions", ["Import target", "Remove Target", "Parse stored molecules"]
+)
 with st.expander("DB MGF Available Target IDs", expanded=True):
-    st.table(ss.db_mgf_target_id_list)
+    st.table(db_mgf_targets_handlers.get_all())
 
 if action == "Import target":
     st.subheader("Import target from CHEMBL DB")
@@ -74,20 +68,32 @@ if action == "Import target":
             except Exception as e:
                 st.error(f"Error retrieving target IDs: {e}")
 
+    if not os.path.exists(db_chembl.TARGET_INDEX_DB_PATH):
+        if st.button("Build CHEMBL target index", icon="⚡"):
+            with st.spinner("Building target index"):
+                try:
+                    db_chembl_target_index.build()
+                    st.success("Target index built successfully.")
+                except Exception as e:
+                    st.error(f"Error building target index: {e}")
+
     if ss.db_chembl_target_id_list:
-        selected_target_id = st.selectbox(
-            "Available Target IDs", [""] + ss.db_chembl_target_id_list
+        selected_target_id_list = st.multiselect(
+            "Available Target IDs", ss.db_chembl_target_id_list
         )
-        if selected_target_id != "":
-            if st.button(f"Import Target {selected_target_id}"):
-                with st.spinner("Importing Target"):
+        if selected_target_id_list:
+            selected_target_ids = ", ".join(selected_target_id_list)
+            if st.button(f"Import Targets {selected_target_ids}"):
+                with st.spinner("Importing Targets"):
                     try:
-                        import_mol_by_targets_from_chem_db([selected_target_id])
+                        import_mol_by_targets_from_chem_db(selected_target_id_list)
                         st.success(
-                            f"Target ID {selected_target_id} imported successfully."
+                            f"Target IDs {selected_target_ids} imported successfully."
                         )
                     except Exception as e:
-                        st.error(f"Error importing target ID {selected_target_id}: {e}")
+                        st.error(
+                            f"Error importing target IDs {selected_target_ids}: {e}"
+                        )
 
 if ss.db_mgf_target_id_list and action == "Remove Target":
     st.subheader("Remove Target from DB MGF")
@@ -103,7 +109,25 @@ if ss.db_mgf_target_id_list and action == "Remove Target":
                     db_mgf_mols_handlers.remove_by_target_id(
                         connection, selected_target_id
                     )
-                    connection.close()
+                    db_mg_fragments.close_db_connection(connection)
                     st.success(f"Target ID {selected_target_id} removed successfully.")
                 except Exception as e:
                     st.error(f"Error removing target ID {selected_target_id}: {e}")
+
+if action == "Parse stored molecules":
+    st.subheader("Parse the molecules imported before the parsed columns")
+
+    connection = db_mg_fragments.get_db_connection()
+    n_unparsed = db_mgf_mols_handlers.count_unparsed(connection)
+    db_mg_fragments.close_db_connection(connection)
+    if not n_unparsed:
+        st.info("All the stored molecules are parsed.")
+    elif st.button(f"Parse {n_unparsed} molecules", icon="⚙️"):
+        with st.spinner("Parsing molecules"):
+            try:
+                for item in db_mgf_importer.backfill_parsed_mols():
+                    if "log" in item:
+                        st.toast(item["log"])
+                st.success(f"{n_unparsed} molecules parsed successfully.")
+            except Exception as e:
+                st.error(f"Error parsing molecules: {e}")
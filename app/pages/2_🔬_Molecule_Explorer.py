@@ -8,8 +8,10 @@ generate fragments, and perform clustering on the fragments.
 import json
 import os
 import sys
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
+from typing import Optional
 
+import numpy as np
 import pandas as pd
 import streamlit as st
 from rdkit.Chem import Draw, Mol
@@ -18,6 +20,7 @@ ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
 sys.path.append(ROOT_DIR)
 
 import db_mg_fragments.handlers.mols as db_mgf_mols_handler
+import db_mg_fragments.handlers.targets as db_mgf_targets_handler
 import settings
 from chem import clustering as chem_clustering
 from chem import filters as chem_filters
@@ -30,6 +33,154 @@ class MoleculeData(db_mgf_mols_handler.Molecule):
     """Molecule data class."""
 
     mol: Mol
+    parent_smiles: str
+    parent_mol: Mol
+    reactive_hits: Optional[np.ndarray] = None
+
+
+def load_mol(pickle: bytes | None, smiles: str) -> Mol:
+    """Load a molecule from its stored RDKit pickle, parsing the SMILES when missing.
+
+    Args:
+        pickle (bytes | None): RDKit binary pickle of the molecule.
+        smiles (str): SMILES of the molecule.
+
+    Returns:
+        Mol: RDKit molecule object
+    """
+    if pickle is not None:
+        return chem_utils.mol_from_pickle(pickle)
+    return chem_utils.mol_from_smiles(smiles)
+
+
+@st.cache_resource(
+    max_entries=settings.EXPLORER_CACHE_MAX_TARGETS,
+    show_spinner="Loading target molecules...",
+)
+def load_target_mols(target_id: str, target_version: tuple) -> tuple[MoleculeData, ...]:
+    """Load the molecules of a target, cached across reruns and sessions.
+
+    The cached molecules are shared, so they must not be modified.
+
+    Args:
+        target_id (str): Target ID.
+        target_version (tuple): `db_mg_fragments.handlers.targets.get_version()`,
+            only part of the cache key, so that inserting or deleting molecules of
+            the target invalidates the cached molecules.
+
+    Returns:
+        tuple[MoleculeData, ...]: Molecules of the target.
+    """
+    target_mols_data = []
+    for data in db_mgf_mols_handler.get_by_target(target_id):
+        smiles = data["canonical_smiles"]
+        # rows imported before the parsed columns existed have them empty
+        parent_smiles = data["parent_smiles"]
+        if parent_smiles is None:
+            parent_smiles = chem_utils.remove_counterions_from_smiles(smiles)
+        target_mols_data.append(
+            MoleculeData(
+                target_id=data["target_id"],
+                chembl_id=data["chembl_id"],
+                canonical_smiles=smiles,
+                mol=load_mol(data["mol_pickle"], smiles),
+                parent_smiles=parent_smiles,
+                parent_mol=load_mol(data["parent_mol_pickle"], parent_smiles),
+            )
+        )
+    return tuple(target_mols_data)
+
+
+@st.cache_resource(max_entries=settings.EXPLORER_CACHE_MAX_TARGETS)
+def get_reactive_pattern_set(
+    reactive_pattern_hash: str,
+    _reactive_pattern_list: list[chem_filters.ReactivePattern],
+) -> chem_filters.ReactivePatternSet:
+    """Compile the reactive patterns once per content hash.
+
+    Args:
+        reactive_pattern_hash (str): Hash of the reactive patterns, keying the cache
+            in place of the unhashed pattern list.
+        _reactive_pattern_list (list[ReactivePattern]): Reactive patterns.
+
+    Returns:
+        ReactivePatternSet: Compiled reactive patterns.
+    """
+    return chem_filters.ReactivePatternSet(_reactive_pattern_list)
+
+
+@st.cache_resource(
+    max_entries=settings.EXPLORER_CACHE_MAX_TARGETS,
+    show_spinner="Screening reactive patterns...",
+)
+def get_target_hit_matrix(
+    target_id: str,
+    target_version: tuple,
+    reactive_pattern_hash: str,
+    _reactive_pattern_set: chem_filters.ReactivePatternSet,
+) -> np.ndarray:
+    """Match the reactive patterns against the target molecules, cached.
+
+    The hits are read from the molecule store, the unscreened molecules being
+    screened from their stored pickles over a process pool.
+
+    Args:
+        target_id (str): Target ID.
+        target_version (tuple): `db_mg_fragments.handlers.targets.get_version()`.
+        reactive_pattern_hash (str): Hash of the reactive patterns.
+        _reactive_pattern_set (ReactivePatternSet): Compiled reactive patterns.
+
+    Returns:
+        np.ndarray: Boolean (molecules x patterns) hit matrix.
+    """
+    target_mols_data = load_target_mols(target_id, target_version)
+    for item in chem_filters.stored_hit_matrix(
+        target_id,
+        [mol_data.chembl_id for mol_data in target_mols_data],
+        _reactive_pattern_set,
+    ):
+        if "result" in item:
+            return item["result"]
+
+
+@st.cache_resource(
+    max_entries=2 * settings.EXPLORER_CACHE_MAX_TARGETS,
+    show_spinner="Filtering reactive molecules...",
+)
+def filter_target_mols(
+    target_id: str,
+    target_version: tuple,
+    reactive_pattern_hash: str,
+    reactive: bool,
+    _reactive_pattern_set: chem_filters.ReactivePatternSet,
+) -> tuple[MoleculeData, ...]:
+    """Filter the target molecules by reactivity and strip their counterions, cached.
+
+    Args:
+        target_id (str): Target ID.
+        target_version (tuple): `db_mg_fragments.handlers.targets.get_version()`.
+        reactive_pattern_hash (str): Hash of the reactive patterns.
+        reactive (bool): Keep the reactive molecules if True, the others if False.
+        _reactive_pattern_set (ReactivePatternSet): Compiled reactive patterns.
+
+    Returns:
+        tuple[MoleculeData, ...]: Filtered molecules, holding their parent molecule
+            and their row of the hit matrix.
+    """
+    hits = get_target_hit_matrix(
+        target_id, target_version, reactive_pattern_hash, _reactive_pattern_set
+    )
+    is_reactive = hits.any(axis=1)
+    return tuple(
+        replace(
+            mol_data,
+            canonical_smiles=mol_data.parent_smiles,
+            mol=mol_data.parent_mol,
+            reactive_hits=hits[k],
+        )
+        for k, mol_data in enumerate(load_target_mols(target_id, target_version))
+        if is_reactive[k] == reactive
+    )
 
 
 # --- setup ---
@@ -51,6 +202,14 @@ if "selected_target_id_idx" not in ss:
     ss.selected_target_id_idx = 0
 if "fragment_flexibility" not in ss:
     ss.fragment_flexibility = None
+if "fragment_pool" not in ss:
+    ss.fragment_pool = None
+if "fragment_pool_filter" not in ss:
+    ss.fragment_pool_filter = None
+if "fragment_pool_options" not in ss:
+    ss.fragment_pool_options = None
+if "fragment_indices" not in ss:
+    ss.fragment_indices = None
 if "frag_mol_list_filtered" not in ss:
     ss.frag_mol_list_filtered = None
 if "cluster_labels" not in ss:
@@ -63,6 +222,8 @@ def selected_target_id_on_change():
     """On change of the selected target ID, reset the filtered molecules and fragments."""
     ss.target_mols_data = None
     ss.target_mols_data_filtered = None
+    ss.fragment_pool = None
+    ss.fragment_indices = None
     ss.frag_mol_list_filtered = None
     ss.cluster_labels = None
     ss.centroids = None
@@ -71,6 +232,8 @@ def selected_target_id_on_change():
 def reactive_toggle_on_change():
     """On change of the reactive toggle, reset the filtered molecules and fragments."""
     ss.target_mols_data_filtered = None
+    ss.fragment_pool = None
+    ss.fragment_indices = None
     ss.frag_mol_list_filtered = None
     ss.cluster_labels = None
     ss.centroids = None
@@ -101,18 +264,8 @@ ss.selected_target_id = st.sidebar.selectbox(
 )
 
 if ss.selected_target_id:
-    # st.toast(f"Selected target ID: {ss.selected_target_id}", icon="🔄")
-    # if ss.target_mols_data is None:
-    ss.target_mols_data = []
-    for data in db_mgf_mols_handler.get_by_target(ss.selected_target_id):
-        ss.target_mols_data.append(
-            MoleculeData(
-                target_id=data["target_id"],
-                chembl_id=data["chembl_id"],
-                canonical_smiles=data["canonical_smiles"],
-                mol=chem_utils.mol_from_smiles(data["canonical_smiles"]),
-            )
-        )
+    target_version = db_mgf_targets_handler.get_version(ss.selected_target_id)
+    ss.target_mols_data = load_target_mols(ss.selected_target_id, target_version)
 
     total_molecule_num = st.sidebar.write(
         f"Total molecule: `{len(ss.target_mols_data)}`"
@@ -186,20 +339,19 @@ if ss.target_mols_data:
     ss.reactive_toggle = st.toggle(
         "Molecule reactive", value=False, on_change=reactive_toggle_on_change
     )
-    ss.target_mols_data_filtered = [
-        mol_data
-        for mol_data in ss.target_mols_data
-        if chem_filters.mol_reactive(
-            mol_data.mol, reactive_pattern_list=ss.reactive_pattern_list
-        )
-        is ss.reactive_toggle
-    ]
-    # remove counterions
-    for mol_data in ss.target_mols_data_filtered:
-        mol_data.canonical_smiles = chem_utils.remove_counterions_from_smiles(
-            mol_data.canonical_smiles
-        )
-        mol_data.mol = chem_utils.mol_from_smiles(mol_data.canonical_smiles)
+    reactive_pattern_hash = chem_filters.reactive_pattern_list_hash(
+        ss.reactive_pattern_list
+    )
+    reactive_pattern_set = get_reactive_pattern_set(
+        reactive_pattern_hash, ss.reactive_pattern_list
+    )
+    ss.target_mols_data_filtered = filter_target_mols(
+        ss.selected_target_id,
+        target_version,
+        reactive_pattern_hash,
+        ss.reactive_toggle,
+        reactive_pattern_set,
+    )
     st.sidebar.write(f"Filtered molecules: `{len(ss.target_mols_data_filtered)}`")
     c1, c2, _ = st.columns([1, 1, 4])
     with c1:
@@ -222,16 +374,14 @@ if ss.target_mols_data:
                         with desc_col:
                             if expose_patterns:
                                 filters = []
-                                for pattern in ss.reactive_pattern_list:
-                                    if mol_data.mol.HasSubstructMatch(pattern.mol):
-                                        res = "✅"
-                                    else:
-                                        res = "❌"
+                                for pattern, found in zip(
+                                    reactive_pattern_set, mol_data.reactive_hits
+                                ):
                                     filters.append(
                                         {
                                             "pattern": pattern.name,
                                             "smarts": f"`{pattern.smarts}`",
-                                            "found": res,
+                                            "found": "✅" if found else "❌",
                                         }
                                     )
                                 st.table(filters)
@@ -247,6 +397,23 @@ if ss.target_mols_data_filtered:
     st.subheader("2. Fragments generation", divider=True)
 
     with st.expander("Fragment generation settings", expanded=False):
+        brics_min_size = st.number_input(
+            "BRICS minimum fragment size", min_value=1, step=1, value=1
+        )
+        brics_max_size = st.number_input(
+            "BRICS maximum fragment size (0 for no maximum)",
+            min_value=0,
+            step=1,
+            value=0,
+        )
+        brics_max_bonds = st.number_input(
+            "BRICS maximum bonds of a full decomposition (0 for no maximum)",
+            min_value=0,
+            step=1,
+            value=settings.FRAGMENTS_MAX_BRICS_BONDS or 0,
+            help="Molecules with more BRICS bonds are decomposed in a single pass, "
+            "breaking each bond on its own, which gives larger fragments.",
+        )
         fragment_min_dim = st.number_input(
             "Fragment minimum num atoms", min_value=1, step=1, value=12
         )
@@ -268,28 +435,60 @@ if ss.target_mols_data_filtered:
             disabled=ss.fragment_flexibility != chem_filters.Flexibility.FLEXIBLE,
         )
 
+    # the flexibility selects the candidate fragments in SQL, through the index of
+    # the fragments store, and the size thresholds only mask the pooled candidates
+    candidate_filter = chem_fragments.FragmentFilter(
+        flexibility=ss.fragment_flexibility,
+        max_rotable_bonds=fragment_max_num_rot_bonds,
+    )
     c1, c2, _ = st.columns([1, 1, 4])
     show_fragments = False
     with c1:
-        if st.button("Generate fragments", icon="▶️"):
-            with st.spinner("Generating fragments..."):
-                frag_list = set()
-                for mol_data in ss.target_mols_data_filtered:
-                    for bric in chem_fragments.brics_from_mol(mol_data.mol):
-                        frag_list.add(bric)
-                ss.frag_mol_list_filtered = [
-                    frag_mol
-                    for frag_mol in [
-                        chem_fragments.MolFromSmiles(frag) for frag in frag_list
-                    ]
-                    if chem_filters.mol_dimension_range(
-                        frag_mol, fragment_min_dim, fragment_max_dim
-                    )
-                    if chem_filters.mol_flexibility(
-                        frag_mol, ss.fragment_flexibility, fragment_max_num_rot_bonds
-                    )
-                ]
-                st.toast("Fragments generated", icon="🎉")
+        generate_fragments = st.button("Generate fragments", icon="▶️")
+    if generate_fragments:
+        ss.fragment_pool_options = {
+            "min_size": brics_min_size,
+            "max_size": brics_max_size,
+            "max_bonds": brics_max_bonds or None,
+        }
+    if generate_fragments or (
+        ss.fragment_pool is not None and ss.fragment_pool_filter != candidate_filter
+    ):
+        with st.spinner("Generating fragments..."):
+            for item in chem_fragments.stored_fragment_pool(
+                [
+                    (mol_data.parent_smiles, mol_data.mol)
+                    for mol_data in ss.target_mols_data_filtered
+                ],
+                fragment_filter=candidate_filter,
+                **ss.fragment_pool_options,
+            ):
+                if "log" in item:
+                    st.toast(item["log"])
+                elif "result" in item:
+                    ss.fragment_pool = item["result"]
+                    ss.fragment_pool_filter = candidate_filter
+                    ss.fragment_indices = None
+            st.toast("Fragments generated", icon="🎉")
+
+    # the pool is only masked again when the settings change, and the clusters
+    # are reset only when the surviving fragments change
+    if ss.fragment_pool is not None:
+        fragment_filter = chem_fragments.FragmentFilter(
+            min_atoms=fragment_min_dim,
+            max_atoms=fragment_max_dim,
+            flexibility=ss.fragment_flexibility,
+            max_rotable_bonds=fragment_max_num_rot_bonds,
+        )
+        fragment_indices = np.flatnonzero(ss.fragment_pool.mask(fragment_filter))
+        if ss.fragment_indices is None or not np.array_equal(
+            fragment_indices, ss.fragment_indices
+        ):
+            ss.fragment_indices = fragment_indices
+            ss.frag_mol_list_filtered = ss.fragment_pool.mols(fragment_indices)
+            ss.cluster_labels = None
+            ss.centroids = None
+
     with c2:
         if ss.frag_mol_list_filtered:
             show_fragments = st.button("Show fragments", icon="🔍")
@@ -298,11 +497,38 @@ if ss.target_mols_data_filtered:
         st.sidebar.write(f"Generated fragments: `{len(ss.frag_mol_list_filtered)}`")
 
     if ss.frag_mol_list_filtered and show_fragments:
+        fragment_smiles = [ss.fragment_pool.smiles[k] for k in ss.fragment_indices]
+        fragment_hits = None
+        if expose_patterns:
+            for item in chem_filters.stored_fragment_hit_matrix(
+                fragment_smiles, reactive_pattern_set
+            ):
+                if "log" in item:
+                    st.toast(item["log"])
+                elif "result" in item:
+                    fragment_hits = item["result"]
         with st.spinner("Generating fragments images..."):
             with st.expander("Generated fragments images", expanded=True):
-                for frag_mol in ss.frag_mol_list_filtered:
+                for k, frag_mol in enumerate(ss.frag_mol_list_filtered):
                     try:
-                        st.image(Draw.MolToImage(frag_mol))
+                        img_col, desc_col = st.columns([1, 1])
+                        with img_col:
+                            st.image(Draw.MolToImage(frag_mol))
+                            st.write("SMILES: ", f"`{fragment_smiles[k]}`")
+                        with desc_col:
+                            if fragment_hits is not None:
+                                filters = []
+                                for pattern, found in zip(
+                                    reactive_pattern_set, fragment_hits[k]
+                                ):
+                                    filters.append(
+                                        {
+                                            "pattern": pattern.name,
+                                            "smarts": f"`{pattern.smarts}`",
+                                            "found": "✅" if found else "❌",
+                                        }
+                                    )
+                                st.table(filters)
                     except Exception as e:
                         st.error(f"Error generating image: {e}")
 
@@ -323,10 +549,16 @@ if ss.frag_mol_list_filtered:
             from chem.clustering import mcs as clustering_type_module
         elif clustering_type == chem_clustering.ClusteringType.TANIMOTO.value:
             from chem.clustering import tanimoto as clustering_type_module
+        elif clustering_type == chem_clustering.ClusteringType.BUTINA.value:
+            from chem.clustering import butina as clustering_type_module
 
+        if clustering_type == chem_clustering.ClusteringType.BUTINA.value:
+            cluster_method_list = [chem_clustering.ClusteringMethod.DIST]
+        else:
+            cluster_method_list = list(chem_clustering.ClusteringMethod)
         cluster_method = st.selectbox(
             "Cluster method",
-            [clust_method.value for clust_method in chem_clustering.ClusteringMethod],
+            [clust_method.value for clust_method in cluster_method_list],
             index=None,
             placeholder="Select cluster method",
         )
@@ -341,6 +573,17 @@ if ss.frag_mol_list_filtered:
         else:
             t = None
 
+        clustering_kwargs = {}
+        if clustering_type == chem_clustering.ClusteringType.MCS.value:
+            clustering_kwargs["linkage_method"] = st.selectbox(
+                "Linkage method",
+                ["ward", *clustering_type_module.EXACT_PRUNING_LINKAGES],
+                help=(
+                    "With a cluster threshold, complete and single linkage skip the MCS "
+                    "searches of the pairs bound to be farther apart, with the same clusters."
+                ),
+            )
+
         st.toggle("Sanitize molecules", value=False, key="sanitize_molecules")
 
     if clustering_type_module and cluster_method:
@@ -355,19 +598,23 @@ if ss.frag_mol_list_filtered:
                 frag_mol_list_filtered = ss.frag_mol_list_filtered
             with st.spinner("Generating clusters..."):
                 for item in clustering_type_module.hierarchical_clustering(
-                    frag_mol_list_filtered, cluster_method, t
+                    frag_mol_list_filtered, cluster_method, t, **clustering_kwargs
                 ):
                     if "log" in item:
                         st.toast(item["log"])
                     elif "result" in item:
                         ss.cluster_labels = item["result"]
+                        # the context, e.g. the distance matrix, can be large, so it is
+                        # kept only until the centroids are found
+                        cluster_context = item.get("context", {})
                 for item in clustering_type_module.find_cluster_centroids(
-                    frag_mol_list_filtered, ss.cluster_labels
+                    frag_mol_list_filtered, ss.cluster_labels, **cluster_context
                 ):
                     if "log" in item:
                         st.toast(item["log"])
                     elif "result" in item:
                         ss.centroids = item["result"]
+                del cluster_context
                 st.toast("Prepared clustering results", icon="🎉")
     if ss.cluster_labels is not None:
         st.toast(
@@ -0,0 +1,63 @@
+"""Benchmark of the Tanimoto cluster centroids against the previous per-cluster loop."""
+
+import time
+import tracemalloc
+
+import numpy as np
+import pytest
+from scipy.spatial.distance import euclidean
+
+from chem.clustering import tanimoto
+
+
+def loop_medoids(fingerprints, cluster_labels) -> dict:
+    """Select the medoid index of each cluster one cluster at a time, as the clustering page used to."""
+    medoids = {}
+    for cluster_id in set(cluster_labels):
+        cluster_indices = [
+            i for i, label in enumerate(cluster_labels) if label == cluster_id
+        ]
+        fp_matrix = np.array([fingerprints[i] for i in cluster_indices])
+        centroid_vector = np.mean(fp_matrix, axis=0)
+        distances = [euclidean(fp, centroid_vector) for fp in fp_matrix]
+        medoids[cluster_id] = cluster_indices[np.argmin(distances)]
+    return medoids
+
+
+@pytest.mark.parametrize("n, n_clusters", [(1000, 50), (10000, 300)])
+def test_fingerprint_medoids(mgf_db, make_molecules, n, n_clusters):
+    fp_matrix = tanimoto.get_fingerprint_matrix(make_molecules(n))
+    fingerprints = tanimoto._fingerprints_from_matrix(fp_matrix)
+    cluster_labels = np.random.default_rng(0).integers(1, n_clusters + 1, n)
+
+    start = time.perf_counter()
+    expected = loop_medoids(fingerprints, cluster_labels)
+    loop_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    labels, medoid_indices = tanimoto.fingerprint_medoids(fp_matrix, cluster_labels)
+    vectorized_seconds = time.perf_counter() - start
+
+    print(
+        f"\n{n} fragments / {n_clusters} clusters: per-cluster loop {loop_seconds:.2f}s"
+        f" -> vectorized {vectorized_seconds:.3f}s"
+    )
+    assert dict(zip(labels, medoid_indices)) == expected
+
+
+@pytest.mark.parametrize("n_clusters", [30000, 20000, 6])
+def test_fingerprint_medoids_memory(mgf_db, make_molecules, n_clusters):
+    fp_matrix = tanimoto.get_fingerprint_matrix(make_molecules(30000))
+    cluster_labels = np.random.default_rng(0).permutation(30000) % n_clusters
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    tanimoto.fingerprint_medoids(fp_matrix, cluster_labels)
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(
+        f"\n30000 fragments / {n_clusters} clusters: {seconds:.2f}s,"
+        f" peak {peak / 2**20:.0f} MiB"
+    )
@@ -0,0 +1,74 @@
+"""Benchmark of the pooled fragments database connections against a connection per call."""
+
+import sqlite3
+import time
+
+import pytest
+
+import db_mg_fragments
+import db_mg_fragments.handlers.mols as db_mgf_mols_handlers
+
+N_CALLS = 500
+
+
+@pytest.fixture
+def mols_table(mgf_db):
+    """Fill the 'mols' table with 20 targets of 1000 molecules."""
+    connection = db_mg_fragments.get_db_connection()
+    mols = (
+        {
+            "target_id": f"CHEMBL{target}",
+            "chembl_id": f"CHEMBL{100000 + k}",
+            "canonical_smiles": "c1ccccc1" + "C" * (k % 10),
+        }
+        for target in range(20)
+        for k in range(1000)
+    )
+    for _ in db_mgf_mols_handlers.insert_many(connection, mols):
+        pass
+    db_mg_fragments.close_db_connection(connection)
+
+
+def per_call_connection():
+    """Open a connection as the database module did before the pool."""
+    connection = sqlite3.connect(db_mg_fragments.DB_PATH)
+    connection.row_factory = sqlite3.Row
+    return connection
+
+
+def time_calls(function) -> float:
+    """Get the mean time of a call in milliseconds."""
+    start = time.perf_counter()
+    for _ in range(N_CALLS):
+        function()
+    return (time.perf_counter() - start) / N_CALLS * 1000
+
+
+def test_connection_latency(mols_table):
+    def select_per_call():
+        connection = per_call_connection()
+        connection.execute("SELECT 1").fetchone()
+        connection.close()
+
+    def select_pooled():
+        connection = db_mg_fragments.get_db_connection()
+        connection.execute("SELECT 1").fetchone()
+        db_mg_fragments.close_db_connection(connection)
+
+    def target_per_call():
+        connection = per_call_connection()
+        rows = connection.execute(
+            "SELECT * FROM mols WHERE target_id = ?", ("CHEMBL7",)
+        ).fetchall()
+        connection.close()
+        assert len(rows) == 1000
+
+    def target_pooled():
+        assert len(list(db_mgf_mols_handlers.get_by_target("CHEMBL7"))) == 1000
+
+    print(
+        f"\nconnect + SELECT 1 + close: {time_calls(select_per_call):.3f} ms"
+        f" -> pooled {time_calls(select_pooled):.3f} ms"
+        f"\nget_by_target (1000 rows): {time_calls(target_per_call):.2f} ms"
+        f" -> pooled {time_calls(target_pooled):.2f} ms"
+    )
@@ -0,0 +1,38 @@
+"""Benchmark of linking the condensed Tanimoto distances against the square matrix."""
+
+import time
+
+import numpy as np
+import pytest
+import scipy.cluster.hierarchy as sch
+from scipy.spatial.distance import squareform
+
+from chem.clustering import tanimoto
+from chem.clustering.distance import condensed_linkage
+
+
+@pytest.mark.filterwarnings("ignore::scipy.cluster.hierarchy.ClusterWarning")
+@pytest.mark.parametrize("n", [1000, 2000])
+def test_condensed_linkage(mgf_db, make_molecules, n):
+    fingerprints = tanimoto.get_fingerprints(make_molecules(n))
+    condensed = tanimoto.condensed_tanimoto_distance(fingerprints)
+    square = squareform(condensed)
+
+    # linkage takes the rows of a square matrix as observation vectors
+    start = time.perf_counter()
+    square_labels = sch.fcluster(
+        sch.linkage(square, method="average"), criterion="distance", t=0.85
+    )
+    square_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    labels = sch.fcluster(
+        condensed_linkage(condensed, method="average"), criterion="distance", t=0.85
+    )
+    condensed_seconds = time.perf_counter() - start
+
+    print(
+        f"\n{n} fragments: square matrix {square_seconds:.2f}s,"
+        f" {len(np.unique(square_labels))} clusters"
+        f" -> condensed {condensed_seconds:.2f}s, {len(np.unique(labels))} clusters"
+    )
@@ -0,0 +1,55 @@
+"""Benchmark of the pairwise Tanimoto distances against the previous per-pair loop."""
+
+import time
+
+import numpy as np
+import pytest
+from rdkit.DataStructs.cDataStructs import TanimotoSimilarity
+from scipy.spatial.distance import squareform
+
+from chem.clustering import tanimoto
+
+
+def loop_tanimoto_distance(fingerprints) -> np.ndarray:
+    """Build the square distance matrix pair by pair, as the clustering page used to."""
+    n_mols = len(fingerprints)
+    sim_matrix = np.zeros((n_mols, n_mols))
+    for i in range(n_mols):
+        for j in range(i + 1, n_mols):
+            sim = TanimotoSimilarity(fingerprints[i], fingerprints[j])
+            sim_matrix[i, j] = sim
+            sim_matrix[j, i] = sim
+    return 1 - sim_matrix
+
+
+@pytest.mark.parametrize("n", [1000, 5000])
+def test_condensed_tanimoto_distance(mgf_db, make_molecules, n):
+    fingerprints = tanimoto.get_fingerprints(make_molecules(n))
+
+    start = time.perf_counter()
+    square = loop_tanimoto_distance(fingerprints)
+    loop_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    condensed = tanimoto.condensed_tanimoto_distance(fingerprints)
+    bulk_seconds = time.perf_counter() - start
+
+    print(
+        f"\n{n} fragments: per-pair loop {loop_seconds:.2f}s"
+        f" -> bulk rows {bulk_seconds:.2f}s (x{loop_seconds / bulk_seconds:.0f})"
+    )
+    np.testing.assert_array_equal(condensed, squareform(square, checks=False))
+
+
+def test_condensed_tanimoto_distance_20k(mgf_db, make_molecules):
+    fingerprints = tanimoto.get_fingerprints(make_molecules(20000))
+
+    start = time.perf_counter()
+    condensed = tanimoto.condensed_tanimoto_distance(fingerprints)
+    seconds = time.perf_counter() - start
+
+    # the square float64 matrix of the loop would take 3.2 GB
+    print(
+        f"\n20000 fragments: bulk rows {seconds:.2f}s, {condensed.nbytes / 1e9:.1f} GB"
+    )
+    assert len(condensed) == 20000 * 19999 // 2
@@ -0,0 +1,56 @@
+"""Shared fixtures of the benchmarks.
+
+The benchmarks are not collected by the test run, run them one file at a time
+with the output shown, e.g. `python -m pytest -q -s benchmarks/bench_tanimoto_distance.py`.
+"""
+
+import itertools
+import os
+import random
+import sys
+
+import pytest
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(ROOT_DIR)
+
+from rdkit.Chem import MolFromSmiles, MolToSmiles
+
+from tests.conftest import mgf_db  # noqa: F401
+
+CORES = [
+    "c1cc({1})c({2})cc1{0}",
+    "c1nc({1})c({2})cc1{0}",
+    "c1cc({1})c2cc({2})ccc2c1{0}",
+    "C1CC({1})CN(C1{2}){0}",
+    "c1c({1})sc({2})c1{0}",
+    "C1CN({1})CCC1({2}){0}",
+    "c1cc({1})n({2})c1{0}",
+    "O=C(N{0})c1cc({1})cc({2})c1",
+]
+SUBSTITUENTS = [
+    "[H]", "C", "CC", "O", "OC", "N", "NC", "F", "Cl", "Br", "C#N", "C(F)(F)F",
+    "C(=O)O", "C(=O)N", "S(=O)(=O)N", "CCO", "C9CC9", "c9ccccc9", "N9CCOCC9", "OCC(C)C",
+]  # fmt: skip
+
+
+@pytest.fixture(scope="session")
+def make_molecules():
+    """Get a function building n distinct drug-like molecules, always the same for a given n."""
+
+    def make(n: int) -> list:
+        combinations = list(
+            itertools.product(range(len(CORES)), *[range(len(SUBSTITUENTS))] * 3)
+        )
+        random.Random(0).shuffle(combinations)
+        molecules = {}
+        for core, *substituents in combinations:
+            mol = MolFromSmiles(
+                CORES[core].format(*[SUBSTITUENTS[i] for i in substituents])
+            )
+            molecules.setdefault(MolToSmiles(mol), mol)
+            if len(molecules) == n:
+                break
+        return list(molecules.values())
+
+    return make
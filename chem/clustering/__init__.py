@@ -15,6 +15,7 @@ class ClusteringType(Enum):
 
     MCS = "Maximum Common Substructure (MCS)"
     TANIMOTO = "Tanimoto Similarity"
+    BUTINA = "Taylor-Butina (Tanimoto Similarity)"
 
 
 __all__ = [
@@ -0,0 +1,153 @@
+"""Taylor-Butina (sphere exclusion) clustering of RDKit molecules using Tanimoto similarity.
+
+The neighbor lists of each molecule are built from blocks of pairs of the upper
+triangle with `BulkTanimotoSimilarity`, keeping only the neighbors within the
+distance threshold, so the full distance matrix is never held in memory.
+The molecules with the most neighbors are selected as cluster centroids and
+their unassigned neighbors become the members of the cluster.
+The module exposes the same generator protocol as the hierarchical clustering modules.
+"""
+
+from typing import Generator
+
+import numpy as np
+from rdkit.Chem import Mol
+from rdkit.DataStructs.cDataStructs import BulkTanimotoSimilarity, ExplicitBitVect
+
+from . import ClusteringMethod
+from .distance import iter_pair_blocks
+from .tanimoto import get_fingerprints
+
+
+def neighbor_lists(
+    fingerprints: list[ExplicitBitVect], t: float, block_pairs: int = 2**20
+) -> Generator[dict[str, str | list[np.ndarray]], None, None]:
+    """Compute the neighbors within Tanimoto distance t of each fingerprint, with logging.
+
+    The pairs (i, j) with i < j are processed in row-major blocks of the upper
+    triangle, see `iter_pair_blocks`, so each similarity is computed once; only the
+    pairs within the threshold are kept, and then mirrored. As in RDKit's Butina
+    clustering, two fingerprints are neighbors when their distance 1 - similarity
+    is at most t.
+
+    Args:
+        fingerprints (list[ExplicitBitVect]): List of fingerprints.
+        t (float): Tanimoto distance threshold.
+        block_pairs (int): Target number of pairs computed in a single block.
+
+    Yields:
+        dict: `{"log": str}` progress messages and a final `{"result": list[np.ndarray]}`
+            with the sorted indices of the neighbors of each fingerprint, itself excluded.
+    """
+    n = len(fingerprints)
+    pair_rows = [np.zeros(0, dtype=np.int64)]
+    pair_cols = [np.zeros(0, dtype=np.int64)]
+    next_log = 0.1
+    for rows, cols in iter_pair_blocks(n, block_pairs):
+        block_sims = []
+        for i in range(rows[0], rows[-1] + 1):
+            next_i = i + 1
+            block_sims.append(
+                BulkTanimotoSimilarity(fingerprints[i], fingerprints[next_i:])
+            )
+        close = 1 - np.concatenate(block_sims) <= t
+        pair_rows.append(rows[close])
+        pair_cols.append(cols[close])
+        done = rows[-1] + 1
+        if done / n >= next_log:
+            yield {"log": f"⏳ Neighbor lists computed: {done}/{n}"}
+            next_log = done / n + 0.1
+    yield {"log": f"⏳ Neighbor lists computed: {n}/{n}"}
+
+    rows = np.concatenate(pair_rows + pair_cols)
+    cols = np.concatenate(pair_cols + pair_rows)
+    order = np.lexsort((cols, rows))
+    splits = np.cumsum(np.bincount(rows, minlength=n))[:-1]
+    neighbors = np.split(cols[order].astype(np.int32), splits) if n else []
+    yield {"result": neighbors}
+
+
+def butina_clusters(neighbors: list[np.ndarray]) -> tuple[np.ndarray, np.ndarray]:
+    """Assign the Taylor-Butina clusters from the neighbor lists.
+
+    Args:
+        neighbors (list[np.ndarray]): Indices of the neighbors of each molecule.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Cluster label of each molecule (starting from 1)
+            and index of the centroid of each cluster (in label order).
+    """
+    n = len(neighbors)
+    counts = np.array([len(neighbor) for neighbor in neighbors], dtype=np.int64)
+    labels = np.zeros(n, dtype=np.int32)
+    centroid_indices = []
+    for i in np.argsort(-counts, kind="stable"):
+        if labels[i]:
+            continue
+        centroid_indices.append(i)
+        members = neighbors[i][labels[neighbors[i]] == 0]
+        labels[i] = len(centroid_indices)
+        labels[members] = len(centroid_indices)
+    return labels, np.array(centroid_indices, dtype=np.int64)
+
+
+def hierarchical_clustering(
+    mol_list: list[Mol], cluster_method: str, t: None | int | float
+) -> Generator[dict[str, str | dict], None, None]:
+    """Cluster molecules with the Taylor-Butina algorithm, with logging.
+
+    The name matches the other clustering modules, so that the callers can use them
+    interchangeably. Only the distance method is supported, with t as Tanimoto
+    distance threshold.
+    """
+    if cluster_method != ClusteringMethod.DIST.value:
+        raise ValueError("Butina clustering supports only the distance method")
+
+    yield {"log": "🔍 Generating fingerprints..."}
+    fingerprints = get_fingerprints(mol_list)
+
+    yield {"log": "🧮 Computing neighbor lists..."}
+    for item in neighbor_lists(fingerprints, t):
+        if "log" in item:
+            yield item
+        elif "result" in item:
+            neighbors = item["result"]
+
+    yield {"log": "🔗 Assigning Butina clusters..."}
+    cluster_labels, centroid_indices = butina_clusters(neighbors)
+
+    yield {
+        "result": cluster_labels,
+        "context": {"centroid_indices": centroid_indices},
+    }
+
+
+def find_cluster_centroids(
+    mol_list: list[Mol],
+    cluster_labels,
+    centroid_indices: None | np.ndarray = None,
+) -> Generator[dict[str, str | dict], None, None]:
+    """Find the centroid of each cluster, yielding logs.
+
+    The centroids are the ones selected by `hierarchical_clustering`; without them,
+    the member with the most neighbors in its cluster is selected.
+    """
+    yield {"log": "📍 Finding cluster centroids..."}
+    cluster_labels = np.asarray(cluster_labels)
+    if centroid_indices is None:
+        fingerprints = get_fingerprints(mol_list)
+        centroid_indices = []
+        for cluster_id in np.unique(cluster_labels):
+            cluster_indices = np.flatnonzero(cluster_labels == cluster_id)
+            cluster_fingerprints = [fingerprints[i] for i in cluster_indices]
+            sim_sums = [
+                sum(BulkTanimotoSimilarity(fingerprints[i], cluster_fingerprints))
+                for i in cluster_indices
+            ]
+            centroid_indices.append(cluster_indices[np.argmax(sim_sums)])
+
+    centroids = {
+        cluster_labels[idx]: mol_list[idx] for idx in np.asarray(centroid_indices)
+    }
+    yield {"log": f"✅ {len(centroids)} cluster centroids selected."}
+    yield {"result": centroids}
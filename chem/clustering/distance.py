@@ -0,0 +1,140 @@
+"""Helpers to work with condensed distance vectors.
+
+A condensed distance vector stores the upper triangle (without the diagonal)
+of a symmetric n x n distance matrix, in the row-major order expected by
+SciPy's hierarchical clustering functions.
+"""
+
+import tempfile
+from typing import Generator
+
+import numpy as np
+from scipy.cluster.hierarchy import linkage
+from scipy.spatial.distance import is_valid_y
+
+import settings
+
+
+def condensed_size(n: int) -> int:
+    """Get the length of the condensed distance vector for n observations.
+
+    Args:
+        n (int): Number of observations.
+
+    Returns:
+        int: Number of pairs, n * (n - 1) / 2.
+    """
+    return n * (n - 1) // 2
+
+
+def allocate_condensed(n: int, dtype: np.dtype = np.float64) -> np.ndarray:
+    """Allocate a zeroed condensed distance vector for n observations.
+
+    Vectors larger than `settings.CLUSTERING_MEMMAP_MIN_BYTES` are memory-mapped
+    to an anonymous temporary file in `settings.CLUSTERING_MEMMAP_DIR`, so that
+    the operating system can page them out. The default float64 dtype is the one
+    used by `scipy.cluster.hierarchy.linkage`, which then reads the buffer without
+    making a converted copy.
+
+    Args:
+        n (int): Number of observations.
+        dtype (np.dtype): Data type of the distances. Default float64.
+
+    Returns:
+        np.ndarray: Condensed distance vector, possibly a `np.memmap`.
+    """
+    shape = (condensed_size(n),)
+    if shape[0] * np.dtype(dtype).itemsize < settings.CLUSTERING_MEMMAP_MIN_BYTES:
+        return np.zeros(shape, dtype=dtype)
+    # the temporary file is unlinked on close, the mapping keeps it alive
+    with tempfile.TemporaryFile(dir=settings.CLUSTERING_MEMMAP_DIR) as f:
+        return np.memmap(f, dtype=dtype, mode="w+", shape=shape)
+
+
+def condensed_index(n: int, i: np.ndarray, j: np.ndarray) -> np.ndarray:
+    """Get the condensed vector positions of the pairs (i, j) with i < j.
+
+    Args:
+        n (int): Number of observations.
+        i (np.ndarray): Row indices.
+        j (np.ndarray): Column indices, each greater than the matching row index.
+
+    Returns:
+        np.ndarray: Positions into the condensed distance vector.
+    """
+    i = np.asarray(i, dtype=np.int64)
+    j = np.asarray(j, dtype=np.int64)
+    return n * i - i * (i + 1) // 2 + (j - i - 1)
+
+
+def iter_pair_blocks(
+    n: int, block_pairs: int
+) -> Generator[tuple[np.ndarray, np.ndarray], None, None]:
+    """Iterate over all the pairs (i, j) with i < j in row-major blocks.
+
+    Rows are never split across blocks, so a block may hold more than
+    `block_pairs` pairs when a single row is longer than that.
+
+    Args:
+        n (int): Number of observations.
+        block_pairs (int): Target number of pairs per block.
+
+    Yields:
+        tuple[np.ndarray, np.ndarray]: Row and column indices of the block pairs.
+    """
+    row = 0
+    while row < n - 1:
+        stop = row
+        n_pairs = 0
+        while stop < n - 1 and (n_pairs == 0 or n_pairs + n - stop - 1 <= block_pairs):
+            n_pairs += n - stop - 1
+            stop += 1
+        i = np.repeat(np.arange(row, stop), np.arange(n - row - 1, n - stop - 1, -1))
+        j = np.concatenate([np.arange(k + 1, n) for k in range(row, stop)])
+        yield i, j
+        row = stop
+
+
+def condensed_submatrix(
+    condensed: np.ndarray, n: int, indices: np.ndarray
+) -> np.ndarray:
+    """Extract the square distance matrix of a subset of observations.
+
+    Args:
+        condensed (np.ndarray): Condensed distance vector of n observations.
+        n (int): Number of observations.
+        indices (np.ndarray): Indices of the observations to extract.
+
+    Returns:
+        np.ndarray: Square distance matrix between the selected observations.
+    """
+    indices = np.asarray(indices, dtype=np.int64)
+    rows, cols = np.meshgrid(indices, indices, indexing="ij")
+    low, high = np.minimum(rows, cols), np.maximum(rows, cols)
+    off_diagonal = low != high
+    sub_matrix = np.zeros(rows.shape, dtype=condensed.dtype)
+    sub_matrix[off_diagonal] = condensed[
+        condensed_index(n, low[off_diagonal], high[off_diagonal])
+    ]
+    return sub_matrix
+
+
+def condensed_linkage(condensed: np.ndarray, method: str) -> np.ndarray:
+    """Perform hierarchical clustering on a precomputed condensed distance vector.
+
+    `scipy.cluster.hierarchy.linkage` reads a 2-D input as observation vectors and
+    silently computes Euclidean distances between them, so a square distance
+    matrix is rejected here instead of producing wrong clusters.
+
+    Args:
+        condensed (np.ndarray): Condensed distance vector.
+        method (str): Linkage method.
+
+    Raises:
+        ValueError: If `condensed` is not a valid condensed distance vector.
+
+    Returns:
+        np.ndarray: Linkage matrix.
+    """
+    is_valid_y(condensed, throw=True, name="condensed")
+    return linkage(condensed, method=method)
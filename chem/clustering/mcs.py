@@ -8,14 +8,40 @@ The clustering is performed using SciPy's hierarchical clustering methods.
 The module is designed to work with molecular structures represented as RDKit Mol objects.
 """
 
+import os
 import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import chain
 from typing import Generator
 
 import numpy as np
 from rdkit.Chem import Mol, rdFMCS
-from scipy.cluster.hierarchy import fcluster, linkage
+from scipy.cluster.hierarchy import fcluster
 from scipy.spatial.distance import squareform
 
+import db_mg_fragments
+import db_mg_fragments.handlers.mcs_cache as db_mgf_mcs_cache_handlers
+import settings
+from chem import utils as chem_utils
+
+from . import ClusteringMethod
+from .distance import (
+    allocate_condensed,
+    condensed_index,
+    condensed_linkage,
+    condensed_size,
+    condensed_submatrix,
+    iter_pair_blocks,
+)
+
+# Molecules and timeout of the current worker process, set by _init_mcs_worker.
+_worker_mols: list[Mol] = []
+_worker_timeout: int = settings.MCS_TIMEOUT
+
+# Linkage methods whose clusters cut at a distance threshold t do not depend on the
+# distances above t, so the pairs bound to be farther apart can be pruned exactly.
+EXACT_PRUNING_LINKAGES = ("complete", "single")
+
 
 def compute_mcs_similarity(mol1: Mol, mol2: Mol) -> int:
     """Compute MCS similarity between two molecules.
@@ -42,11 +68,16 @@ def compute_mcs_similarity_timeout(mol1: Mol, mol2: Mol, timeout: int = 5) -> in
     Returns:
         int: Number of atoms in the MCS or 0 if timeout occurs.
     """
+    return _find_mcs(mol1, mol2, timeout)[0]
+
+
+def _find_mcs(mol1: Mol, mol2: Mol, timeout: int) -> tuple[int, bool]:
+    """Search the MCS of two molecules, returning its size and whether the search completed."""
     try:
         res = rdFMCS.FindMCS([mol1, mol2], timeout=timeout)
-        return res.numAtoms  # Larger MCS = More similar structures
     except Exception:
-        return 0
+        return 0, False
+    return res.numAtoms, not res.canceled  # Larger MCS = More similar structures
 
 
 def pairwise_mcs_distance(fragments: list[Mol]) -> np.ndarray:
@@ -65,57 +96,346 @@ def pairwise_mcs_distance(fragments: list[Mol]) -> np.ndarray:
     return distance_matrix
 
 
+def _mcs_sizes(
+    mols: list[Mol], rows: np.ndarray, cols: np.ndarray, timeout: int
+) -> tuple[np.ndarray, np.ndarray]:
+    """Compute the MCS size of each (rows[k], cols[k]) pair of molecules.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: MCS size of each pair, and mask of the pairs
+            whose search completed before the timeout.
+    """
+    results = [_find_mcs(mols[i], mols[j], timeout) for i, j in zip(rows, cols)]
+    sizes = np.array([size for size, _ in results], dtype=np.int32)
+    complete = np.array([complete for _, complete in results], dtype=bool)
+    return sizes, complete
+
+
+def _init_mcs_worker(mol_pickles: list[bytes], timeout: int) -> None:
+    """Rebuild the molecules once per worker process."""
+    global _worker_mols, _worker_timeout
+    _worker_mols = [chem_utils.mol_from_pickle(data) for data in mol_pickles]
+    _worker_timeout = timeout
+
+
+def _mcs_sizes_worker(
+    rows: np.ndarray, cols: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    """Compute the MCS sizes of a block of pairs inside a worker process."""
+    return _mcs_sizes(_worker_mols, rows, cols, _worker_timeout)
+
+
+def element_histograms(mols: list[Mol]) -> np.ndarray:
+    """Count the atoms of each element in each molecule.
+
+    Args:
+        mols (list[Mol]): List of molecules.
+
+    Returns:
+        np.ndarray: (n_mols, n_elements) matrix of atom counts.
+    """
+    atomic_nums = [
+        np.array([atom.GetAtomicNum() for atom in mol.GetAtoms()], dtype=np.int64)
+        for mol in mols
+    ]
+    elements, element_idx = np.unique(
+        np.concatenate(atomic_nums or [np.zeros(0, dtype=np.int64)]),
+        return_inverse=True,
+    )
+    mol_idx = np.repeat(np.arange(len(mols)), [len(nums) for nums in atomic_nums])
+    histograms = np.zeros((len(mols), len(elements)), dtype=np.int32)
+    np.add.at(histograms, (mol_idx, element_idx), 1)
+    return histograms
+
+
+def _pruned_pairs(
+    histograms: np.ndarray,
+    num_atoms: np.ndarray,
+    rows: np.ndarray,
+    cols: np.ndarray,
+    prune_threshold: float,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Get the mask of the pairs bound to be farther apart than the threshold.
+
+    The MCS size of a pair is bounded by the atoms of each element shared by the
+    two molecules.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Mask of the pruned pairs and upper bound of
+            the MCS size of each pair.
+    """
+    bounds = np.minimum(histograms[rows], histograms[cols]).sum(axis=1)
+    max_atoms = np.maximum(num_atoms[rows], num_atoms[cols])
+    return 1 - bounds / max_atoms > prune_threshold, bounds
+
+
+def _mcs_params(timeout: int) -> str:
+    """Get the key of the MCS search parameters used by the MCS cache."""
+    return f"timeout={timeout};atomCompare=CompareElements;bondCompare=CompareOrder"
+
+
+def condensed_mcs_distance(
+    fragments: list[Mol],
+    timeout: int = settings.MCS_TIMEOUT,
+    n_jobs: None | int = settings.CLUSTERING_N_JOBS,
+    block_pairs: int = 256,
+    use_cache: bool = True,
+    prune_threshold: None | float = None,
+) -> Generator[dict[str, str | np.ndarray], None, None]:
+    """Compute the condensed MCS-based distance vector over a process pool, with logging.
+
+    The pairs are split into row-major blocks which are dispatched to the worker
+    processes; the molecules are sent once to each worker as binary pickles.
+    The MCS sizes are read from and stored into the 'mcs_cache' table, keyed by
+    the canonical SMILES of the pair, so that only unseen pairs are searched.
+    The searches stopped by the timeout only give a lower bound of the MCS size,
+    so they are not cached and are searched again on the next call.
+    The distances are the same as the ones computed by `pairwise_mcs_distance`.
+
+    When `prune_threshold` is set, the MCS size of each pair is first bounded by the
+    atoms of each element shared by the two molecules; the pairs whose distance is
+    bound to be above the threshold are not searched and get the lower bound of
+    their distance instead. The vector is then only exact below the threshold, which
+    is enough for the clusters of the `EXACT_PRUNING_LINKAGES` cut at that distance;
+    `find_cluster_centroids` computes the pruned pairs exactly within the clusters.
+
+    Args:
+        fragments (list[Mol]): Molecules to compare.
+        timeout (int): Timeout in seconds of each MCS search.
+        n_jobs (None | int): Number of worker processes. None uses all the CPUs,
+            1 computes the distances in the current process.
+        block_pairs (int): Number of pairs sent to a worker in a single task.
+        use_cache (bool): Whether to use the persistent MCS cache.
+        prune_threshold (None | float): Distance above which the pairs are pruned.
+            Default None (no pruning).
+
+    Yields:
+        dict: `{"log": str}` progress messages and a final `{"result": np.ndarray}`
+            with the condensed distance vector.
+    """
+    n = len(fragments)
+    n_pairs = condensed_size(n)
+    n_jobs = n_jobs or os.cpu_count() or 1
+    num_atoms = np.array([mol.GetNumAtoms() for mol in fragments], dtype=np.int32)
+    condensed = allocate_condensed(n)
+
+    cached = {}
+    new_entries = []
+    n_pruned = 0
+    n_timed_out = 0
+    if prune_threshold is not None:
+        histograms = element_histograms(fragments)
+    if use_cache:
+        params = _mcs_params(timeout)
+        smiles = [chem_utils.smiles_from_mol(mol) for mol in fragments]
+        connection = db_mg_fragments.get_db_connection()
+        cached = db_mgf_mcs_cache_handlers.get_many(connection, set(smiles), params)
+        yield {"log": f"🗃️ Found {len(cached)} cached MCS pairs"}
+
+    def pair_key(i: int, j: int) -> tuple[str, str]:
+        return (
+            (smiles[i], smiles[j]) if smiles[i] <= smiles[j] else (smiles[j], smiles[i])
+        )
+
+    def store(rows: np.ndarray, cols: np.ndarray, sizes: np.ndarray) -> None:
+        max_atoms = np.maximum(num_atoms[rows], num_atoms[cols])
+        condensed[condensed_index(n, rows, cols)] = 1 - sizes / max_atoms
+
+    def missing_blocks() -> Generator[tuple[np.ndarray, np.ndarray], None, None]:
+        for rows, cols in iter_pair_blocks(n, block_pairs):
+            if not cached:
+                yield rows, cols
+                continue
+            sizes = np.array(
+                [cached.get(pair_key(i, j), -1) for i, j in zip(rows, cols)],
+                dtype=np.int32,
+            )
+            hit = sizes >= 0
+            store(rows[hit], cols[hit], sizes[hit])
+            if not hit.all():
+                yield rows[~hit], cols[~hit]
+
+    def unpruned_blocks() -> Generator[tuple[np.ndarray, np.ndarray], None, None]:
+        nonlocal n_pruned
+        for rows, cols in missing_blocks():
+            pruned, bounds = _pruned_pairs(
+                histograms, num_atoms, rows, cols, prune_threshold
+            )
+            store(rows[pruned], cols[pruned], bounds[pruned])
+            n_pruned += int(pruned.sum())
+            if not pruned.all():
+                yield rows[~pruned], cols[~pruned]
+
+    def store_computed(
+        rows: np.ndarray, cols: np.ndarray, sizes: np.ndarray, complete: np.ndarray
+    ) -> None:
+        nonlocal n_timed_out
+        store(rows, cols, sizes)
+        n_timed_out += int((~complete).sum())
+        if use_cache:
+            new_entries.extend(
+                (*pair_key(i, j), int(size))
+                for i, j, size in zip(rows[complete], cols[complete], sizes[complete])
+            )
+
+    done = 0
+    next_log = 0.1
+    blocks = missing_blocks() if prune_threshold is None else unpruned_blocks()
+    # no pool is started when all the pairs are cached or pruned
+    first_block = next(blocks, None)
+    blocks = chain([first_block], blocks) if first_block is not None else iter(())
+    if first_block is None or n_jobs == 1 or n_pairs - len(cached) <= block_pairs:
+        for rows, cols in blocks:
+            store_computed(rows, cols, *_mcs_sizes(fragments, rows, cols, timeout))
+            done += len(rows)
+            yield {"log": f"⏳ MCS pairs computed: {done}/{n_pairs}"}
+    else:
+        yield {"log": f"⚙️ Dispatching MCS pairs to {n_jobs} workers..."}
+        mol_pickles = [chem_utils.mol_to_pickle(mol) for mol in fragments]
+        with ProcessPoolExecutor(
+            max_workers=n_jobs,
+            initializer=_init_mcs_worker,
+            initargs=(mol_pickles, timeout),
+        ) as executor:
+            pending = {}
+            while True:
+                # keep a bounded number of blocks in flight
+                while len(pending) < 2 * n_jobs:
+                    block = next(blocks, None)
+                    if block is None:
+                        break
+                    pending[executor.submit(_mcs_sizes_worker, *block)] = block
+                if not pending:
+                    break
+                completed, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in completed:
+                    rows, cols = pending.pop(future)
+                    store_computed(rows, cols, *future.result())
+                    done += len(rows)
+                if done / n_pairs >= next_log:
+                    yield {"log": f"⏳ MCS pairs computed: {done}/{n_pairs}"}
+                    next_log = done / n_pairs + 0.1
+
+    if prune_threshold is not None:
+        yield {"log": f"✂️ Pruned {n_pruned}/{n_pairs} MCS pairs by upper bound"}
+    if n_timed_out:
+        yield {"log": f"⏱️ {n_timed_out} MCS searches timed out after {timeout}s"}
+
+    if use_cache:
+        db_mgf_mcs_cache_handlers.insert_many(connection, new_entries, params)
+        db_mgf_mcs_cache_handlers.evict(connection, settings.MCS_CACHE_MAX_ENTRIES)
+        db_mg_fragments.close_db_connection(connection)
+        yield {"log": f"🗃️ Cached {len(new_entries)} new MCS pairs"}
+
+    yield {"result": condensed}
+
+
 def hierarchical_clustering(
-    mol_list: list[Mol], cluster_method: str, t: None | int | float
+    mol_list: list[Mol],
+    cluster_method: str,
+    t: None | int | float,
+    linkage_method: str = "ward",
 ) -> Generator[dict[str, str | dict], None, None]:
-    """Cluster fragments using hierarchical clustering based on MCS similarity."""
+    """Cluster fragments using hierarchical clustering based on MCS similarity.
+
+    With a distance threshold and one of the `EXACT_PRUNING_LINKAGES`, the pairs
+    bound to be farther apart than t are not searched: their lower bound is above t
+    as well, so the clusters are the same as with the exact distances. The default
+    Ward linkage depends on all the distances, so nothing is pruned.
+    """
     yield {"log": "🔍 Starting pairwise MCS distance computation..."}
     start = time.time()
-    dist_matrix = pairwise_mcs_distance(mol_list)
-    yield {"log": f"✅ pairwise_mcs_distance done in {time.time() - start:.2f}s"}
-
-    yield {"log": "📐 Converting to condensed matrix..."}
-    condensed_matrix = squareform(dist_matrix)
+    by_distance = cluster_method == ClusteringMethod.DIST.value
+    if by_distance and linkage_method in EXACT_PRUNING_LINKAGES:
+        prune_threshold = t
+    else:
+        prune_threshold = None
+    for item in condensed_mcs_distance(mol_list, prune_threshold=prune_threshold):
+        if "log" in item:
+            yield item
+        elif "result" in item:
+            condensed_matrix = item["result"]
+    yield {"log": f"✅ condensed_mcs_distance done in {time.time() - start:.2f}s"}
 
     yield {"log": "🌿 Performing hierarchical clustering..."}
-    linkage_matrix = linkage(condensed_matrix, method="ward")
+    linkage_matrix = condensed_linkage(condensed_matrix, method=linkage_method)
 
     yield {"log": "🔗 Assigning cluster labels..."}
     cluster_labels = fcluster(linkage_matrix, criterion=cluster_method, t=t)
 
-    # Final result: yield with a special key
-    yield {"result": cluster_labels}
+    # Final result: yield with a special key, the context is forwarded to find_cluster_centroids
+    yield {
+        "result": cluster_labels,
+        "context": {
+            "dist_matrix": condensed_matrix,
+            "prune_threshold": prune_threshold,
+        },
+    }
 
 
 def find_cluster_centroids(
-    mol_list, cluster_labels
+    mol_list,
+    cluster_labels,
+    dist_matrix: None | np.ndarray = None,
+    prune_threshold: None | float = None,
 ) -> Generator[dict[str, str | dict], None, None]:
-    """Find the centroid fragment for each cluster (smallest average distance to others), yielding logs."""
-    yield {"log": "📍 Finding cluster centroids..."}
-    unique_clusters = set(cluster_labels)
-    centroids = {}
-
-    for cluster_id in unique_clusters:
-        yield {"log": f"🔸 Processing cluster {cluster_id}..."}
-
-        cluster_indices = [
-            i for i, label in enumerate(cluster_labels) if label == cluster_id
-        ]
-        cluster_mols = [mol_list[i] for i in cluster_indices]
+    """Find the centroid fragment for each cluster (smallest average distance to others), yielding logs.
 
-        start = time.time()
-        sub_matrix = pairwise_mcs_distance(cluster_mols)
-        duration = time.time() - start
-        yield {
-            "log": f"⏱️ MCS distance matrix computed in {duration:.2f}s for {len(cluster_indices)} fragments."
-        }
+    The within-cluster distances are sliced from `dist_matrix`, the condensed distance
+    vector returned by `hierarchical_clustering`; it is computed once when not given.
+    The pairs pruned by `prune_threshold` only hold a lower bound of their distance,
+    so the distances of the clusters holding such pairs are computed exactly, most
+    of them being read from the MCS cache.
+    """
+    yield {"log": "📍 Finding cluster centroids..."}
+    if dist_matrix is None:
+        for item in condensed_mcs_distance(mol_list):
+            if "log" in item:
+                yield item
+            elif "result" in item:
+                dist_matrix = item["result"]
+    if prune_threshold is not None:
+        histograms = element_histograms(mol_list)
+        num_atoms = np.array([mol.GetNumAtoms() for mol in mol_list], dtype=np.int32)
 
+    cluster_labels = np.asarray(cluster_labels)
+    centroids = {}
+    n_recomputed = 0
+    start = time.time()
+    for cluster_id in np.unique(cluster_labels):
+        cluster_indices = np.flatnonzero(cluster_labels == cluster_id)
+        # with two fragments or less, the centroid does not depend on the distances
+        if prune_threshold is not None and len(cluster_indices) > 2:
+            rows, cols = np.triu_indices(len(cluster_indices), k=1)
+            pruned, _ = _pruned_pairs(
+                histograms,
+                num_atoms,
+                cluster_indices[rows],
+                cluster_indices[cols],
+                prune_threshold,
+            )
+        else:
+            pruned = np.zeros(0, dtype=bool)
+        if pruned.any():
+            for item in condensed_mcs_distance(
+                [mol_list[idx] for idx in cluster_indices]
+            ):
+                if "result" in item:
+                    sub_matrix = squareform(item["result"])
+            n_recomputed += 1
+        else:
+            sub_matrix = condensed_submatrix(
+                dist_matrix, len(mol_list), cluster_indices
+            )
         avg_distances = np.mean(sub_matrix, axis=1)
         centroid_idx = cluster_indices[np.argmin(avg_distances)]
         centroids[cluster_id] = mol_list[centroid_idx]
 
+    if prune_threshold is not None:
         yield {
-            "log": f"✅ Cluster {cluster_id} centroid selected (index {centroid_idx})."
+            "log": f"✂️ Computed the pruned MCS pairs of {n_recomputed} clusters exactly"
         }
-
+    yield {
+        "log": f"✅ {len(centroids)} cluster centroids selected in {time.time() - start:.2f}s."
+    }
     yield {"result": centroids}
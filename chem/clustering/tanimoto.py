@@ -6,82 +6,224 @@ The clustering is performed using SciPy's hierarchical clustering methods.
 The module is designed to work with molecular structures represented as RDKit Mol objects.
 """
 
+import time
+from functools import lru_cache
+
 import numpy as np
 import scipy.cluster.hierarchy as sch
 from rdkit.Chem import Mol
 from rdkit.Chem.rdFingerprintGenerator import FingerprintGenerator64, GetMorganGenerator
-from rdkit.DataStructs.cDataStructs import TanimotoSimilarity
-from scipy.spatial.distance import euclidean
+from rdkit.DataStructs.cDataStructs import (
+    BulkTanimotoSimilarity,
+    CreateFromFPSText,
+    ExplicitBitVect,
+)
+
+import db_mg_fragments
+import db_mg_fragments.handlers.fingerprints as db_mgf_fingerprints_handlers
+from chem import utils as chem_utils
+
+from .distance import allocate_condensed, condensed_linkage
+
+FINGERPRINT_RADIUS = 2
+FINGERPRINT_SIZE = 2048
+
+
+@lru_cache
+def _get_morgan_generator(radius: int, fp_size: int) -> FingerprintGenerator64:
+    """Get the shared Morgan fingerprint generator for the given parameters."""
+    return GetMorganGenerator(radius=radius, fpSize=fp_size)
+
+
+def get_fingerprint_matrix(
+    mol_list: list[Mol],
+    radius: int = FINGERPRINT_RADIUS,
+    fp_size: int = FINGERPRINT_SIZE,
+) -> np.ndarray:
+    """Get the packed Morgan fingerprints of a list of RDKit molecules.
 
+    The fingerprints are read in bulk from the 'fingerprints' table, keyed by
+    canonical SMILES; only the missing ones are generated and then stored.
 
-def _get_fingerprints(mol_list: list[Mol]) -> list[FingerprintGenerator64]:
+    Args:
+        mol_list (list[Mol]): List of RDKit molecules.
+        radius (int): Morgan fingerprint radius.
+        fp_size (int): Morgan fingerprint size in bits.
+
+    Returns:
+        np.ndarray: (n_mols, fp_size / 8) uint8 matrix of the fingerprint bits,
+            packed in little-endian bit order.
+    """
+    smiles_list = [chem_utils.smiles_from_mol(mol) for mol in mol_list]
+    connection = db_mg_fragments.get_db_connection()
+    stored = db_mgf_fingerprints_handlers.get_many(
+        connection, set(smiles_list), radius, fp_size
+    )
+
+    generator = _get_morgan_generator(radius, fp_size)
+    fp_matrix = np.empty((len(mol_list), fp_size // 8), dtype=np.uint8)
+    new_entries = {}
+    for i, (mol, smiles) in enumerate(zip(mol_list, smiles_list)):
+        fingerprint = stored.get(smiles) or new_entries.get(smiles)
+        if fingerprint is None:
+            bits = generator.GetFingerprintAsNumPy(mol)
+            fingerprint = np.packbits(bits, bitorder="little").tobytes()
+            new_entries[smiles] = fingerprint
+        fp_matrix[i] = np.frombuffer(fingerprint, dtype=np.uint8)
+
+    db_mgf_fingerprints_handlers.insert_many(
+        connection, new_entries.items(), radius, fp_size
+    )
+    db_mg_fragments.close_db_connection(connection)
+    return fp_matrix
+
+
+def _fingerprints_from_matrix(fp_matrix: np.ndarray) -> list[ExplicitBitVect]:
+    """Convert packed fingerprint bits to RDKit bit vectors."""
+    return [CreateFromFPSText(row.tobytes().hex()) for row in fp_matrix]
+
+
+def get_fingerprints(mol_list: list[Mol]) -> list[ExplicitBitVect]:
     """Generate Morgan fingerprints for a list of RDKit molecules.
 
     Args:
         mol_list (list[Mol]): List of RDKit molecules.
 
     Returns:
-        list[FingerprintGenerator64]: List of Morgan fingerprints.
+        list[ExplicitBitVect]: List of Morgan fingerprints.
     """
-    return [
-        GetMorganGenerator(radius=2, fpSize=2048).GetFingerprint(mol)
-        for mol in mol_list
-    ]
+    return _fingerprints_from_matrix(get_fingerprint_matrix(mol_list))
+
+
+def condensed_tanimoto_distance(fingerprints: list[ExplicitBitVect]) -> np.ndarray:
+    """Compute the condensed Tanimoto distance vector (1 - similarity) of the fingerprints.
+
+    Each row of the upper triangle is computed with a single `BulkTanimotoSimilarity`
+    call and written in place into a buffer from `allocate_condensed`, so no square
+    matrix is ever built.
+
+    Args:
+        fingerprints (list[ExplicitBitVect]): List of fingerprints.
+
+    Returns:
+        np.ndarray: Condensed distance vector.
+    """
+    n = len(fingerprints)
+    condensed = allocate_condensed(n)
+    start = 0
+    for i, fingerprint in enumerate(fingerprints[:-1]):
+        next_i = i + 1
+        stop = start + n - next_i
+        condensed[start:stop] = BulkTanimotoSimilarity(
+            fingerprint, fingerprints[next_i:]
+        )
+        start = stop
+    np.subtract(1, condensed, out=condensed)
+    return condensed
 
 
 def hierarchical_clustering(mol_list: list, cluster_method: str, t: None | int | float):
     """Perform hierarchical clustering on a list of RDKit molecules using Tanimoto similarity, with logging."""
     yield {"log": "🔍 Generating fingerprints..."}
-    fingerprints = _get_fingerprints(mol_list)
-
-    yield {"log": "🧮 Computing pairwise Tanimoto similarity matrix..."}
-    n_mols = len(mol_list)
-    sim_matrix = np.zeros((n_mols, n_mols))
+    fp_matrix = get_fingerprint_matrix(mol_list)
+    fingerprints = _fingerprints_from_matrix(fp_matrix)
 
-    for i in range(n_mols):
-        for j in range(i + 1, n_mols):
-            sim = TanimotoSimilarity(fingerprints[i], fingerprints[j])
-            sim_matrix[i, j] = sim
-            sim_matrix[j, i] = sim
-
-    yield {"log": "📏 Converting similarity to distance matrix..."}
-    dist_matrix = 1 - sim_matrix
+    yield {"log": "🧮 Computing pairwise Tanimoto distances..."}
+    dist_matrix = condensed_tanimoto_distance(fingerprints)
 
     yield {"log": "🌿 Performing hierarchical clustering..."}
-    linkage_matrix = sch.linkage(dist_matrix, method="average")
+    linkage_matrix = condensed_linkage(dist_matrix, method="average")
 
     yield {"log": "🔗 Creating cluster labels..."}
     cluster_labels = sch.fcluster(linkage_matrix, criterion=cluster_method, t=t)
 
-    yield {"result": cluster_labels}
+    yield {"result": cluster_labels, "context": {"fp_matrix": fp_matrix}}
 
 
-def find_cluster_centroids(mol_list: list, cluster_labels):
-    """Find centroids of clusters based on Euclidean distance from mean fingerprint, with logging."""
-    yield {"log": "📍 Calculating fingerprints for centroid selection..."}
-    fingerprints = _get_fingerprints(mol_list)
+def _batch_medoids(fp_matrix: np.ndarray, inverse: np.ndarray) -> np.ndarray:
+    """Select the medoid of each cluster of a batch, see `fingerprint_medoids`.
 
-    unique_clusters = set(cluster_labels)
-    centroids = {}
+    Args:
+        fp_matrix (np.ndarray): Packed fingerprints of the batch members.
+        inverse (np.ndarray): Cluster index of each member, from 0 to the number of
+            clusters of the batch, each cluster having at least one member.
 
-    for cluster_id in unique_clusters:
-        yield {"log": f"  🔸 Processing cluster {cluster_id}..."}
+    Returns:
+        np.ndarray: Index into `fp_matrix` of the medoid of each cluster.
+    """
+    n, n_bits = fp_matrix.shape[0], fp_matrix.shape[1] * 8
+    n_clusters = inverse.max() + 1
+    rows, cols = np.nonzero(np.unpackbits(fp_matrix, axis=1, bitorder="little"))
+    counts = np.bincount(inverse).astype(np.int64)
+    sums = np.bincount(
+        inverse[rows] * n_bits + cols, minlength=n_clusters * n_bits
+    ).reshape(n_clusters, n_bits)
+
+    k = counts[inverse]
+    num_bits = np.bincount(rows, minlength=n)
+    dot = np.bincount(rows, weights=sums[inverse[rows], cols], minlength=n)
+    sums_norm = np.einsum("ij,ij->i", sums, sums)[inverse]
+    scaled_distances = k**2 * num_bits - 2 * k * dot.astype(np.int64) + sums_norm
+
+    # first entry of each cluster, sorted by distance then index
+    by_cluster = np.lexsort((scaled_distances, inverse))
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    return by_cluster[starts]
+
+
+def fingerprint_medoids(
+    fp_matrix: np.ndarray, cluster_labels, batch_clusters: int = 1024
+) -> tuple[np.ndarray, np.ndarray]:
+    """Select the fingerprint closest to the mean fingerprint of each cluster.
+
+    The fingerprints are handled as the (row, bit) coordinates of their set bits,
+    so the cluster sums are a single grouped `np.bincount`. The squared Euclidean
+    distance of each fingerprint x from the mean of its cluster, scaled by the
+    squared cluster size k, is computed in exact integer arithmetic as
+    k²|x|² - 2k(x·s) + |s|², with s the cluster sum.
+
+    The clusters are processed in batches, so that the dense cluster sums never
+    exceed `batch_clusters` rows, even when most clusters are singletons.
+
+    Args:
+        fp_matrix (np.ndarray): Packed fingerprints, as from `get_fingerprint_matrix`.
+        cluster_labels: Cluster label of each fingerprint.
+        batch_clusters (int): Number of clusters processed in a single batch.
 
-        cluster_indices = [
-            i for i, label in enumerate(cluster_labels) if label == cluster_id
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Sorted unique cluster labels and index of the
+            medoid of each cluster; ties are resolved by the lowest index.
+    """
+    labels, inverse = np.unique(np.asarray(cluster_labels), return_inverse=True)
+    medoid_indices = np.empty(len(labels), dtype=np.int64)
+    for start in range(0, len(labels), batch_clusters):
+        stop = start + batch_clusters
+        members = np.flatnonzero((inverse >= start) & (inverse < stop))
+        medoid_indices[start:stop] = members[
+            _batch_medoids(fp_matrix[members], inverse[members] - start)
         ]
-        cluster_fingerprints = [fingerprints[i] for i in cluster_indices]
+    return labels, medoid_indices
 
-        # Convert to NumPy array
-        fp_matrix = np.array(cluster_fingerprints)
-        centroid_vector = np.mean(fp_matrix, axis=0)
 
-        distances = [euclidean(fp, centroid_vector) for fp in fp_matrix]
-        closest_idx = np.argmin(distances)
-        centroids[cluster_id] = mol_list[cluster_indices[closest_idx]]
+def find_cluster_centroids(
+    mol_list: list, cluster_labels, fp_matrix: None | np.ndarray = None
+):
+    """Find centroids of clusters based on Euclidean distance from mean fingerprint, with logging.
 
-        yield {
-            "log": f"    ✅ Cluster {cluster_id} centroid selected (index {cluster_indices[closest_idx]})."
-        }
+    The packed fingerprints computed by `hierarchical_clustering` are reused when given.
+    """
+    if fp_matrix is None:
+        yield {"log": "📍 Calculating fingerprints for centroid selection..."}
+        fp_matrix = get_fingerprint_matrix(mol_list)
+
+    yield {"log": "📍 Selecting cluster centroids..."}
+    start = time.time()
+    labels, medoid_indices = fingerprint_medoids(fp_matrix, cluster_labels)
+    centroids = {
+        cluster_id: mol_list[idx] for cluster_id, idx in zip(labels, medoid_indices)
+    }
+    yield {
+        "log": f"✅ {len(centroids)} cluster centroids selected in {time.time() - start:.2f}s."
+    }
 
     yield {"result": centroids}
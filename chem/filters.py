@@ -1,13 +1,24 @@
 """Filters for molecules."""
 
+import hashlib
 import json
-from dataclasses import dataclass
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass, replace
 from enum import Enum
-from typing import Optional
+from typing import Generator, Iterable, NamedTuple, Optional, Sequence
 
+import numpy as np
 from rdkit.Chem import Mol, MolFromSmarts, rdMolDescriptors
 
+import db_mg_fragments
+import db_mg_fragments.handlers.fragments as db_mgf_fragments_handlers
+import db_mg_fragments.handlers.mols as db_mgf_mols_handlers
 import settings
+from chem import utils as chem_utils
+
+# Reactive patterns whose hits fit into a signed 64-bit SQLite integer bitmask.
+REACTIVE_BITMASK_MAX_PATTERNS = 63
 
 
 @dataclass
@@ -39,6 +50,378 @@ def get_reactive_pattern_list() -> list[ReactivePattern]:
     return reactive_pattern_list
 
 
+def reactive_pattern_list_hash(reactive_pattern_list: Iterable[ReactivePattern]) -> str:
+    """Get a hash of the names and SMARTS of the reactive patterns.
+
+    Args:
+        reactive_pattern_list (Iterable[ReactivePattern]): Reactive patterns.
+
+    Returns:
+        str: Hex digest, changing whenever a pattern is added, removed or edited.
+    """
+    content = json.dumps([p.to_dict() for p in reactive_pattern_list])
+    return hashlib.sha1(content.encode()).hexdigest()
+
+
+class ReactivePatternSet:
+    """Compiled set of reactive patterns, matched against many molecules.
+
+    The patterns are copied and compiled once. The set is identified by the hash
+    of their names and SMARTS, so a changed pattern list needs a new set.
+    The hit rate of each pattern is tracked over the screened molecules, and the
+    early-exit check `any_match` tries the least selective patterns first.
+    """
+
+    def __init__(self, reactive_pattern_list: Iterable[ReactivePattern]):
+        """Copy and compile the reactive patterns.
+
+        Args:
+            reactive_pattern_list (Iterable[ReactivePattern]): Reactive patterns.
+        """
+        self.patterns = tuple(replace(p) for p in reactive_pattern_list)
+        for pattern in self.patterns:
+            if pattern.mol is None:
+                pattern.mol = MolFromSmarts(pattern.smarts)
+        self.hash = reactive_pattern_list_hash(self.patterns)
+        self._query_sizes = np.array([p.mol.GetNumAtoms() for p in self.patterns])
+        self._hit_counts = np.zeros(len(self.patterns), dtype=np.int64)
+        self._order = self._selectivity_order()
+
+    def __len__(self) -> int:
+        """Number of patterns of the set."""
+        return len(self.patterns)
+
+    def __iter__(self):
+        """Iterate over the compiled patterns."""
+        return iter(self.patterns)
+
+    def _selectivity_order(self) -> list[int]:
+        """Pattern indices by decreasing hit count, then by increasing query size."""
+        return np.lexsort((self._query_sizes, -self._hit_counts)).tolist()
+
+    def hit_matrix(self, mol_list: Iterable[Mol]) -> np.ndarray:
+        """Match every pattern against every molecule.
+
+        Molecules that failed to parse (None) match no pattern.
+
+        Args:
+            mol_list (Iterable[Mol]): Molecules to screen.
+
+        Returns:
+            np.ndarray: Boolean (molecules x patterns) matrix, True where the
+                molecule contains the pattern.
+        """
+        rows = [
+            [mol is not None and mol.HasSubstructMatch(p.mol) for p in self.patterns]
+            for mol in mol_list
+        ]
+        hits = np.array(rows, dtype=bool).reshape(len(rows), len(self.patterns))
+        self._record_hits(hits)
+        return hits
+
+    def _record_hits(self, hits: np.ndarray) -> None:
+        """Add the hits of screened molecules to the per-pattern hit counts."""
+        self._hit_counts += hits.sum(axis=0)
+        self._order = self._selectivity_order()
+
+    def any_match(self, mol: Mol) -> bool:
+        """Check if a molecule contains any pattern, stopping at the first match.
+
+        Args:
+            mol (Mol): Molecule to check.
+
+        Returns:
+            bool: True if the molecule contains a reactive pattern, False otherwise.
+        """
+        for k in self._order:
+            if mol.HasSubstructMatch(self.patterns[k].mol):
+                self._hit_counts[k] += 1
+                return True
+        return False
+
+
+# Compiled pattern sets keyed by file path, with the hash of the file content.
+_reactive_pattern_set_cache: dict[str, tuple[str, ReactivePatternSet]] = {}
+
+
+def load_reactive_pattern_set(
+    path: str = settings.REACTIVE_PATTERN_FILE,
+) -> ReactivePatternSet:
+    """Load the reactive patterns of a JSON file as a compiled set.
+
+    The compiled set is cached and reused until the content of the file changes.
+
+    Args:
+        path (str): JSON file of the patterns. Default `settings.REACTIVE_PATTERN_FILE`.
+
+    Returns:
+        ReactivePatternSet: Compiled reactive patterns.
+    """
+    with open(path, "rb") as f:
+        content = f.read()
+    digest = hashlib.sha1(content).hexdigest()
+    cached = _reactive_pattern_set_cache.get(path)
+    if cached is None or cached[0] != digest:
+        pattern_set = ReactivePatternSet(
+            ReactivePattern(**p) for p in json.loads(content)
+        )
+        _reactive_pattern_set_cache[path] = cached = (digest, pattern_set)
+    return cached[1]
+
+
+def hits_to_bitmasks(hits: np.ndarray) -> list[int]:
+    """Pack the rows of a hit matrix into integer bitmasks.
+
+    Bit k of a bitmask is set when the molecule contains the pattern k.
+
+    Args:
+        hits (np.ndarray): Boolean (molecules x patterns) hit matrix, with at most
+            `REACTIVE_BITMASK_MAX_PATTERNS` patterns.
+
+    Returns:
+        list[int]: Bitmask of each molecule.
+    """
+    weights = 1 << np.arange(hits.shape[1], dtype=np.int64)
+    return (hits.astype(np.int64) @ weights).tolist()
+
+
+def bitmasks_to_hits(bitmasks: Sequence[int], n_patterns: int) -> np.ndarray:
+    """Unpack integer bitmasks into a hit matrix, see `hits_to_bitmasks`.
+
+    Args:
+        bitmasks (Sequence[int]): Bitmask of each molecule.
+        n_patterns (int): Number of patterns.
+
+    Returns:
+        np.ndarray: Boolean (molecules x patterns) hit matrix.
+    """
+    bitmasks = np.asarray(bitmasks, dtype=np.int64).reshape(-1, 1)
+    return (bitmasks >> np.arange(n_patterns, dtype=np.int64)) & 1 == 1
+
+
+# Reactive patterns of the current worker process, set by _init_screening_worker.
+_worker_pattern_set: None | ReactivePatternSet = None
+
+
+def _to_mol(data: Mol | bytes | str | None) -> None | Mol:
+    """Get a molecule from a Mol, its binary pickle or its SMILES."""
+    if isinstance(data, bytes):
+        return chem_utils.mol_from_pickle(data)
+    if isinstance(data, str):
+        return chem_utils.mol_from_smiles(data)
+    return data
+
+
+def _init_screening_worker(patterns: list[dict]) -> None:
+    """Compile the reactive patterns once per worker process."""
+    global _worker_pattern_set
+    _worker_pattern_set = ReactivePatternSet(ReactivePattern(**p) for p in patterns)
+
+
+def _screening_worker(chunk: list[bytes | str | None]) -> np.ndarray:
+    """Screen a chunk of molecules inside a worker process, returning packed hits."""
+    hits = _worker_pattern_set.hit_matrix(_to_mol(data) for data in chunk)
+    return np.packbits(hits, axis=1)
+
+
+def screen_reactive(
+    mol_list: Sequence[Mol | bytes | str | None],
+    reactive_pattern_set: ReactivePatternSet,
+    n_jobs: None | int = settings.SCREENING_N_JOBS,
+    chunk_size: int = settings.SCREENING_CHUNK_SIZE,
+) -> Generator[dict[str, str | np.ndarray], None, None]:
+    """Compute the hit matrix of the reactive patterns over a process pool, with logging.
+
+    The molecules are split into chunks which are dispatched to the worker
+    processes as binary pickles or SMILES; each worker compiles the patterns once
+    and sends back the hits of each molecule packed into a bitset.
+    The result is the same as the one of `ReactivePatternSet.hit_matrix`.
+
+    Args:
+        mol_list (Sequence[Mol | bytes | str | None]): Molecules to screen, as RDKit
+            molecules, binary pickles or SMILES.
+        reactive_pattern_set (ReactivePatternSet): Compiled reactive patterns.
+        n_jobs (None | int): Number of worker processes. None uses all the CPUs,
+            1 screens the molecules in the current process.
+        chunk_size (int): Number of molecules sent to a worker in a single task.
+
+    Yields:
+        dict: `{"log": str}` progress messages and a final `{"result": np.ndarray}`
+            with the boolean (molecules x patterns) hit matrix.
+    """
+    n = len(mol_list)
+    n_jobs = n_jobs or os.cpu_count() or 1
+    if n_jobs == 1 or n <= chunk_size:
+        yield {"result": reactive_pattern_set.hit_matrix(_to_mol(d) for d in mol_list)}
+        return
+
+    yield {"log": f"⚙️ Dispatching {n} molecules to {n_jobs} screening workers..."}
+    n_patterns = len(reactive_pattern_set)
+    hits = np.zeros((n, n_patterns), dtype=bool)
+    starts = iter(range(0, n, chunk_size))
+    done = 0
+    next_log = 0.1
+    with ProcessPoolExecutor(
+        max_workers=n_jobs,
+        initializer=_init_screening_worker,
+        initargs=([p.to_dict() for p in reactive_pattern_set],),
+    ) as executor:
+        pending = {}
+        while True:
+            # keep a bounded number of chunks in flight
+            while len(pending) < 2 * n_jobs:
+                start = next(starts, None)
+                if start is None:
+                    break
+                stop = min(start + chunk_size, n)
+                chunk = [
+                    chem_utils.mol_to_pickle(d) if isinstance(d, Mol) else d
+                    for d in mol_list[start:stop]
+                ]
+                pending[executor.submit(_screening_worker, chunk)] = (start, stop)
+            if not pending:
+                break
+            completed, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in completed:
+                start, stop = pending.pop(future)
+                packed = future.result()
+                hits[start:stop] = np.unpackbits(packed, axis=1, count=n_patterns)
+                done += stop - start
+            if done / n >= next_log:
+                yield {"log": f"⏳ Molecules screened: {done}/{n}"}
+                next_log = done / n + 0.1
+    reactive_pattern_set._record_hits(hits)
+    yield {"result": hits}
+
+
+def _screen_bitmasks(
+    mol_list: Sequence[Mol | bytes | str | None],
+    reactive_pattern_set: ReactivePatternSet,
+    n_jobs: None | int,
+) -> Generator[dict[str, str], None, list[int]]:
+    """Screen molecules with `screen_reactive`, with logging, returning their bitmasks."""
+    for item in screen_reactive(mol_list, reactive_pattern_set, n_jobs=n_jobs):
+        if "log" in item:
+            yield item
+        elif "result" in item:
+            bitmasks = hits_to_bitmasks(item["result"])
+    return bitmasks
+
+
+def stored_hit_matrix(
+    target_id: str,
+    chembl_ids: Sequence[str],
+    reactive_pattern_set: ReactivePatternSet,
+    n_jobs: None | int = settings.SCREENING_N_JOBS,
+) -> Generator[dict[str, str | np.ndarray], None, None]:
+    """Get the hit matrix of the molecules of a target from the molecule store, with logging.
+
+    The hits are stored in the 'mols' table as bitmasks, along with the hash of the
+    reactive pattern set; only the molecules without bitmask for the pattern set
+    are screened, with `screen_reactive`, and their bitmasks stored.
+    Pattern sets with more than `REACTIVE_BITMASK_MAX_PATTERNS` patterns are not
+    stored, and all the molecules are screened.
+    The molecules are screened from their stored pickles, which are sent as they
+    are to the worker processes.
+
+    Args:
+        target_id (str): Target ID of the molecules.
+        chembl_ids (Sequence[str]): ChEMBL ID of each row of the hit matrix.
+        reactive_pattern_set (ReactivePatternSet): Compiled reactive patterns.
+        n_jobs (None | int): Number of worker processes, see `screen_reactive`.
+
+    Yields:
+        dict: `{"log": str}` progress messages and a final `{"result": np.ndarray}`
+            with the boolean (molecules x patterns) hit matrix.
+    """
+    n_patterns = len(reactive_pattern_set)
+    connection = db_mg_fragments.get_db_connection()
+    if n_patterns > REACTIVE_BITMASK_MAX_PATTERNS:
+        stored_mols = db_mgf_mols_handlers.get_unscreened(connection, target_id)
+        db_mg_fragments.close_db_connection(connection)
+        yield from screen_reactive(
+            [stored_mols.get(chembl_id) for chembl_id in chembl_ids],
+            reactive_pattern_set,
+            n_jobs=n_jobs,
+        )
+        return
+
+    stored = db_mgf_mols_handlers.get_reactive_bits(
+        connection, target_id, reactive_pattern_set.hash
+    )
+    bitmasks = [stored.get(chembl_id) for chembl_id in chembl_ids]
+    missing = [k for k, bitmask in enumerate(bitmasks) if bitmask is None]
+    yield {"log": f"🗃️ Found {len(bitmasks) - len(missing)} screened molecules"}
+    if missing:
+        stored_mols = db_mgf_mols_handlers.get_unscreened(
+            connection, target_id, reactive_pattern_set.hash
+        )
+        new_bitmasks = yield from _screen_bitmasks(
+            [stored_mols.get(chembl_ids[k]) for k in missing],
+            reactive_pattern_set,
+            n_jobs,
+        )
+        for k, bitmask in zip(missing, new_bitmasks):
+            bitmasks[k] = bitmask
+        db_mgf_mols_handlers.update_reactive_bits(
+            connection,
+            target_id,
+            reactive_pattern_set.hash,
+            ((chembl_ids[k], bitmasks[k]) for k in missing),
+        )
+        yield {"log": f"🗃️ Stored the hits of {len(missing)} molecules"}
+    db_mg_fragments.close_db_connection(connection)
+    yield {"result": bitmasks_to_hits(bitmasks, n_patterns)}
+
+
+def stored_fragment_hit_matrix(
+    smiles_list: Sequence[str],
+    reactive_pattern_set: ReactivePatternSet,
+    n_jobs: None | int = settings.SCREENING_N_JOBS,
+) -> Generator[dict[str, str | np.ndarray], None, None]:
+    """Get the hit matrix of fragments from the fragments store, with logging.
+
+    Like `stored_hit_matrix`, with the bitmasks stored in the 'fragments' table;
+    the fragments without bitmask for the pattern set are screened from their
+    SMILES.
+
+    Args:
+        smiles_list (Sequence[str]): SMILES of the stored fragments.
+        reactive_pattern_set (ReactivePatternSet): Compiled reactive patterns.
+        n_jobs (None | int): Number of worker processes, see `screen_reactive`.
+
+    Yields:
+        dict: `{"log": str}` progress messages and a final `{"result": np.ndarray}`
+            with the boolean (fragments x patterns) hit matrix.
+    """
+    n_patterns = len(reactive_pattern_set)
+    if n_patterns > REACTIVE_BITMASK_MAX_PATTERNS:
+        yield from screen_reactive(smiles_list, reactive_pattern_set, n_jobs=n_jobs)
+        return
+
+    connection = db_mg_fragments.get_db_connection()
+    stored = db_mgf_fragments_handlers.get_reactive_bits(
+        connection, smiles_list, reactive_pattern_set.hash
+    )
+    bitmasks = [stored.get(smiles) for smiles in smiles_list]
+    missing = [k for k, bitmask in enumerate(bitmasks) if bitmask is None]
+    yield {"log": f"🗃️ Found {len(bitmasks) - len(missing)} screened fragments"}
+    if missing:
+        new_bitmasks = yield from _screen_bitmasks(
+            [smiles_list[k] for k in missing], reactive_pattern_set, n_jobs
+        )
+        for k, bitmask in zip(missing, new_bitmasks):
+            bitmasks[k] = bitmask
+        db_mgf_fragments_handlers.update_reactive_bits(
+            connection,
+            reactive_pattern_set.hash,
+            ((smiles_list[k], bitmasks[k]) for k in missing),
+        )
+        yield {"log": f"🗃️ Stored the hits of {len(missing)} fragments"}
+    db_mg_fragments.close_db_connection(connection)
+    yield {"result": bitmasks_to_hits(bitmasks, n_patterns)}
+
+
 class Flexibility(str, Enum):
     """Enum to represent the flexibility of a molecule.
 
@@ -61,21 +444,53 @@ class Flexibility(str, Enum):
 
 
 def mol_reactive(
-    mol: Mol, reactive_pattern_list: None | list[ReactivePattern] = None
+    mol: Mol,
+    reactive_pattern_list: None | list[ReactivePattern] | ReactivePatternSet = None,
 ) -> bool:
     """Check if a molecule contains electrophilic groups using precompiled SMARTS.
 
     Args:
         mol (Mol): Molecule to check.
+        reactive_pattern_list (list[ReactivePattern] | ReactivePatternSet): Reactive
+            patterns. Default None, the cached set of `settings.REACTIVE_PATTERN_FILE`.
 
     Returns:
         bool: True if the molecule contains reactive groups, False otherwise.
     """
     if reactive_pattern_list is None:
-        reactive_pattern_list = get_reactive_pattern_list()
+        reactive_pattern_list = load_reactive_pattern_set()
+    if isinstance(reactive_pattern_list, ReactivePatternSet):
+        return reactive_pattern_list.any_match(mol)
     return any(mol.HasSubstructMatch(pattern.mol) for pattern in reactive_pattern_list)
 
 
+class Descriptors(NamedTuple):
+    """Precomputed descriptors of a molecule, stored with the molecules and fragments."""
+
+    num_atoms: int
+    num_heavy_atoms: int
+    num_rot_bonds: int
+    num_rings: int
+
+
+def mol_descriptors(mol: Mol) -> Descriptors:
+    """Compute the descriptors used by the molecule and fragment filters.
+
+    Args:
+        mol (Mol): RDKit molecule object.
+
+    Returns:
+        Descriptors: Number of atoms, as checked by `mol_dimension_range`, of heavy
+            atoms, of rotatable bonds, as checked by `mol_flexibility`, and of rings.
+    """
+    return Descriptors(
+        num_atoms=mol.GetNumAtoms(),
+        num_heavy_atoms=mol.GetNumHeavyAtoms(),
+        num_rot_bonds=rdMolDescriptors.CalcNumRotatableBonds(mol),
+        num_rings=rdMolDescriptors.CalcNumRings(mol),
+    )
+
+
 def mol_dimension_range(mol: Mol, min_atoms: int = 0, max_atoms: int = 0) -> bool:
     """Check if the dimension of the molecule is between the acceptance values.
 
@@ -1,21 +1,92 @@
 """Chemical fragment generation and filtering."""
 
-from rdkit.Chem import BRICS, Mol, MolFromSmiles, rdMolDescriptors
+import os
+import sqlite3
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Callable, Generator, Iterable, Sequence
 
+import numpy as np
+from rdkit.Chem import BRICS, Mol, MolFromSmiles, MolToSmiles, rdMolDescriptors
 
-def brics_from_mol(mol: Mol, min_size: int = 1) -> list[str]:
+import db_mg_fragments
+import db_mg_fragments.handlers.fragments as db_mgf_fragments_handlers
+import settings
+from chem import filters as chem_filters
+from chem import utils as chem_utils
+
+
+def _exceeds_max_bonds(mol: Mol, max_bonds: None | int) -> bool:
+    """Check if a molecule has more than `max_bonds` BRICS bonds, None being no limit."""
+    return max_bonds is not None and len(list(BRICS.FindBRICSBonds(mol))) > max_bonds
+
+
+def brics_from_mol(
+    mol: Mol,
+    min_size: int = 1,
+    max_size: int = 0,
+    single_pass: bool = False,
+    return_mols: bool = False,
+    max_bonds: None | int = None,
+) -> list[str] | list[Mol]:
     """Generate BRICS fragments from a molecule.
 
+    The sizes count the atoms of a fragment without its dummy attachment atoms.
+    `min_size` is enforced by RDKit while decomposing: a bond is not broken when a
+    resulting piece would be too small, so such pieces stay attached to their
+    neighbours. RDKit has no maximum size, so `max_size` drops the larger final
+    fragments.
+
+    The full decomposition grows much faster than the number of BRICS bonds, so
+    the molecules with more than `max_bonds` of them are decomposed in a single
+    pass, breaking each bond on its own. This changes which fragments come out:
+    each of them is one of the two pieces around a single BRICS bond, so they are
+    larger than the ones of the full decomposition. RDKit also returns the whole
+    molecule in a single pass; it is left out, like any piece without a dummy
+    attachment atom, so a molecule without BRICS bonds has no fragment.
+
     Args:
         mol (Mol): RDKit molecule object.
         min_size (int, optional): Minimum size of the BRIC fragment.
             Default is 1, meaning all fragments are returned.
+        max_size (int, optional): Maximum size of the BRIC fragment.
+            Default is 0, meaning no maximum.
+        single_pass (bool, optional): Break each BRICS bond on its own, instead of
+            decomposing the fragments recursively. Default is False.
+        return_mols (bool, optional): Return the fragments as the molecules built
+            by RDKit rather than as SMILES. Default is False.
+        max_bonds (None | int, optional): Number of BRICS bonds above which the
+            molecule is decomposed in a single pass. Default None, no limit.
+            The fragmentation engines report how many molecules were affected.
 
     Returns:
-        list[str]: List of BRICS fragments as SMILES strings.
+        list[str] | list[Mol]: List of BRICS fragments as SMILES strings,
+            or as RDKit molecule objects with `return_mols`.
     """
-    # TODO: can be defined a minimum dimension of the BRIC with minFragmentSize
-    return BRICS.BRICSDecompose(mol, minFragmentSize=min_size)
+    single_pass = single_pass or _exceeds_max_bonds(mol, max_bonds)
+    as_mols = return_mols or max_size > 0
+    fragments = BRICS.BRICSDecompose(
+        mol, minFragmentSize=min_size, singlePass=single_pass, returnMols=as_mols
+    )
+    if single_pass:
+        fragments = [
+            frag
+            for frag in fragments
+            if (
+                any(atom.GetAtomicNum() == 0 for atom in frag.GetAtoms())
+                if as_mols
+                else "*" in frag
+            )
+        ]
+    if max_size > 0:
+        fragments = [
+            frag_mol
+            for frag_mol in fragments
+            if sum(atom.GetAtomicNum() != 0 for atom in frag_mol.GetAtoms()) <= max_size
+        ]
+        if not return_mols:
+            fragments = [MolToSmiles(frag_mol) for frag_mol in fragments]
+    return list(fragments)
 
 
 def filtered_fragments_from_mol(
@@ -44,3 +115,608 @@ def filtered_fragments_from_mol(
             ):
                 frag_mols_list.append(frag_mol)
     return frag_mols_list
+
+
+@dataclass
+class FragmentFilter:
+    """Size and flexibility criteria of the fragments, checked with `chem.filters`."""
+
+    min_atoms: int = 0
+    max_atoms: int = 0
+    flexibility: None | chem_filters.Flexibility = None
+    max_rotable_bonds: None | int = None
+
+    def accepts(self, mol: Mol) -> bool:
+        """Check if a fragment meets the criteria.
+
+        Args:
+            mol (Mol): RDKit molecule object of the fragment.
+
+        Returns:
+            bool: True if the fragment is kept, False otherwise.
+        """
+        if not chem_filters.mol_dimension_range(mol, self.min_atoms, self.max_atoms):
+            return False
+        return self.flexibility is None or chem_filters.mol_flexibility(
+            mol, self.flexibility, self.max_rotable_bonds
+        )
+
+    def num_rot_bonds(self) -> None | int:
+        """Get the number of rotatable bonds required by the flexibility criterion.
+
+        Returns:
+            None | int: Number of rotatable bonds, None when the flexibility is unset.
+        """
+        if self.flexibility is None:
+            return None
+        if self.flexibility == chem_filters.Flexibility.RIGID:
+            return 0
+        return self.max_rotable_bonds or 1
+
+    def sql_where(self, alias: str = "") -> tuple[str, list[int]]:
+        """Compile the criteria to an SQL condition on the stored descriptor columns.
+
+        The condition selects the same fragments as `accepts`, from the columns
+        of `chem.filters.mol_descriptors`.
+
+        Args:
+            alias (str): Alias of the table holding the descriptor columns.
+                Default "" (no alias).
+
+        Returns:
+            tuple[str, list[int]]: Condition for a WHERE clause and its parameters.
+        """
+        prefix = f"{alias}." if alias else ""
+        conditions = [f"{prefix}num_atoms >= ?"]
+        args = [self.min_atoms]
+        if self.max_atoms:
+            conditions.append(f"{prefix}num_atoms <= ?")
+            args.append(self.max_atoms)
+        num_rot_bonds = self.num_rot_bonds()
+        if num_rot_bonds is not None:
+            conditions.append(f"{prefix}num_rot_bonds = ?")
+            args.append(num_rot_bonds)
+        return " AND ".join(conditions), args
+
+
+def _brics_options(
+    min_size: int, max_size: int, max_bonds: None | int
+) -> dict[str, Any]:
+    """Get the `brics_from_mol` keyword arguments used by the fragmentation engine."""
+    return {"min_size": min_size, "max_size": max_size, "max_bonds": max_bonds}
+
+
+# Decomposition settings, fragments already seen and fragment descriptors of the
+# current worker process, set by _init_brics_worker in the pool workers only.
+_worker_brics_options: dict[str, Any] = {}
+_worker_filter: None | FragmentFilter = None
+_worker_seen: set[str] = set()
+_worker_descriptors: dict[str, None | chem_filters.Descriptors] = {}
+
+
+def _to_mol(data: None | Mol | bytes) -> None | Mol:
+    """Get a molecule from a Mol or its binary pickle."""
+    if isinstance(data, bytes):
+        return chem_utils.mol_from_pickle(data)
+    return data
+
+
+def _to_pickle(data: None | Mol) -> None | bytes:
+    """Get the binary pickle of a molecule."""
+    return chem_utils.mol_to_pickle(data) if data is not None else None
+
+
+def _engine_brics(mol: Mol, brics_options: dict[str, Any]) -> tuple[list[str], bool]:
+    """Decompose a molecule with the engine settings, telling if it took a single pass."""
+    single_pass = _exceeds_max_bonds(mol, brics_options["max_bonds"])
+    fragments = brics_from_mol(
+        mol,
+        min_size=brics_options["min_size"],
+        max_size=brics_options["max_size"],
+        single_pass=single_pass,
+    )
+    return fragments, single_pass
+
+
+def _single_pass_log(n_single_pass: int, max_bonds: None | int) -> dict[str, str]:
+    """Get the log of the molecules decomposed in a single pass, see `brics_from_mol`."""
+    return {
+        "log": f"✂️ {n_single_pass} molecules with more than {max_bonds} BRICS bonds "
+        "decomposed in a single pass"
+    }
+
+
+def _decompose(
+    mol_list: list[None | Mol],
+    brics_options: dict[str, Any],
+    fragment_filter: None | FragmentFilter,
+    seen: set[str],
+) -> tuple[list[str], int]:
+    """Decompose molecules, keeping the unseen fragments that pass the filter.
+
+    Every decomposed fragment is added to `seen`, kept or not, so that it is
+    neither parsed nor checked again. The number of molecules decomposed in a
+    single pass is returned along with the fragments.
+    """
+    fragments = []
+    n_single_pass = 0
+    for mol in mol_list:
+        if mol is None:
+            continue
+        mol_fragments, single_pass = _engine_brics(mol, brics_options)
+        n_single_pass += single_pass
+        for smiles in mol_fragments:
+            if smiles in seen:
+                continue
+            seen.add(smiles)
+            frag_mol = MolFromSmiles(smiles)
+            if frag_mol is None:
+                continue
+            if fragment_filter is None or fragment_filter.accepts(frag_mol):
+                fragments.append(smiles)
+    return fragments, n_single_pass
+
+
+def _decompose_with_descriptors(
+    parents: list[tuple[str, None | Mol]],
+    brics_options: dict[str, Any],
+    descriptors: dict[str, None | chem_filters.Descriptors],
+) -> tuple[list[tuple[str, list[tuple]]], list[str]]:
+    """Decompose parent molecules, describing all their fragments.
+
+    The descriptors of each fragment are computed once and kept in `descriptors`;
+    the fragments that cannot be parsed are left out. The SMILES of the parents
+    decomposed in a single pass are returned along with the decompositions.
+    """
+    decompositions = []
+    single_pass_parents = []
+    for parent_smiles, mol in parents:
+        fragments = []
+        mol_fragments, single_pass = (
+            _engine_brics(mol, brics_options) if mol is not None else ([], False)
+        )
+        if single_pass:
+            single_pass_parents.append(parent_smiles)
+        for smiles in mol_fragments:
+            if smiles not in descriptors:
+                frag_mol = MolFromSmiles(smiles)
+                descriptors[smiles] = (
+                    chem_filters.mol_descriptors(frag_mol)
+                    if frag_mol is not None
+                    else None
+                )
+            if descriptors[smiles] is not None:
+                fragments.append((smiles, *descriptors[smiles]))
+        decompositions.append((parent_smiles, fragments))
+    return decompositions, single_pass_parents
+
+
+def _init_brics_worker(
+    brics_options: dict[str, Any], fragment_filter: None | FragmentFilter = None
+) -> None:
+    """Set the decomposition settings once per worker process."""
+    global _worker_brics_options, _worker_filter, _worker_seen, _worker_descriptors
+    _worker_brics_options = brics_options
+    _worker_filter = fragment_filter
+    _worker_seen = set()
+    _worker_descriptors = {}
+
+
+def _brics_worker(mol_list: list[None | Mol | bytes]) -> tuple[list[str], int]:
+    """Decompose a chunk of molecules inside a worker process."""
+    return _decompose(
+        [_to_mol(data) for data in mol_list],
+        _worker_brics_options,
+        _worker_filter,
+        _worker_seen,
+    )
+
+
+def _brics_descriptors_worker(
+    parents: list[tuple[str, None | Mol | bytes]],
+) -> tuple[list[tuple[str, list[tuple]]], list[str]]:
+    """Decompose a chunk of parent molecules inside a worker process."""
+    return _decompose_with_descriptors(
+        [(parent_smiles, _to_mol(data)) for parent_smiles, data in parents],
+        _worker_brics_options,
+        _worker_descriptors,
+    )
+
+
+def _map_chunks(
+    worker: Callable[[list], Any],
+    local_worker: Callable[[list], Any],
+    items: Sequence,
+    encode: Callable[[Any], Any],
+    initargs: tuple,
+    n_jobs: int,
+    chunk_size: int,
+) -> Generator[tuple[int, int, Any], None, None]:
+    """Run a BRICS worker on chunks of items over a process pool.
+
+    The chunks are encoded item by item, e.g. to binary pickles, only when sent to
+    the worker processes. With `n_jobs` 1, or a single chunk, `local_worker` runs
+    in the current process on the items as they are; it holds its own state, e.g.
+    in a closure, so the worker globals are never set outside the pool, where
+    concurrent sessions would share them.
+
+    Yields:
+        tuple[int, int, Any]: Index and length of each chunk, with the worker
+            result, in completion order.
+    """
+    n = len(items)
+    chunks = enumerate(range(0, n, chunk_size))
+    if n_jobs == 1 or n <= chunk_size:
+        for chunk_idx, start in chunks:
+            stop = start + chunk_size
+            chunk = items[start:stop]
+            yield chunk_idx, len(chunk), local_worker(chunk)
+        return
+
+    with ProcessPoolExecutor(
+        max_workers=n_jobs, initializer=_init_brics_worker, initargs=initargs
+    ) as executor:
+        pending = {}
+        while True:
+            # keep a bounded number of chunks in flight
+            while len(pending) < 2 * n_jobs:
+                chunk_idx, start = next(chunks, (None, None))
+                if chunk_idx is None:
+                    break
+                stop = start + chunk_size
+                chunk = [encode(item) for item in items[start:stop]]
+                pending[executor.submit(worker, chunk)] = (chunk_idx, len(chunk))
+            if not pending:
+                break
+            completed, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in completed:
+                chunk_idx, n_chunk = pending.pop(future)
+                yield chunk_idx, n_chunk, future.result()
+
+
+def brics_fragments(
+    mol_list: Sequence[None | Mol],
+    fragment_filter: None | FragmentFilter = None,
+    min_size: int = 1,
+    max_size: int = 0,
+    max_bonds: None | int = settings.FRAGMENTS_MAX_BRICS_BONDS,
+    n_jobs: None | int = settings.FRAGMENTS_N_JOBS,
+    chunk_size: int = settings.FRAGMENTS_CHUNK_SIZE,
+) -> Generator[dict[str, str | list[str]], None, None]:
+    """Generate the unique BRICS fragments of molecules over a process pool, with logging.
+
+    Duplicate molecules are decomposed once. The molecules are split into chunks
+    which are dispatched to the worker processes as binary pickles. Each worker
+    skips the fragments it has already seen and applies `fragment_filter`, so only
+    new surviving fragments are sent back; the fragments found by several workers
+    are deduplicated here.
+
+    Args:
+        mol_list (Sequence[None | Mol]): Molecules to decompose.
+        fragment_filter (None | FragmentFilter): Criteria of the kept fragments.
+            Default None (all fragments are kept).
+        min_size (int): Minimum size of the BRICS fragments, see `brics_from_mol`.
+        max_size (int): Maximum size of the BRICS fragments, see `brics_from_mol`.
+        max_bonds (None | int): Number of BRICS bonds above which a molecule is
+            decomposed in a single pass, see `brics_from_mol`. None is no limit.
+        n_jobs (None | int): Number of worker processes. None uses all the CPUs,
+            1 decomposes the molecules in the current process.
+        chunk_size (int): Number of molecules sent to a worker in a single task.
+
+    Yields:
+        dict: `{"log": str, "fragments": list[str]}` with the SMILES of the new
+            fragments of each chunk, as they are produced, a `{"log": str}` with
+            the number of molecules decomposed in a single pass, if any, and a
+            final `{"result": list[str]}` with the SMILES of all the unique
+            fragments, in the order of the molecules.
+    """
+    # BRICS is much slower than writing the SMILES used to find the duplicates
+    mol_list = list(
+        {
+            chem_utils.smiles_from_mol(mol): mol for mol in mol_list if mol is not None
+        }.values()
+    )
+    n = len(mol_list)
+    n_jobs = n_jobs or os.cpu_count() or 1
+    if n_jobs > 1 and n > chunk_size:
+        yield {"log": f"⚙️ Dispatching {n} molecules to {n_jobs} BRICS workers..."}
+
+    options = _brics_options(min_size, max_size, max_bonds)
+    seen = set()
+    chunk_fragments = {}
+    unique = set()
+    done = 0
+    n_single_pass = 0
+    for chunk_idx, n_chunk, (fragments, chunk_single_pass) in _map_chunks(
+        _brics_worker,
+        lambda chunk: _decompose(chunk, options, fragment_filter, seen),
+        mol_list,
+        _to_pickle,
+        (options, fragment_filter),
+        n_jobs,
+        chunk_size,
+    ):
+        chunk_fragments[chunk_idx] = fragments
+        n_single_pass += chunk_single_pass
+        new_fragments = [smiles for smiles in fragments if smiles not in unique]
+        unique.update(new_fragments)
+        done += n_chunk
+        yield {
+            "log": f"⏳ Molecules decomposed: {done}/{n}",
+            "fragments": new_fragments,
+        }
+
+    if n_single_pass:
+        yield _single_pass_log(n_single_pass, max_bonds)
+    result = {}
+    for chunk_idx in sorted(chunk_fragments):
+        result.update(dict.fromkeys(chunk_fragments[chunk_idx]))
+    yield {"log": f"✅ Generated {len(result)} unique fragments"}
+    yield {"result": list(result)}
+
+
+def brics_decompositions(
+    parents: Sequence[tuple[str, None | Mol]],
+    min_size: int = 1,
+    max_size: int = 0,
+    max_bonds: None | int = settings.FRAGMENTS_MAX_BRICS_BONDS,
+    n_jobs: None | int = settings.FRAGMENTS_N_JOBS,
+    chunk_size: int = settings.FRAGMENTS_CHUNK_SIZE,
+) -> Generator[dict[str, str | list], None, None]:
+    """Decompose parent molecules over a process pool, describing all their fragments.
+
+    Unlike `brics_fragments`, the fragments are not filtered and are reported for
+    each parent, so that the decompositions can be stored and filtered later.
+
+    Args:
+        parents (Sequence[tuple[str, None | Mol]]): (parent SMILES, molecule) pairs.
+        min_size (int): Minimum size of the BRICS fragments, see `brics_from_mol`.
+        max_size (int): Maximum size of the BRICS fragments, see `brics_from_mol`.
+        max_bonds (None | int): Number of BRICS bonds above which a molecule is
+            decomposed in a single pass, see `brics_from_mol`. None is no limit.
+        n_jobs (None | int): Number of worker processes. None uses all the CPUs,
+            1 decomposes the molecules in the current process.
+        chunk_size (int): Number of molecules sent to a worker in a single task.
+
+    Yields:
+        dict: `{"log": str}` progress messages, a `{"log": str, "single_pass":
+            list[str]}` with the SMILES of the parents decomposed in a single pass,
+            if any, and a final `{"result": list}` with a (parent SMILES,
+            [(fragment SMILES, *Descriptors), ...]) pair for each parent, in
+            completion order, see `chem.filters.mol_descriptors`.
+    """
+    n = len(parents)
+    n_jobs = n_jobs or os.cpu_count() or 1
+    if n_jobs > 1 and n > chunk_size:
+        yield {"log": f"⚙️ Dispatching {n} molecules to {n_jobs} BRICS workers..."}
+
+    options = _brics_options(min_size, max_size, max_bonds)
+    descriptors = {}
+    decompositions = []
+    single_pass_parents = []
+    for _, n_chunk, (chunk_decompositions, chunk_single_pass) in _map_chunks(
+        _brics_descriptors_worker,
+        lambda chunk: _decompose_with_descriptors(chunk, options, descriptors),
+        parents,
+        lambda parent: (parent[0], _to_pickle(parent[1])),
+        (options,),
+        n_jobs,
+        chunk_size,
+    ):
+        decompositions.extend(chunk_decompositions)
+        single_pass_parents.extend(chunk_single_pass)
+        yield {"log": f"⏳ Molecules decomposed: {len(decompositions)}/{n}"}
+    if single_pass_parents:
+        yield {
+            **_single_pass_log(len(single_pass_parents), max_bonds),
+            "single_pass": single_pass_parents,
+        }
+    yield {"result": decompositions}
+
+
+def _brics_params(brics_options: dict[str, Any]) -> str:
+    """Get the key of the BRICS decomposition parameters used by the fragments store."""
+    params = f"minFragmentSize={brics_options['min_size']}"
+    if brics_options["max_size"] > 0:
+        params += f";maxFragmentSize={brics_options['max_size']}"
+    if brics_options["max_bonds"] is not None:
+        params += f";maxBricsBonds={brics_options['max_bonds']}"
+    return params
+
+
+def _store_decompositions(
+    connection: sqlite3.Connection,
+    parent_mols: dict[str, None | Mol],
+    params: str,
+    brics_options: dict[str, Any],
+    n_jobs: None | int,
+) -> Generator[dict[str, str], None, None]:
+    """Decompose and store the parents missing from the fragments store, with logging."""
+    undecomposed = db_mgf_fragments_handlers.get_undecomposed(
+        connection, parent_mols, params
+    )
+    yield {
+        "log": f"🗃️ Found {len(parent_mols) - len(undecomposed)} decomposed molecules"
+    }
+    if not undecomposed:
+        return
+    for item in brics_decompositions(
+        [(parent_smiles, parent_mols[parent_smiles]) for parent_smiles in undecomposed],
+        **brics_options,
+        n_jobs=n_jobs,
+    ):
+        if "log" in item:
+            yield item
+        elif "result" in item:
+            db_mgf_fragments_handlers.insert_decompositions(
+                connection, item["result"], params
+            )
+    yield {"log": f"🗃️ Stored the fragments of {len(undecomposed)} molecules"}
+
+
+def _stored_fragment_rows(
+    parents: Sequence[tuple[str, None | Mol]],
+    fragment_filter: None | FragmentFilter,
+    brics_options: dict[str, Any],
+    n_jobs: None | int,
+) -> Generator[dict[str, str], None, list[tuple]]:
+    """Store the missing decompositions, with logging, returning the fragments passing the filter."""
+    params = _brics_params(brics_options)
+    parent_mols = dict(parents)
+    connection = db_mg_fragments.get_db_connection()
+    yield from _store_decompositions(
+        connection, parent_mols, params, brics_options, n_jobs
+    )
+    where, args = (fragment_filter or FragmentFilter()).sql_where(alias="f")
+    rows = db_mgf_fragments_handlers.get_by_parents(
+        connection, parent_mols, params, where, args
+    )
+    db_mg_fragments.close_db_connection(connection)
+    return rows
+
+
+def stored_brics_fragments(
+    parents: Sequence[tuple[str, None | Mol]],
+    fragment_filter: None | FragmentFilter = None,
+    min_size: int = 1,
+    max_size: int = 0,
+    max_bonds: None | int = settings.FRAGMENTS_MAX_BRICS_BONDS,
+    n_jobs: None | int = settings.FRAGMENTS_N_JOBS,
+) -> Generator[dict[str, str | list[str]], None, None]:
+    """Get the unique BRICS fragments of parent molecules from the fragments store, with logging.
+
+    Only the parents not yet in the 'parent_fragments' table are decomposed, with
+    `brics_decompositions`, and stored; the fragments are then selected by an SQL
+    query on their precomputed descriptors, see `FragmentFilter.sql_where`.
+
+    Args:
+        parents (Sequence[tuple[str, None | Mol]]): (parent SMILES, molecule) pairs,
+            the parent SMILES being the key of the stored decompositions.
+        fragment_filter (None | FragmentFilter): Criteria of the kept fragments.
+            Default None (all fragments are kept).
+        min_size (int): Minimum size of the BRICS fragments, see `brics_from_mol`.
+        max_size (int): Maximum size of the BRICS fragments, see `brics_from_mol`.
+        max_bonds (None | int): Number of BRICS bonds above which a molecule is
+            decomposed in a single pass, see `brics_from_mol`. None is no limit.
+        n_jobs (None | int): Number of worker processes, see `brics_decompositions`.
+
+    Yields:
+        dict: `{"log": str}` progress messages and a final `{"result": list[str]}`
+            with the SMILES of the fragments, sorted.
+    """
+    rows = yield from _stored_fragment_rows(
+        parents,
+        fragment_filter,
+        _brics_options(min_size, max_size, max_bonds),
+        n_jobs,
+    )
+    fragments = [row[0] for row in rows]
+    yield {"log": f"✅ Selected {len(fragments)} unique fragments"}
+    yield {"result": fragments}
+
+
+class FragmentPool:
+    """Candidate fragments, with their descriptors as NumPy columns.
+
+    Filtering the pool only computes a boolean mask over the descriptor columns,
+    and the fragments are parsed once, when first selected.
+    """
+
+    def __init__(self, rows: Sequence[tuple]):
+        """Build the descriptor columns.
+
+        Args:
+            rows (Sequence[tuple]): (fragment SMILES, *Descriptors) rows, see
+                `chem.filters.mol_descriptors`.
+        """
+        self.smiles = [row[0] for row in rows]
+        columns = np.array([row[1:] for row in rows], dtype=np.int64).reshape(
+            len(rows), len(chem_filters.Descriptors._fields)
+        )
+        self.descriptors = {
+            name: columns[:, k]
+            for k, name in enumerate(chem_filters.Descriptors._fields)
+        }
+        self._mols: list[None | Mol] = [None] * len(rows)
+
+    def __len__(self) -> int:
+        """Number of fragments of the pool."""
+        return len(self.smiles)
+
+    def mask(self, fragment_filter: FragmentFilter) -> np.ndarray:
+        """Get the fragments meeting the criteria of a filter.
+
+        The mask selects the same fragments as `FragmentFilter.accepts` and
+        `FragmentFilter.sql_where`, from the descriptor columns.
+
+        Args:
+            fragment_filter (FragmentFilter): Criteria of the kept fragments.
+
+        Returns:
+            np.ndarray: Boolean mask of the kept fragments.
+        """
+        num_atoms = self.descriptors["num_atoms"]
+        mask = num_atoms >= fragment_filter.min_atoms
+        if fragment_filter.max_atoms:
+            mask &= num_atoms <= fragment_filter.max_atoms
+        num_rot_bonds = fragment_filter.num_rot_bonds()
+        if num_rot_bonds is not None:
+            mask &= self.descriptors["num_rot_bonds"] == num_rot_bonds
+        return mask
+
+    def mols(self, indices: Iterable[int]) -> list[Mol]:
+        """Get the RDKit molecules of fragments, parsing them on first use.
+
+        Args:
+            indices (Iterable[int]): Indices of the fragments in the pool.
+
+        Returns:
+            list[Mol]: RDKit molecule objects of the fragments.
+        """
+        mol_list = []
+        for k in indices:
+            if self._mols[k] is None:
+                self._mols[k] = MolFromSmiles(self.smiles[k])
+            mol_list.append(self._mols[k])
+        return mol_list
+
+
+def stored_fragment_pool(
+    parents: Sequence[tuple[str, None | Mol]],
+    fragment_filter: None | FragmentFilter = None,
+    min_size: int = 1,
+    max_size: int = 0,
+    max_bonds: None | int = settings.FRAGMENTS_MAX_BRICS_BONDS,
+    n_jobs: None | int = settings.FRAGMENTS_N_JOBS,
+) -> Generator[dict[str, str | FragmentPool], None, None]:
+    """Get the pool of the unique BRICS fragments of parent molecules, with logging.
+
+    Like `stored_brics_fragments`, the candidate fragments are selected by an SQL
+    query on their stored descriptors; the pool keeps these descriptors, so that
+    it can be filtered again by stricter criteria, e.g. the size thresholds,
+    whenever they change, see `FragmentPool.mask`.
+
+    Args:
+        parents (Sequence[tuple[str, None | Mol]]): (parent SMILES, molecule) pairs,
+            the parent SMILES being the key of the stored decompositions.
+        fragment_filter (None | FragmentFilter): Criteria of the candidate fragments.
+            Default None (all fragments are candidates).
+        min_size (int): Minimum size of the BRICS fragments, see `brics_from_mol`.
+        max_size (int): Maximum size of the BRICS fragments, see `brics_from_mol`.
+        max_bonds (None | int): Number of BRICS bonds above which a molecule is
+            decomposed in a single pass, see `brics_from_mol`. None is no limit.
+        n_jobs (None | int): Number of worker processes, see `brics_decompositions`.
+
+    Yields:
+        dict: `{"log": str}` progress messages and a final
+            `{"result": FragmentPool}` with the candidate fragments, sorted by SMILES.
+    """
+    rows = yield from _stored_fragment_rows(
+        parents,
+        fragment_filter,
+        _brics_options(min_size, max_size, max_bonds),
+        n_jobs,
+    )
+    pool = FragmentPool(rows)
+    yield {"log": f"✅ Pooled {len(pool)} unique fragments"}
+    yield {"result": pool}
@@ -68,6 +68,30 @@ def mol_from_smarts(smarts: str) -> Mol:
     return MolFromSmarts(smarts)
 
 
+def mol_to_pickle(mol: Mol) -> bytes:
+    """Serialize an RDKit molecule to its binary pickle.
+
+    Args:
+        mol (Mol): RDKit molecule object
+
+    Returns:
+        bytes: binary representation of the molecule
+    """
+    return mol.ToBinary()
+
+
+def mol_from_pickle(data: bytes) -> Mol:
+    """Create an RDKit molecule from its binary pickle.
+
+    Args:
+        data (bytes): binary representation of the molecule
+
+    Returns:
+        Mol: RDKit molecule object
+    """
+    return Mol(data)
+
+
 def unique_mol_list(mol_list: list[Mol]) -> list[Mol]:
     """Remove duplicate molecules from a list of RDKit molecules.
 
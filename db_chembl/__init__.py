@@ -1,27 +1,82 @@
-"""Database connection module for ChEMBL database."""
+"""Database connection module for ChEMBL database.
+
+The ChEMBL database is never modified, so it is opened read-only and immutable,
+memory-mapped, and each thread reuses its own connection to keep a warm page cache.
+"""
 
 import os
 import sqlite3
+import threading
+from urllib.request import pathname2url
+
+import settings
 
 DB_NAME = "chembl_35.db"
 DB_PATH = os.path.join(os.path.dirname(__file__), DB_NAME)
+TARGET_INDEX_DB_NAME = "chembl_35_target_index.db"
+TARGET_INDEX_DB_PATH = os.path.join(os.path.dirname(__file__), TARGET_INDEX_DB_NAME)
+TARGET_INDEX_SCHEMA = "target_index"
+
+_pool = threading.local()
+_pool_generation = 0
+
+
+def _read_only_uri(path: str) -> str:
+    """Get the URI opening a database file as read-only and immutable."""
+    return f"file:{pathname2url(os.path.abspath(path))}?mode=ro&immutable=1"
+
+
+def _connect() -> sqlite3.Connection:
+    """Open a new read-only connection to the SQLite database."""
+    connection = sqlite3.connect(_read_only_uri(DB_PATH), uri=True)
+    connection.row_factory = sqlite3.Row
+    connection.execute(f"PRAGMA mmap_size = {settings.CHEMBL_MMAP_SIZE}")
+    connection.execute(f"PRAGMA cache_size = -{settings.CHEMBL_CACHE_SIZE_KIB}")
+    connection.execute("PRAGMA query_only = ON")
+    if os.path.exists(TARGET_INDEX_DB_PATH):
+        connection.execute(
+            f"ATTACH DATABASE ? AS {TARGET_INDEX_SCHEMA}",
+            (_read_only_uri(TARGET_INDEX_DB_PATH),),
+        )
+    return connection
 
 
 def get_db_connection() -> sqlite3.Connection:
-    """Get a connection to the SQLite database.
+    """Get the connection of the current thread to the SQLite database.
+
+    The connection is opened on first use in each thread and then reused.
+    The target index built by `db_chembl.target_index` is attached when available.
 
     Returns:
         sqlite3.Connection: A connection object to the SQLite database.
     """
-    connection = sqlite3.connect(DB_PATH)
-    connection.row_factory = sqlite3.Row
+    connection = getattr(_pool, "connection", None)
+    if connection is None or _pool.generation != _pool_generation:
+        if connection is not None:
+            connection.close()
+        connection = _connect()
+        _pool.connection = connection
+        _pool.generation = _pool_generation
     return connection
 
 
+def reset_db_connections() -> None:
+    """Make every thread open a new connection on its next `get_db_connection` call.
+
+    Used after the database files change, e.g. when the target index is rebuilt.
+    """
+    global _pool_generation
+    _pool_generation += 1
+
+
 def close_db_connection(connection: sqlite3.Connection) -> None:
-    """Close the SQLite database connection.
+    """Release the SQLite database connection.
+
+    The pooled connection of the current thread is kept open for reuse;
+    any other connection is closed.
 
     Args:
         connection (sqlite3.Connection): A connection object to the SQLite database.
     """
-    connection.close()
+    if connection is not getattr(_pool, "connection", None):
+        connection.close()
@@ -0,0 +1,91 @@
+"""Target to molecule index of the ChEMBL database.
+
+The lookup of the molecules of a target in ChEMBL joins five tables, scanning
+the activities of the target assays. This module materializes the result of that
+join for every target, once, into a sidecar SQLite database clustered by target ID,
+so that the lookup of a target becomes an index range scan.
+The sidecar database is attached to the ChEMBL connections when it exists.
+
+The index can be built from the command line:
+
+    $ python -m db_chembl.target_index
+"""
+
+import os
+import sqlite3
+
+from logger import get_logger
+
+from . import (
+    DB_PATH,
+    TARGET_INDEX_DB_PATH,
+    TARGET_INDEX_SCHEMA,
+    reset_db_connections,
+)
+
+log = get_logger("DB CHEMBL")
+
+TABLE_NAME = "target_mols"
+
+
+def is_available(connection: sqlite3.Connection) -> bool:
+    """Check if the target index is attached to a ChEMBL connection.
+
+    Args:
+        connection (sqlite3.Connection): ChEMBL database connection.
+
+    Returns:
+        bool: True if the target index can be queried, False otherwise.
+    """
+    cursor = connection.cursor()
+    cursor.execute("PRAGMA database_list")
+    return any(row[1] == TARGET_INDEX_SCHEMA for row in cursor.fetchall())
+
+
+def build() -> None:
+    """Build the target index sidecar database from the ChEMBL database.
+
+    The index is written to a temporary file which replaces the previous index
+    only once complete.
+    """
+    log.debug(f"Building target index: {TARGET_INDEX_DB_PATH}")
+    tmp_path = f"{TARGET_INDEX_DB_PATH}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    connection = sqlite3.connect(tmp_path)
+    cursor = connection.cursor()
+    cursor.execute("ATTACH DATABASE ? AS chembl", (DB_PATH,))
+    query = f"""
+        CREATE TABLE {TABLE_NAME} (
+            target_id TEXT,
+            molregno INTEGER,
+            chembl_id TEXT,
+            canonical_smiles TEXT,
+            PRIMARY KEY (target_id, molregno)
+        ) WITHOUT ROWID
+    """
+    cursor.execute(query)
+    query = f"""
+        INSERT OR IGNORE INTO {TABLE_NAME}
+        SELECT DISTINCT
+            td.chembl_id AS target_id,
+            md.molregno,
+            md.chembl_id,
+            cs.canonical_smiles
+        FROM chembl.target_dictionary td
+        JOIN chembl.assays ass ON ass.tid = td.tid
+        JOIN chembl.activities act ON act.assay_id = ass.assay_id
+        JOIN chembl.molecule_dictionary md ON md.molregno = act.molregno
+        JOIN chembl.compound_structures cs ON cs.molregno = act.molregno
+    """
+    cursor.execute(query)
+    connection.commit()
+    cursor.execute("DETACH DATABASE chembl")
+    connection.close()
+    os.replace(tmp_path, TARGET_INDEX_DB_PATH)
+    reset_db_connections()
+    log.debug(f"Built target index: {TARGET_INDEX_DB_PATH}")
+
+
+if __name__ == "__main__":
+    build()
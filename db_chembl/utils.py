@@ -5,7 +5,12 @@ from typing import Any, Generator
 
 from logger import get_logger
 
-from . import get_db_connection
+from . import (
+    TARGET_INDEX_SCHEMA,
+    close_db_connection,
+    get_db_connection,
+    target_index,
+)
 
 log = get_logger("DB CHEMBL")
 
@@ -22,7 +27,7 @@ def get_available_target_ids():
     query = "SELECT DISTINCT chembl_id FROM target_dictionary"
     cursor.execute(query)
     target_ids = [row[0] for row in cursor.fetchall()]
-    connection.close()
+    close_db_connection(connection)
     log.debug(f"Fetched {len(target_ids)} target IDs")
     return target_ids
 
@@ -41,6 +46,17 @@ def get_mols_from_target_id(
     """
     log.debug(f"Fetching molecules for target ID: {target_id}")
     cursor = connection.cursor()
+    if target_index.is_available(connection):
+        query = f"""
+            SELECT target_id, chembl_id, canonical_smiles
+            FROM {TARGET_INDEX_SCHEMA}.{target_index.TABLE_NAME}
+            WHERE target_id = ?
+        """
+        cursor.execute(query, (target_id,))
+        for row in cursor:
+            yield row
+        log.debug(f"Fetched all result for target ID: {target_id} from target index")
+        return
     query = """
         SELECT DISTINCT
             td.chembl_id AS target_id,
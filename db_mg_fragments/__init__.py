@@ -1,27 +1,71 @@
-"""Database connection module for MG Fragment database."""
+"""Database connection module for MG Fragment database.
+
+The database runs in WAL mode, so the readers (e.g. the Explorer pages) are not
+blocked by an import writing. The released connections are kept in a pool shared
+by all the threads, since Streamlit runs each rerun on a new thread.
+The schema is migrated to the latest version when the first connection is opened.
+"""
 
 import os
 import sqlite3
+import threading
+
+import settings
+
+from . import migrations
 
 DB_NAME = "db_mg_fragments.db"
 DB_PATH = os.path.join(os.path.dirname(__file__), DB_NAME)
 
+_pool_lock = threading.Lock()
+_pool: list[sqlite3.Connection] = []
+
+
+def _connect() -> sqlite3.Connection:
+    """Open a new connection to the SQLite database, usable from any thread."""
+    connection = sqlite3.connect(
+        DB_PATH, timeout=settings.MGF_BUSY_TIMEOUT, check_same_thread=False
+    )
+    connection.row_factory = sqlite3.Row
+    connection.execute("PRAGMA journal_mode = WAL")
+    connection.execute("PRAGMA synchronous = NORMAL")
+    connection.execute(f"PRAGMA cache_size = -{settings.MGF_CACHE_SIZE_KIB}")
+    migrations.migrate(connection)
+    return connection
+
 
 def get_db_connection() -> sqlite3.Connection:
     """Get a connection to the SQLite database.
 
+    A released connection is taken from the pool when available, otherwise a new
+    one is opened. The connection is used by a single thread at a time, and must be
+    released with `close_db_connection`.
+
     Returns:
         sqlite3.Connection: A connection object to the SQLite database.
     """
-    connection = sqlite3.connect(DB_PATH)
-    connection.row_factory = sqlite3.Row
-    return connection
+    with _pool_lock:
+        if _pool:
+            return _pool.pop()
+    return _connect()
 
 
 def close_db_connection(connection: sqlite3.Connection) -> None:
-    """Close the SQLite database connection.
+    """Release the SQLite database connection.
+
+    Any uncommitted transaction is rolled back, then the connection is returned to
+    the pool, or closed when the pool already holds `settings.MGF_POOL_SIZE`
+    connections.
 
     Args:
         connection (sqlite3.Connection): A connection object to the SQLite database.
     """
+    if connection.in_transaction:
+        connection.rollback()
+    with _pool_lock:
+        if connection in _pool:
+            return
+        if len(_pool) < settings.MGF_POOL_SIZE:
+            _pool.append(connection)
+            return
     connection.close()
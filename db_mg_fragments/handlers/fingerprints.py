@@ -0,0 +1,82 @@
+"""Handler for the 'fingerprints' table in the SQLite database."""
+
+import sqlite3
+from typing import Iterable
+
+from logger import get_logger
+
+TABLE_NAME = "fingerprints"
+log = get_logger("DB MGF")
+
+
+def get_many(
+    connection: sqlite3.Connection,
+    smiles_list: Iterable[str],
+    radius: int,
+    fp_size: int,
+) -> dict[str, bytes]:
+    """Retrieves the stored fingerprints of the given molecules.
+
+    Args:
+        connection (sqlite3.Connection): SQLite database connection.
+        smiles_list (Iterable[str]): Canonical SMILES of the molecules.
+        radius (int): Morgan fingerprint radius.
+        fp_size (int): Morgan fingerprint size in bits.
+
+    Returns:
+        dict: Packed fingerprint bits keyed by canonical SMILES.
+    """
+    log.debug(f"Fetching from '{TABLE_NAME}' table")
+    cursor = connection.cursor()
+    cursor.execute(
+        "CREATE TEMP TABLE IF NOT EXISTS fingerprint_keys (smiles TEXT PRIMARY KEY)"
+    )
+    cursor.execute("DELETE FROM fingerprint_keys")
+    cursor.executemany(
+        "INSERT OR IGNORE INTO fingerprint_keys (smiles) VALUES (?)",
+        ((smiles,) for smiles in smiles_list),
+    )
+    query = f"""
+        SELECT f.canonical_smiles, f.fingerprint
+        FROM {TABLE_NAME} f
+        JOIN fingerprint_keys k ON k.smiles = f.canonical_smiles
+        WHERE f.radius = ? AND f.fp_size = ?
+    """
+    cursor.execute(query, (radius, fp_size))
+    res = {row[0]: row[1] for row in cursor.fetchall()}
+    cursor.execute("DELETE FROM fingerprint_keys")
+    connection.commit()
+    log.debug(f"Fetched {len(res)} entries from '{TABLE_NAME}' table")
+    return res
+
+
+def insert_many(
+    connection: sqlite3.Connection,
+    entries: Iterable[tuple[str, bytes]],
+    radius: int,
+    fp_size: int,
+) -> None:
+    """Inserts fingerprints into the 'fingerprints' table.
+
+    Args:
+        connection (sqlite3.Connection): SQLite database connection.
+        entries (Iterable[tuple[str, bytes]]): (canonical_smiles, fingerprint) entries.
+        radius (int): Morgan fingerprint radius.
+        fp_size (int): Morgan fingerprint size in bits.
+
+    Returns:
+        None
+    """
+    log.debug(f"Inserting into '{TABLE_NAME}' table")
+    cursor = connection.cursor()
+    query = f"""
+        INSERT OR REPLACE INTO {TABLE_NAME} (
+            canonical_smiles,
+            radius,
+            fp_size,
+            fingerprint
+        ) VALUES (?, ?, ?, ?)
+    """
+    cursor.executemany(query, ((smiles, radius, fp_size, fp) for smiles, fp in entries))
+    connection.commit()
+    log.debug(f"Inserted into '{TABLE_NAME}' table")
@@ -0,0 +1,223 @@
+"""Handler for the 'fragments' and 'parent_fragments' tables in the SQLite database."""
+
+import sqlite3
+from typing import Any, Iterable, Sequence
+
+from logger import get_logger
+
+TABLE_NAME = "fragments"
+PARENT_TABLE_NAME = "parent_fragments"
+DECOMPOSED_TABLE_NAME = "decomposed_parents"
+log = get_logger("DB MGF")
+
+
+def _set_smiles_keys(cursor: sqlite3.Cursor, smiles_list: Iterable[str]) -> None:
+    """Fill the temporary table of the SMILES joined by the queries."""
+    cursor.execute(
+        "CREATE TEMP TABLE IF NOT EXISTS smiles_keys (smiles TEXT PRIMARY KEY)"
+    )
+    cursor.execute("DELETE FROM smiles_keys")
+    cursor.executemany(
+        "INSERT OR IGNORE INTO smiles_keys (smiles) VALUES (?)",
+        ((smiles,) for smiles in smiles_list),
+    )
+
+
+def get_undecomposed(
+    connection: sqlite3.Connection, parent_smiles_list: Iterable[str], params: str
+) -> list[str]:
+    """Retrieves the parent molecules not yet decomposed with the given parameters.
+
+    Args:
+        connection (sqlite3.Connection): SQLite database connection.
+        parent_smiles_list (Iterable[str]): SMILES of the parent molecules.
+        params (str): BRICS decomposition parameters.
+
+    Returns:
+        list[str]: SMILES of the undecomposed parent molecules.
+    """
+    log.debug(f"Fetching undecomposed parents from '{DECOMPOSED_TABLE_NAME}' table")
+    cursor = connection.cursor()
+    _set_smiles_keys(cursor, parent_smiles_list)
+    query = f"""
+        SELECT k.smiles FROM smiles_keys k
+        WHERE NOT EXISTS (
+            SELECT 1 FROM {DECOMPOSED_TABLE_NAME} d
+            WHERE d.parent_smiles = k.smiles AND d.params = ?
+        )
+    """
+    cursor.execute(query, (params,))
+    res = [row[0] for row in cursor.fetchall()]
+    cursor.execute("DELETE FROM smiles_keys")
+    connection.commit()
+    log.debug(f"Fetched {len(res)} undecomposed parents")
+    return res
+
+
+def insert_decompositions(
+    connection: sqlite3.Connection,
+    decompositions: Iterable[tuple[str, list[tuple]]],
+    params: str,
+) -> None:
+    """Inserts the fragments of parent molecules, in a single transaction.
+
+    Args:
+        connection (sqlite3.Connection): SQLite database connection.
+        decompositions (Iterable[tuple[str, list[tuple[str, int, int]]]]):
+            (parent_smiles, [(fragment_smiles, num_atoms, num_heavy_atoms,
+            num_rot_bonds, num_rings), ...]) pairs, e.g. from
+            `chem.fragments.brics_decompositions`.
+        params (str): BRICS decomposition parameters.
+
+    Returns:
+        None
+    """
+    log.debug(f"Inserting into '{TABLE_NAME}' and '{PARENT_TABLE_NAME}' tables")
+    cursor = connection.cursor()
+    with connection:
+        for parent_smiles, fragments in decompositions:
+            cursor.executemany(
+                f"""
+                INSERT OR IGNORE INTO {TABLE_NAME} (
+                    smiles,
+                    num_atoms,
+                    num_heavy_atoms,
+                    num_rot_bonds,
+                    num_rings
+                ) VALUES (?, ?, ?, ?, ?)
+                """,
+                fragments,
+            )
+            cursor.executemany(
+                f"""
+                INSERT OR IGNORE INTO {PARENT_TABLE_NAME} (
+                    parent_smiles,
+                    params,
+                    fragment_smiles
+                ) VALUES (?, ?, ?)
+                """,
+                ((parent_smiles, params, fragment[0]) for fragment in fragments),
+            )
+            cursor.execute(
+                f"""
+                INSERT OR IGNORE INTO {DECOMPOSED_TABLE_NAME} (
+                    parent_smiles,
+                    params
+                ) VALUES (?, ?)
+                """,
+                (parent_smiles, params),
+            )
+    log.debug(f"Inserted into '{TABLE_NAME}' and '{PARENT_TABLE_NAME}' tables")
+
+
+def get_by_parents(
+    connection: sqlite3.Connection,
+    parent_smiles_list: Iterable[str],
+    params: str,
+    where: str = "1",
+    args: Sequence[Any] = (),
+) -> list[tuple]:
+    """Retrieves the unique fragments of parent molecules matching a condition, with their descriptors.
+
+    The fragments are looked up from the parents in a subquery, so that the
+    condition can use the (num_rot_bonds, num_atoms) index of the fragments.
+
+    Args:
+        connection (sqlite3.Connection): SQLite database connection.
+        parent_smiles_list (Iterable[str]): SMILES of the parent molecules.
+        params (str): BRICS decomposition parameters.
+        where (str): Condition on the columns of the fragments table, aliased 'f',
+            e.g. from `chem.fragments.FragmentFilter.sql_where`. Default all.
+        args (Sequence[Any]): Parameters of the condition.
+
+    Returns:
+        list[tuple]: (smiles, num_atoms, num_heavy_atoms, num_rot_bonds, num_rings)
+            rows of the fragments, sorted by SMILES.
+    """
+    log.debug(f"Fetching from '{TABLE_NAME}' table by parents")
+    cursor = connection.cursor()
+    _set_smiles_keys(cursor, parent_smiles_list)
+    # CROSS JOIN keeps the parents as the outer loop of the subquery
+    query = f"""
+        SELECT
+            f.smiles,
+            f.num_atoms,
+            f.num_heavy_atoms,
+            f.num_rot_bonds,
+            f.num_rings
+        FROM {TABLE_NAME} f
+        WHERE {where} AND f.smiles IN (
+            SELECT pf.fragment_smiles
+            FROM smiles_keys k
+            CROSS JOIN {PARENT_TABLE_NAME} pf
+                ON pf.parent_smiles = k.smiles AND pf.params = ?
+        )
+        ORDER BY f.smiles
+    """
+    cursor.execute(query, (*args, params))
+    res = [tuple(row) for row in cursor.fetchall()]
+    cursor.execute("DELETE FROM smiles_keys")
+    connection.commit()
+    log.debug(f"Fetched {len(res)} fragments from '{TABLE_NAME}' table")
+    return res
+
+
+def get_reactive_bits(
+    connection: sqlite3.Connection, smiles_list: Iterable[str], reactive_hash: str
+) -> dict[str, int]:
+    """Retrieves the reactive pattern bitmasks of fragments.
+
+    Only the bitmasks computed with the given reactive pattern set are returned.
+
+    Args:
+        connection (sqlite3.Connection): SQLite database connection.
+        smiles_list (Iterable[str]): SMILES of the fragments.
+        reactive_hash (str): Hash of the reactive pattern set.
+
+    Returns:
+        dict[str, int]: Reactive pattern bitmasks keyed by fragment SMILES.
+    """
+    log.debug(f"Fetching from '{TABLE_NAME}' table reactive bits")
+    cursor = connection.cursor()
+    _set_smiles_keys(cursor, smiles_list)
+    query = f"""
+        SELECT f.smiles, f.reactive_bits
+        FROM smiles_keys k
+        JOIN {TABLE_NAME} f ON f.smiles = k.smiles
+        WHERE f.reactive_hash = ?
+    """
+    cursor.execute(query, (reactive_hash,))
+    res = {row[0]: row[1] for row in cursor.fetchall()}
+    cursor.execute("DELETE FROM smiles_keys")
+    connection.commit()
+    log.debug(f"Fetched {len(res)} reactive bits from '{TABLE_NAME}' table")
+    return res
+
+
+def update_reactive_bits(
+    connection: sqlite3.Connection,
+    reactive_hash: str,
+    reactive_bits: Iterable[tuple[str, int]],
+) -> None:
+    """Stores the reactive pattern bitmasks of fragments.
+
+    Args:
+        connection (sqlite3.Connection): SQLite database connection.
+        reactive_hash (str): Hash of the reactive pattern set.
+        reactive_bits (Iterable[tuple[str, int]]): (fragment SMILES, bitmask) pairs,
+            see `chem.filters.hits_to_bitmasks`.
+
+    Returns:
+        None
+    """
+    log.debug(f"Updating '{TABLE_NAME}' table reactive bits")
+    cursor = connection.cursor()
+    query = f"""
+        UPDATE {TABLE_NAME} SET reactive_bits = ?, reactive_hash = ?
+        WHERE smiles = ?
+    """
+    cursor.executemany(
+        query, ((bits, reactive_hash, smiles) for smiles, bits in reactive_bits)
+    )
+    connection.commit()
+    log.debug(f"Updated '{TABLE_NAME}' table reactive bits")
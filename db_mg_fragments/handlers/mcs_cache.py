@@ -0,0 +1,116 @@
+"""Handler for the 'mcs_cache' table in the SQLite database."""
+
+import sqlite3
+import time
+from typing import Iterable
+
+from logger import get_logger
+
+TABLE_NAME = "mcs_cache"
+log = get_logger("DB MGF")
+
+
+def get_many(
+    connection: sqlite3.Connection, smiles_list: Iterable[str], params: str
+) -> dict[tuple[str, str], int]:
+    """Retrieves the cached MCS sizes of all the pairs of the given molecules.
+
+    The retrieved entries are marked as used, so that they are the last to be evicted.
+
+    Args:
+        connection (sqlite3.Connection): SQLite database connection.
+        smiles_list (Iterable[str]): Canonical SMILES of the molecules.
+        params (str): MCS search parameters.
+
+    Returns:
+        dict: MCS sizes keyed by (smiles_a, smiles_b), with smiles_a <= smiles_b.
+    """
+    log.debug(f"Fetching from '{TABLE_NAME}' table")
+    cursor = connection.cursor()
+    cursor.execute(
+        "CREATE TEMP TABLE IF NOT EXISTS mcs_cache_keys (smiles TEXT PRIMARY KEY)"
+    )
+    cursor.execute("DELETE FROM mcs_cache_keys")
+    cursor.executemany(
+        "INSERT OR IGNORE INTO mcs_cache_keys (smiles) VALUES (?)",
+        ((smiles,) for smiles in smiles_list),
+    )
+    query = f"""
+        SELECT c.smiles_a, c.smiles_b, c.mcs_num_atoms
+        FROM {TABLE_NAME} c
+        JOIN mcs_cache_keys ka ON ka.smiles = c.smiles_a
+        JOIN mcs_cache_keys kb ON kb.smiles = c.smiles_b
+        WHERE c.params = ?
+    """
+    cursor.execute(query, (params,))
+    res = {(row[0], row[1]): row[2] for row in cursor.fetchall()}
+    query = f"""
+        UPDATE {TABLE_NAME} SET last_used = ?
+        WHERE params = ?
+        AND smiles_a IN (SELECT smiles FROM mcs_cache_keys)
+        AND smiles_b IN (SELECT smiles FROM mcs_cache_keys)
+    """
+    cursor.execute(query, (time.time(), params))
+    cursor.execute("DELETE FROM mcs_cache_keys")
+    connection.commit()
+    log.debug(f"Fetched {len(res)} entries from '{TABLE_NAME}' table")
+    return res
+
+
+def insert_many(
+    connection: sqlite3.Connection,
+    entries: Iterable[tuple[str, str, int]],
+    params: str,
+) -> None:
+    """Inserts MCS sizes into the 'mcs_cache' table.
+
+    Args:
+        connection (sqlite3.Connection): SQLite database connection.
+        entries (Iterable[tuple[str, str, int]]): (smiles_a, smiles_b, mcs_num_atoms)
+            entries, with smiles_a <= smiles_b.
+        params (str): MCS search parameters.
+
+    Returns:
+        None
+    """
+    log.debug(f"Inserting into '{TABLE_NAME}' table")
+    now = time.time()
+    cursor = connection.cursor()
+    query = f"""
+        INSERT OR REPLACE INTO {TABLE_NAME} (
+            smiles_a,
+            smiles_b,
+            params,
+            mcs_num_atoms,
+            last_used
+        ) VALUES (?, ?, ?, ?, ?)
+    """
+    cursor.executemany(query, ((a, b, params, size, now) for a, b, size in entries))
+    connection.commit()
+    log.debug(f"Inserted into '{TABLE_NAME}' table")
+
+
+def evict(connection: sqlite3.Connection, max_entries: int) -> None:
+    """Removes the least recently used entries exceeding max_entries.
+
+    Args:
+        connection (sqlite3.Connection): SQLite database connection.
+        max_entries (int): Maximum number of entries to keep.
+
+    Returns:
+        None
+    """
+    cursor = connection.cursor()
+    cursor.execute(f"SELECT COUNT(*) FROM {TABLE_NAME}")
+    excess = cursor.fetchone()[0] - max_entries
+    if excess <= 0:
+        return
+    log.debug(f"Evicting {excess} entries from '{TABLE_NAME}' table")
+    query = f"""
+        DELETE FROM {TABLE_NAME} WHERE rowid IN (
+            SELECT rowid FROM {TABLE_NAME} ORDER BY last_used LIMIT ?
+        )
+    """
+    cursor.execute(query, (excess,))
+    connection.commit()
+    log.debug(f"Evicted {excess} entries from '{TABLE_NAME}' table")
@@ -2,15 +2,28 @@
 
 import sqlite3
 from dataclasses import dataclass
-from typing import Any, Generator
+from itertools import islice
+from typing import Any, Generator, Iterable
 
+import settings
 from logger import get_logger
 
-from .. import get_db_connection
+from .. import close_db_connection, get_db_connection
 
 TABLE_NAME = "mols"
 log = get_logger("DB MGF")
 
+# Columns filled from the parsed molecule at import time.
+PARSED_COLUMNS = (
+    "parent_smiles",
+    "mol_pickle",
+    "parent_mol_pickle",
+    "num_atoms",
+    "num_heavy_atoms",
+    "num_rot_bonds",
+    "num_rings",
+)
+
 
 @dataclass
 class Molecule:
@@ -50,6 +63,59 @@ def insert(connection: sqlite3.Connection, mol: dict[str, Any]) -> None:
     log.debug(f"Inserted into '{TABLE_NAME}' table")
 
 
+def insert_many(
+    connection: sqlite3.Connection,
+    mols: Iterable[dict[str, Any]],
+    chunk_size: int = settings.IMPORT_CHUNK_SIZE,
+) -> Generator[int, None, None]:
+    """Inserts molecules into the 'mols' table in chunks, one transaction per chunk.
+
+    Molecules already in the table are ignored. The parsed molecule columns
+    `PARSED_COLUMNS` are stored when present in the molecule data, see
+    `db_mg_fragments.importer.parse_mols`.
+
+    Args:
+        connection (sqlite3.Connection): SQLite database connection.
+        mols (Iterable[dict]): Molecule data, e.g. from `get_mols_from_target_id`.
+        chunk_size (int): Number of molecules inserted per transaction.
+
+    Yields:
+        int: Number of molecules read from `mols` after each committed chunk.
+    """
+    log.debug(f"Bulk inserting into '{TABLE_NAME}' table")
+    cursor = connection.cursor()
+    query = f"""
+        INSERT OR IGNORE INTO {TABLE_NAME} (
+            target_id,
+            chembl_id,
+            canonical_smiles,
+            parent_smiles,
+            mol_pickle,
+            parent_mol_pickle,
+            num_atoms,
+            num_heavy_atoms,
+            num_rot_bonds,
+            num_rings
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """
+    mols = iter(mols)
+    total = 0
+    while chunk := [
+        (
+            mol["target_id"],
+            mol["chembl_id"],
+            mol["canonical_smiles"],
+            *(mol[key] if key in mol.keys() else None for key in PARSED_COLUMNS),
+        )
+        for mol in islice(mols, chunk_size)
+    ]:
+        with connection:
+            cursor.executemany(query, chunk)
+        total += len(chunk)
+        yield total
+    log.debug(f"Bulk inserted {total} molecules into '{TABLE_NAME}' table")
+
+
 def remove_by_target_id(connection: sqlite3.Connection, target_id: str) -> None:
     """Removes a molecule from the 'mols' table based on target_id.
 
@@ -73,6 +139,8 @@ def remove_by_target_id(connection: sqlite3.Connection, target_id: str) -> None:
 def get_available_targets() -> list[str]:
     """Retrieves all unique target IDs from the 'mols' table.
 
+    The IDs are read from the 'targets' summary table, kept up to date by triggers.
+
     Args:
         connection (sqlite3.Connection): SQLite database connection.
 
@@ -82,12 +150,12 @@ def get_available_targets() -> list[str]:
     log.debug(f"Fetching from '{TABLE_NAME}' table available targets")
     connection = get_db_connection()
     cursor = connection.cursor()
-    query = f"""
-        SELECT DISTINCT target_id FROM {TABLE_NAME}
+    query = """
+        SELECT target_id FROM targets ORDER BY target_id
     """
     cursor.execute(query)
     res = [row["target_id"] for row in cursor.fetchall()]
-    connection.close()
+    close_db_connection(connection)
     return res
 
 
@@ -110,5 +178,187 @@ def get_by_target(target_id: str) -> Generator[dict[str, Any], None, None]:
     cursor.execute(query, (target_id,))
     for row in cursor:
         yield row
-    connection.close()
+    close_db_connection(connection)
     log.debug(f"Fetched all result for target ID: {target_id}")
+
+
+# Molecules imported before their parsed columns, or their descriptors, were added.
+UNPARSED_WHERE = """
+    parent_smiles IS NULL OR (num_atoms IS NULL AND parent_mol_pickle IS NOT NULL)
+"""
+
+
+def count_unparsed(connection: sqlite3.Connection) -> int:
+    """Counts the molecules missing their parsed molecule columns.
+
+    Args:
+        connection (sqlite3.Connection): SQLite database connection.
+
+    Returns:
+        int: Number of molecules to parse, see `get_unparsed`.
+    """
+    log.debug(f"Counting unparsed molecules in '{TABLE_NAME}' table")
+    cursor = connection.cursor()
+    query = f"""
+        SELECT COUNT(*) FROM {TABLE_NAME} WHERE {UNPARSED_WHERE}
+    """
+    cursor.execute(query)
+    return cursor.fetchone()[0]
+
+
+def get_unparsed(
+    connection: sqlite3.Connection, after_rowid: int, limit: int
+) -> list[sqlite3.Row]:
+    """Retrieves a page of the molecules missing their parsed molecule columns.
+
+    The molecules imported before the `PARSED_COLUMNS` were added have no parent
+    SMILES, and the ones imported before the descriptors were added have pickles
+    but no descriptors. The pages are ordered by rowid, so that the next page
+    starts after the last rowid of the previous one.
+
+    Args:
+        connection (sqlite3.Connection): SQLite database connection.
+        after_rowid (int): Rowid after which the page starts, 0 for the first page.
+        limit (int): Maximum number of molecules of the page.
+
+    Returns:
+        list: Rows with 'rowid', 'target_id', 'chembl_id' and 'canonical_smiles'.
+    """
+    log.debug(f"Fetching unparsed molecules from '{TABLE_NAME}' table")
+    cursor = connection.cursor()
+    query = f"""
+        SELECT rowid, target_id, chembl_id, canonical_smiles FROM {TABLE_NAME}
+        WHERE rowid > ? AND ({UNPARSED_WHERE})
+        ORDER BY rowid LIMIT ?
+    """
+    cursor.execute(query, (after_rowid, limit))
+    res = cursor.fetchall()
+    log.debug(f"Fetched {len(res)} unparsed molecules from '{TABLE_NAME}' table")
+    return res
+
+
+def update_parsed(
+    connection: sqlite3.Connection, mols: Iterable[dict[str, Any]]
+) -> None:
+    """Stores the parsed molecule columns of molecules already in the 'mols' table.
+
+    Args:
+        connection (sqlite3.Connection): SQLite database connection.
+        mols (Iterable[dict]): Molecule data with the `PARSED_COLUMNS` keys, see
+            `db_mg_fragments.importer.parse_mols`.
+
+    Returns:
+        None
+    """
+    log.debug(f"Updating '{TABLE_NAME}' table parsed molecule columns")
+    cursor = connection.cursor()
+    assignments = ", ".join(f"{key} = ?" for key in PARSED_COLUMNS)
+    query = f"""
+        UPDATE {TABLE_NAME} SET {assignments}
+        WHERE target_id = ? AND chembl_id = ?
+    """
+    with connection:
+        cursor.executemany(
+            query,
+            (
+                (
+                    *(mol[key] for key in PARSED_COLUMNS),
+                    mol["target_id"],
+                    mol["chembl_id"],
+                )
+                for mol in mols
+            ),
+        )
+    log.debug(f"Updated '{TABLE_NAME}' table parsed molecule columns")
+
+
+def get_reactive_bits(
+    connection: sqlite3.Connection, target_id: str, reactive_hash: str
+) -> dict[str, int]:
+    """Retrieves the reactive pattern bitmasks of the molecules of a target.
+
+    Only the bitmasks computed with the given reactive pattern set are returned.
+
+    Args:
+        connection (sqlite3.Connection): SQLite database connection.
+        target_id (str): Target ID of the molecules.
+        reactive_hash (str): Hash of the reactive pattern set.
+
+    Returns:
+        dict[str, int]: Reactive pattern bitmasks keyed by ChEMBL ID.
+    """
+    log.debug(f"Fetching from '{TABLE_NAME}' table reactive bits of: {target_id}")
+    cursor = connection.cursor()
+    query = f"""
+        SELECT chembl_id, reactive_bits FROM {TABLE_NAME}
+        WHERE target_id = ? AND reactive_hash = ?
+    """
+    cursor.execute(query, (target_id, reactive_hash))
+    res = {row[0]: row[1] for row in cursor.fetchall()}
+    log.debug(f"Fetched {len(res)} reactive bits from '{TABLE_NAME}' table")
+    return res
+
+
+def get_unscreened(
+    connection: sqlite3.Connection, target_id: str, reactive_hash: None | str = None
+) -> dict[str, bytes | str]:
+    """Retrieves the stored molecules of a target without reactive pattern bitmask.
+
+    Args:
+        connection (sqlite3.Connection): SQLite database connection.
+        target_id (str): Target ID of the molecules.
+        reactive_hash (None | str): Hash of the reactive pattern set. None retrieves
+            all the molecules of the target.
+
+    Returns:
+        dict[str, bytes | str]: RDKit binary pickle of the molecules keyed by
+            ChEMBL ID, or their canonical SMILES when they have no pickle.
+    """
+    log.debug(
+        f"Fetching from '{TABLE_NAME}' table unscreened molecules of: {target_id}"
+    )
+    cursor = connection.cursor()
+    query = f"""
+        SELECT chembl_id, COALESCE(mol_pickle, canonical_smiles) FROM {TABLE_NAME}
+        WHERE target_id = ?
+        AND (? IS NULL OR reactive_hash IS NULL OR reactive_hash != ?)
+    """
+    cursor.execute(query, (target_id, reactive_hash, reactive_hash))
+    res = {row[0]: row[1] for row in cursor.fetchall()}
+    log.debug(f"Fetched {len(res)} unscreened molecules from '{TABLE_NAME}' table")
+    return res
+
+
+def update_reactive_bits(
+    connection: sqlite3.Connection,
+    target_id: str,
+    reactive_hash: str,
+    reactive_bits: Iterable[tuple[str, int]],
+) -> None:
+    """Stores the reactive pattern bitmasks of the molecules of a target.
+
+    Args:
+        connection (sqlite3.Connection): SQLite database connection.
+        target_id (str): Target ID of the molecules.
+        reactive_hash (str): Hash of the reactive pattern set.
+        reactive_bits (Iterable[tuple[str, int]]): (chembl_id, bitmask) pairs,
+            see `chem.filters.hits_to_bitmasks`.
+
+    Returns:
+        None
+    """
+    log.debug(f"Updating '{TABLE_NAME}' table reactive bits of: {target_id}")
+    cursor = connection.cursor()
+    query = f"""
+        UPDATE {TABLE_NAME} SET reactive_bits = ?, reactive_hash = ?
+        WHERE target_id = ? AND chembl_id = ?
+    """
+    cursor.executemany(
+        query,
+        (
+            (bits, reactive_hash, target_id, chembl_id)
+            for chembl_id, bits in reactive_bits
+        ),
+    )
+    connection.commit()
+    log.debug(f"Updated '{TABLE_NAME}' table reactive bits of: {target_id}")
@@ -0,0 +1,74 @@
+"""Handler for the 'targets' table in the SQLite database."""
+
+from typing import Any
+
+from logger import get_logger
+
+from .. import close_db_connection, get_db_connection
+
+TABLE_NAME = "targets"
+log = get_logger("DB MGF")
+
+
+def get_all() -> list[dict[str, Any]]:
+    """Retrieves all the targets with their number of molecules.
+
+    Returns:
+        list: List of dictionaries with 'target_id' and 'mol_count'.
+    """
+    log.debug(f"Fetching from '{TABLE_NAME}' table all targets")
+    connection = get_db_connection()
+    cursor = connection.cursor()
+    query = f"""
+        SELECT target_id, mol_count FROM {TABLE_NAME} ORDER BY target_id
+    """
+    cursor.execute(query)
+    res = [dict(row) for row in cursor.fetchall()]
+    close_db_connection(connection)
+    return res
+
+
+def get_mol_count(target_id: str) -> int:
+    """Retrieves the number of molecules of a target.
+
+    Args:
+        target_id (str): Target ID.
+
+    Returns:
+        int: Number of molecules of the target, 0 if the target is unknown.
+    """
+    log.debug(f"Fetching from '{TABLE_NAME}' table by target_id: {target_id}")
+    connection = get_db_connection()
+    cursor = connection.cursor()
+    query = f"""
+        SELECT mol_count FROM {TABLE_NAME} WHERE target_id = ?
+    """
+    cursor.execute(query, (target_id,))
+    row = cursor.fetchone()
+    close_db_connection(connection)
+    return row["mol_count"] if row else 0
+
+
+def get_version(target_id: str) -> tuple[int, None | float]:
+    """Retrieves the version of the molecules of a target.
+
+    The version changes whenever molecules of the target are inserted or deleted,
+    so it can key caches of the target molecules.
+
+    Args:
+        target_id (str): Target ID.
+
+    Returns:
+        tuple[int, None | float]: Number of molecules of the target and Julian day
+            of their last change, (0, None) if the target is unknown.
+    """
+    log.debug(f"Fetching from '{TABLE_NAME}' table version of target_id: {target_id}")
+    connection = get_db_connection()
+    cursor = connection.cursor()
+    query = f"""
+        SELECT mol_count, updated_at FROM {TABLE_NAME} WHERE target_id = ?
+    """
+    cursor.execute(query, (target_id,))
+    row = cursor.fetchone()
+    close_db_connection(connection)
+    return (row["mol_count"], row["updated_at"]) if row else (0, None)
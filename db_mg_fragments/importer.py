@@ -0,0 +1,324 @@
+"""Import pipeline of the target molecules from the ChEMBL database into the MG Fragments database.
+
+Several reader threads, each with its own read-only ChEMBL connection, run the
+target lookups concurrently and push chunks of molecules into a bounded queue.
+The chunks are parsed over a process pool, since RDKit holds the GIL, storing the
+counterion-stripped parent SMILES, the RDKit binary pickles and the descriptors
+of the parent of each molecule, so that loading and filtering a target does not
+parse SMILES again. A single writer, running in the caller thread, inserts each
+parsed chunk in its own transaction, in the order the chunks were read.
+
+The molecules imported before the parsed columns were added are parsed by
+`backfill_parsed_mols`.
+
+The pipeline can be run from the command line:
+
+    $ python -m db_mg_fragments.importer CHEMBL203 CHEMBL204
+    $ python -m db_mg_fragments.importer --backfill
+"""
+
+import argparse
+import os
+import threading
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from itertools import islice
+from queue import Empty, Full, Queue
+from typing import Any, Generator, Iterable
+
+import db_chembl
+import db_chembl.utils as db_chembl_utils
+import db_mg_fragments
+import db_mg_fragments.handlers.mols as db_mgf_mols_handlers
+import db_mg_fragments.tables.targets as db_mgf_targets_table
+import settings
+from chem import filters as chem_filters
+from chem import utils as chem_utils
+from logger import get_logger
+
+log = get_logger("DB MGF Importer")
+
+# Queue item sent by a reader when it has no more targets to read.
+_READER_DONE = object()
+
+
+def _put(queue: Queue, item: Any, stop: threading.Event) -> None:
+    """Put an item into the queue, giving up when the pipeline is stopped."""
+    while not stop.is_set():
+        try:
+            queue.put(item, timeout=0.1)
+            return
+        except Full:
+            continue
+
+
+def parse_mols(
+    mols: Iterable[dict[str, Any]],
+) -> Generator[dict[str, Any], None, None]:
+    """Add the parent SMILES, the RDKit binary pickles and the descriptors to the molecule data.
+
+    The pickles and the descriptors are None for SMILES that RDKit cannot parse.
+
+    Args:
+        mols (Iterable[dict]): Molecule data, e.g. from `get_mols_from_target_id`.
+
+    Yields:
+        dict: Molecule data with the `db_mg_fragments.handlers.mols.PARSED_COLUMNS`
+            keys added, the descriptors being the ones of the parent molecule.
+    """
+    for mol_data in mols:
+        mol_data = dict(mol_data)
+        smiles = mol_data["canonical_smiles"]
+        parent_smiles = chem_utils.remove_counterions_from_smiles(smiles)
+        mol = chem_utils.mol_from_smiles(smiles)
+        if parent_smiles == smiles:
+            parent_mol = mol
+        else:
+            parent_mol = chem_utils.mol_from_smiles(parent_smiles)
+        mol_data["parent_smiles"] = parent_smiles
+        mol_data["mol_pickle"] = chem_utils.mol_to_pickle(mol) if mol else None
+        mol_data["parent_mol_pickle"] = (
+            chem_utils.mol_to_pickle(parent_mol) if parent_mol else None
+        )
+        if parent_mol:
+            mol_data.update(chem_filters.mol_descriptors(parent_mol)._asdict())
+        else:
+            mol_data.update(dict.fromkeys(chem_filters.Descriptors._fields))
+        yield mol_data
+
+
+def _parse_chunk(chunk: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """Parse a chunk of molecules inside a parsing process."""
+    return list(parse_mols(chunk))
+
+
+def _parse_chunks(
+    items: Iterable[tuple[Any, Any]], n_parsers: int
+) -> Generator[tuple[Any, Any], None, None]:
+    """Parse the chunks of molecules over a process pool, keeping their order.
+
+    The items are (key, chunk) pairs; the items whose chunk is not a list of
+    molecules, e.g. end of target markers or errors, are passed through as they
+    are. With `n_parsers` 1, the chunks are parsed in the current process.
+    """
+    if n_parsers == 1:
+        for key, chunk in items:
+            yield key, _parse_chunk(chunk) if isinstance(chunk, list) else chunk
+        return
+
+    with ProcessPoolExecutor(max_workers=n_parsers) as executor:
+        pending = deque()
+        for key, chunk in items:
+            if isinstance(chunk, list):
+                chunk = executor.submit(_parse_chunk, chunk)
+            pending.append((key, chunk))
+            # keep a bounded number of chunks in flight, yielding them in order
+            while pending:
+                head = pending[0][1]
+                ready = not isinstance(head, Future) or head.done()
+                if not ready and len(pending) <= 2 * n_parsers:
+                    break
+                key, chunk = pending.popleft()
+                yield key, chunk.result() if isinstance(chunk, Future) else chunk
+        while pending:
+            key, chunk = pending.popleft()
+            yield key, chunk.result() if isinstance(chunk, Future) else chunk
+
+
+def _read_targets(
+    target_queue: Queue, chunk_queue: Queue, chunk_size: int, stop: threading.Event
+) -> None:
+    """Read the molecules of the queued targets, pushing them to the chunk queue."""
+    connection = db_chembl.get_db_connection()
+    try:
+        while not stop.is_set():
+            try:
+                target_id = target_queue.get_nowait()
+            except Empty:
+                break
+            # plain dicts, so that the chunks can be sent to the parsing processes
+            mols = (
+                dict(row)
+                for row in db_chembl_utils.get_mols_from_target_id(
+                    connection, target_id
+                )
+            )
+            while chunk := list(islice(mols, chunk_size)):
+                _put(chunk_queue, (target_id, chunk), stop)
+            _put(chunk_queue, (target_id, None), stop)
+    except Exception as e:
+        _put(chunk_queue, (None, e), stop)
+    finally:
+        db_chembl.close_db_connection(connection)
+        _put(chunk_queue, _READER_DONE, stop)
+
+
+def _queued_chunks(
+    chunk_queue: Queue, n_readers: int
+) -> Generator[tuple[Any, Any], None, None]:
+    """Get the chunks pushed by the readers until all of them are done."""
+    running = n_readers
+    while running:
+        item = chunk_queue.get()
+        if item is _READER_DONE:
+            running -= 1
+            continue
+        yield item
+
+
+def import_targets(
+    target_id_list: list[str],
+    n_readers: int = settings.IMPORT_N_READERS,
+    chunk_size: int = settings.IMPORT_CHUNK_SIZE,
+    n_parsers: None | int = settings.IMPORT_N_PARSERS,
+) -> Generator[dict[str, str | dict], None, None]:
+    """Import the molecules of the target IDs from ChEMBL into the 'mols' table, with logging.
+
+    Args:
+        target_id_list (list[str]): Target IDs to import.
+        n_readers (int): Number of concurrent ChEMBL reader threads.
+        chunk_size (int): Number of molecules inserted per transaction.
+        n_parsers (None | int): Number of molecule parsing processes. None uses all
+            the CPUs, 1 parses the molecules in the current process.
+
+    Yields:
+        dict: `{"log": str}` progress messages and a final `{"result": dict}` with
+            the number of molecules read for each target.
+    """
+    target_queue = Queue()
+    for target_id in target_id_list:
+        target_queue.put(target_id)
+    chunk_queue = Queue(maxsize=settings.IMPORT_QUEUE_SIZE)
+    stop = threading.Event()
+    n_readers = max(1, min(n_readers, len(target_id_list)))
+    readers = [
+        threading.Thread(
+            target=_read_targets,
+            args=(target_queue, chunk_queue, chunk_size, stop),
+            daemon=True,
+        )
+        for _ in range(n_readers)
+    ]
+    for reader in readers:
+        reader.start()
+
+    mol_counts = {target_id: 0 for target_id in target_id_list}
+    n_done = 0
+    chunks = _parse_chunks(
+        _queued_chunks(chunk_queue, n_readers), n_parsers or os.cpu_count() or 1
+    )
+    connection = db_mg_fragments.get_db_connection()
+    try:
+        for target_id, chunk in chunks:
+            if isinstance(chunk, Exception):
+                raise chunk
+            if chunk is None:
+                n_done += 1
+                yield {
+                    "log": f"✅ Target ID: {target_id} [{n_done}/{len(target_id_list)}] "
+                    f"- Imported mols: {mol_counts[target_id]}"
+                }
+                continue
+            for _ in db_mgf_mols_handlers.insert_many(
+                connection, chunk, chunk_size=len(chunk)
+            ):
+                pass
+            mol_counts[target_id] += len(chunk)
+            yield {
+                "log": f"Target ID: {target_id} - Imported mols: {mol_counts[target_id]}"
+            }
+    finally:
+        stop.set()
+        chunks.close()
+        db_mg_fragments.close_db_connection(connection)
+    for reader in readers:
+        reader.join()
+
+    yield {"result": mol_counts}
+
+
+def backfill_parsed_mols(
+    chunk_size: int = settings.IMPORT_CHUNK_SIZE,
+    n_parsers: None | int = settings.IMPORT_N_PARSERS,
+) -> Generator[dict[str, str | int], None, None]:
+    """Parse the molecules imported before the parsed columns were added, with logging.
+
+    The molecules are read in pages, see `db_mg_fragments.handlers.mols.get_unparsed`,
+    parsed over a process pool and updated one transaction per page. The versions of
+    the targets are then bumped, so that their cached molecules are reloaded.
+
+    Args:
+        chunk_size (int): Number of molecules parsed and updated at a time.
+        n_parsers (None | int): Number of molecule parsing processes. None uses all
+            the CPUs, 1 parses the molecules in the current process.
+
+    Yields:
+        dict: `{"log": str}` progress messages and a final `{"result": int}` with
+            the number of parsed molecules.
+    """
+    connection = db_mg_fragments.get_db_connection()
+    n = db_mgf_mols_handlers.count_unparsed(connection)
+    yield {"log": f"🗃️ Found {n} molecules to parse"}
+
+    def pages() -> Generator[tuple[None, list[dict[str, Any]]], None, None]:
+        after_rowid = 0
+        while rows := db_mgf_mols_handlers.get_unparsed(
+            connection, after_rowid, chunk_size
+        ):
+            after_rowid = rows[-1]["rowid"]
+            yield None, [dict(row) for row in rows]
+
+    done = 0
+    for _, chunk in _parse_chunks(pages(), n_parsers or os.cpu_count() or 1):
+        db_mgf_mols_handlers.update_parsed(connection, chunk)
+        done += len(chunk)
+        yield {"log": f"⏳ Parsed molecules: {done}/{n}"}
+    if done:
+        db_mgf_targets_table.touch(connection)
+    db_mg_fragments.close_db_connection(connection)
+    yield {"log": f"✅ Parsed {done} molecules"}
+    yield {"result": done}
+
+
+def main() -> None:
+    """Import the target IDs given on the command line."""
+    parser = argparse.ArgumentParser(
+        description="Import target molecules from ChEMBL into the MG Fragments DB"
+    )
+    parser.add_argument("target_ids", nargs="*", help="ChEMBL target IDs to import")
+    parser.add_argument(
+        "--readers",
+        type=int,
+        default=settings.IMPORT_N_READERS,
+        help="number of concurrent ChEMBL readers",
+    )
+    parser.add_argument(
+        "--parsers",
+        type=int,
+        default=settings.IMPORT_N_PARSERS,
+        help="number of molecule parsing processes",
+    )
+    parser.add_argument(
+        "--backfill",
+        action="store_true",
+        help="parse the molecules imported before the parsed columns were added",
+    )
+    args = parser.parse_args()
+    if not args.target_ids and not args.backfill:
+        parser.error("give target IDs to import or --backfill")
+    if args.backfill:
+        for item in backfill_parsed_mols(n_parsers=args.parsers):
+            if "log" in item:
+                log.info(item["log"])
+    if args.target_ids:
+        for item in import_targets(
+            args.target_ids, n_readers=args.readers, n_parsers=args.parsers
+        ):
+            if "log" in item:
+                log.info(item["log"])
+            elif "result" in item:
+                log.info(f"Imported {sum(item['result'].values())} molecules")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Versioned schema migrations of the MG Fragments database.
+
+The schema version is stored in the SQLite `user_version` pragma. Each migration
+brings the schema from the previous version to its own, and the pending ones are
+applied in order when the first connection of the process is opened.
+Migrations must be idempotent, so that an interrupted run can be safely repeated.
+"""
+
+import sqlite3
+import threading
+from typing import Callable
+
+from logger import get_logger
+
+from .tables import fingerprints as fingerprints_table
+from .tables import fragments as fragments_table
+from .tables import mcs_cache as mcs_cache_table
+from .tables import mols as mols_table
+from .tables import parent_fragments as parent_fragments_table
+from .tables import targets as targets_table
+
+log = get_logger("DB MGF")
+
+_lock = threading.Lock()
+_migrated = False
+
+
+def _v1_create_tables(connection: sqlite3.Connection) -> None:
+    """Create the base tables."""
+    mols_table.create(connection)
+    mcs_cache_table.create(connection)
+    fingerprints_table.create(connection)
+
+
+def _v2_targets_summary(connection: sqlite3.Connection) -> None:
+    """Add the 'targets' summary table and the 'mols' secondary indexes."""
+    targets_table.create(connection)
+    targets_table.refresh(connection)
+    mols_table.create_indexes(connection)
+
+
+def _v3_parsed_mols(connection: sqlite3.Connection) -> None:
+    """Add the parent SMILES and the RDKit pickles to the 'mols' table."""
+    mols_table.add_parsed_columns(connection)
+
+
+def _v4_fragments(connection: sqlite3.Connection) -> None:
+    """Add the BRICS fragments of the parent molecules."""
+    fragments_table.create(connection)
+    parent_fragments_table.create(connection)
+
+
+def _v5_descriptors(connection: sqlite3.Connection) -> None:
+    """Add the molecule descriptor columns and the targets last change time."""
+    mols_table.add_descriptor_columns(connection)
+    targets_table.add_updated_at(connection)
+
+
+MIGRATIONS: list[Callable[[sqlite3.Connection], None]] = [
+    _v1_create_tables,
+    _v2_targets_summary,
+    _v3_parsed_mols,
+    _v4_fragments,
+    _v5_descriptors,
+]
+
+
+def get_version(connection: sqlite3.Connection) -> int:
+    """Get the schema version of the database.
+
+    Args:
+        connection (sqlite3.Connection): The SQLite connection object.
+
+    Returns:
+        int: Schema version, 0 for a new database.
+    """
+    return connection.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(connection: sqlite3.Connection) -> None:
+    """Apply the pending migrations to the database.
+
+    Args:
+        connection (sqlite3.Connection): The SQLite connection object.
+    """
+    global _migrated
+    with _lock:
+        if _migrated:
+            return
+        version = get_version(connection)
+        for new_version, migration in enumerate(
+            MIGRATIONS[version:], start=version + 1
+        ):
+            log.debug(
+                f"Migrating schema to version {new_version}: {migration.__name__}"
+            )
+            migration(connection)
+            connection.execute(f"PRAGMA user_version = {new_version}")
+            connection.commit()
+        _migrated = True
@@ -0,0 +1,34 @@
+"""Module to create and manage the 'fingerprints' table in the database."""
+
+import sqlite3
+
+from logger import get_logger
+
+log = get_logger("DB MGF")
+
+TABLE_NAME = "fingerprints"
+
+
+def create(connection: sqlite3.Connection) -> None:
+    """Creates the 'fingerprints' table in the database.
+
+    Each row stores the packed bits of the Morgan fingerprint of a molecule,
+    identified by its canonical SMILES and by the generator parameters.
+
+    Args:
+        connection (sqlite3.Connection): The SQLite connection object.
+    """
+    log.debug(f"Creating '{TABLE_NAME}' table")
+    cursor = connection.cursor()
+    query = f"""
+        CREATE TABLE IF NOT EXISTS {TABLE_NAME} (
+            canonical_smiles TEXT,
+            radius INTEGER,
+            fp_size INTEGER,
+            fingerprint BLOB,
+            PRIMARY KEY (canonical_smiles, radius, fp_size)
+        )
+    """
+    cursor.execute(query)
+    connection.commit()
+    log.debug(f"Table '{TABLE_NAME}' created")
@@ -0,0 +1,43 @@
+"""Module to create and manage the 'fragments' table in the database."""
+
+import sqlite3
+
+from logger import get_logger
+
+log = get_logger("DB MGF")
+
+TABLE_NAME = "fragments"
+
+
+def create(connection: sqlite3.Connection) -> None:
+    """Creates the 'fragments' table in the database.
+
+    Each row stores a BRICS fragment, identified by its SMILES, with the
+    descriptors used by the fragment filters, see `chem.filters.mol_descriptors`,
+    and its reactive pattern bitmask along with the hash of the pattern set it was
+    computed with, see `chem.filters.hits_to_bitmasks`.
+
+    Args:
+        connection (sqlite3.Connection): The SQLite connection object.
+    """
+    log.debug(f"Creating '{TABLE_NAME}' table")
+    cursor = connection.cursor()
+    query = f"""
+        CREATE TABLE IF NOT EXISTS {TABLE_NAME} (
+            smiles TEXT PRIMARY KEY,
+            num_atoms INTEGER,
+            num_heavy_atoms INTEGER,
+            num_rot_bonds INTEGER,
+            num_rings INTEGER,
+            reactive_bits INTEGER,
+            reactive_hash TEXT
+        ) WITHOUT ROWID
+    """
+    cursor.execute(query)
+    query = f"""
+        CREATE INDEX IF NOT EXISTS {TABLE_NAME}_num_rot_bonds_num_atoms_idx
+        ON {TABLE_NAME} (num_rot_bonds, num_atoms)
+    """
+    cursor.execute(query)
+    connection.commit()
+    log.debug(f"Table '{TABLE_NAME}' created")
@@ -0,0 +1,40 @@
+"""Module to create and manage the 'mcs_cache' table in the database."""
+
+import sqlite3
+
+from logger import get_logger
+
+log = get_logger("DB MGF")
+
+TABLE_NAME = "mcs_cache"
+
+
+def create(connection: sqlite3.Connection) -> None:
+    """Creates the 'mcs_cache' table in the database.
+
+    Each row stores the MCS size of a pair of molecules, identified by their
+    canonical SMILES (smiles_a <= smiles_b) and by the MCS search parameters.
+
+    Args:
+        connection (sqlite3.Connection): The SQLite connection object.
+    """
+    log.debug(f"Creating '{TABLE_NAME}' table")
+    cursor = connection.cursor()
+    query = f"""
+        CREATE TABLE IF NOT EXISTS {TABLE_NAME} (
+            smiles_a TEXT,
+            smiles_b TEXT,
+            params TEXT,
+            mcs_num_atoms INTEGER,
+            last_used REAL,
+            PRIMARY KEY (smiles_a, smiles_b, params)
+        )
+    """
+    cursor.execute(query)
+    query = f"""
+        CREATE INDEX IF NOT EXISTS {TABLE_NAME}_last_used_idx
+        ON {TABLE_NAME} (last_used)
+    """
+    cursor.execute(query)
+    connection.commit()
+    log.debug(f"Table '{TABLE_NAME}' created")
@@ -28,3 +28,85 @@ def create(connection: sqlite3.Connection) -> None:
     cursor.execute(query)
     connection.commit()
     log.debug(f"Table '{TABLE_NAME}' created")
+
+
+def create_indexes(connection: sqlite3.Connection) -> None:
+    """Creates the secondary indexes of the 'mols' table.
+
+    Args:
+        connection (sqlite3.Connection): The SQLite connection object.
+    """
+    log.debug(f"Creating '{TABLE_NAME}' table indexes")
+    cursor = connection.cursor()
+    query = f"""
+        CREATE INDEX IF NOT EXISTS {TABLE_NAME}_canonical_smiles_idx
+        ON {TABLE_NAME} (canonical_smiles)
+    """
+    cursor.execute(query)
+    connection.commit()
+    log.debug(f"Table '{TABLE_NAME}' indexes created")
+
+
+def _add_columns(connection: sqlite3.Connection, columns: dict[str, str]) -> None:
+    """Adds the missing columns to the 'mols' table."""
+    cursor = connection.cursor()
+    cursor.execute(f"PRAGMA table_info({TABLE_NAME})")
+    existing = {row[1] for row in cursor.fetchall()}
+    for name, column_type in columns.items():
+        if name not in existing:
+            cursor.execute(f"ALTER TABLE {TABLE_NAME} ADD COLUMN {name} {column_type}")
+    connection.commit()
+
+
+def add_parsed_columns(connection: sqlite3.Connection) -> None:
+    """Adds the columns holding the parsed molecules to the 'mols' table.
+
+    The columns are the counterion-stripped parent SMILES and the RDKit binary
+    pickles of the molecule and of its parent. Existing columns are left as is.
+
+    Args:
+        connection (sqlite3.Connection): The SQLite connection object.
+    """
+    log.debug(f"Adding '{TABLE_NAME}' table parsed molecule columns")
+    _add_columns(
+        connection,
+        {
+            "parent_smiles": "TEXT",
+            "mol_pickle": "BLOB",
+            "parent_mol_pickle": "BLOB",
+        },
+    )
+    log.debug(f"Table '{TABLE_NAME}' parsed molecule columns added")
+
+
+def add_descriptor_columns(connection: sqlite3.Connection) -> None:
+    """Adds the descriptor columns of the parent molecules to the 'mols' table, with an index.
+
+    The descriptors are computed at import time, see `chem.filters.mol_descriptors`.
+    The reactive pattern bitmask is stored along with the hash of the pattern set
+    it was computed with, see `chem.filters.hits_to_bitmasks`.
+    Existing columns are left as is.
+
+    Args:
+        connection (sqlite3.Connection): The SQLite connection object.
+    """
+    log.debug(f"Adding '{TABLE_NAME}' table descriptor columns")
+    _add_columns(
+        connection,
+        {
+            "num_atoms": "INTEGER",
+            "num_heavy_atoms": "INTEGER",
+            "num_rot_bonds": "INTEGER",
+            "num_rings": "INTEGER",
+            "reactive_bits": "INTEGER",
+            "reactive_hash": "TEXT",
+        },
+    )
+    cursor = connection.cursor()
+    query = f"""
+        CREATE INDEX IF NOT EXISTS {TABLE_NAME}_target_id_reactive_idx
+        ON {TABLE_NAME} (target_id, reactive_hash, reactive_bits)
+    """
+    cursor.execute(query)
+    connection.commit()
+    log.debug(f"Table '{TABLE_NAME}' descriptor columns added")
@@ -0,0 +1,44 @@
+"""Module to create and manage the 'parent_fragments' table in the database."""
+
+import sqlite3
+
+from logger import get_logger
+
+log = get_logger("DB MGF")
+
+TABLE_NAME = "parent_fragments"
+DECOMPOSED_TABLE_NAME = "decomposed_parents"
+
+
+def create(connection: sqlite3.Connection) -> None:
+    """Creates the 'parent_fragments' and 'decomposed_parents' tables in the database.
+
+    'parent_fragments' links each parent molecule, identified by its
+    counterion-stripped SMILES, to its BRICS fragments for the given decomposition
+    parameters. 'decomposed_parents' records the decomposed parents, including
+    the ones without any fragment.
+
+    Args:
+        connection (sqlite3.Connection): The SQLite connection object.
+    """
+    log.debug(f"Creating '{TABLE_NAME}' table")
+    cursor = connection.cursor()
+    query = f"""
+        CREATE TABLE IF NOT EXISTS {TABLE_NAME} (
+            parent_smiles TEXT,
+            params TEXT,
+            fragment_smiles TEXT,
+            PRIMARY KEY (parent_smiles, params, fragment_smiles)
+        ) WITHOUT ROWID
+    """
+    cursor.execute(query)
+    query = f"""
+        CREATE TABLE IF NOT EXISTS {DECOMPOSED_TABLE_NAME} (
+            parent_smiles TEXT,
+            params TEXT,
+            PRIMARY KEY (parent_smiles, params)
+        ) WITHOUT ROWID
+    """
+    cursor.execute(query)
+    connection.commit()
+    log.debug(f"Table '{TABLE_NAME}' created")
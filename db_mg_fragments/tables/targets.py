@@ -0,0 +1,131 @@
+"""Module to create and manage the 'targets' table in the database."""
+
+import sqlite3
+
+from logger import get_logger
+
+log = get_logger("DB MGF")
+
+TABLE_NAME = "targets"
+MOLS_TABLE_NAME = "mols"
+
+
+def create(connection: sqlite3.Connection) -> None:
+    """Creates the 'targets' table in the database.
+
+    The table holds the number of molecules of each target of the 'mols' table and
+    the Julian day of their last insert or delete, kept up to date by triggers on
+    the 'mols' table.
+
+    Args:
+        connection (sqlite3.Connection): The SQLite connection object.
+    """
+    log.debug(f"Creating '{TABLE_NAME}' table")
+    cursor = connection.cursor()
+    query = f"""
+        CREATE TABLE IF NOT EXISTS {TABLE_NAME} (
+            target_id TEXT PRIMARY KEY,
+            mol_count INTEGER NOT NULL,
+            updated_at REAL
+        )
+    """
+    cursor.execute(query)
+    _create_triggers(cursor)
+    connection.commit()
+    log.debug(f"Table '{TABLE_NAME}' created")
+
+
+def _create_triggers(cursor: sqlite3.Cursor) -> None:
+    """Creates the triggers keeping the 'targets' counts and last change times up to date."""
+    query = f"""
+        CREATE TRIGGER IF NOT EXISTS {MOLS_TABLE_NAME}_insert_{TABLE_NAME}
+        AFTER INSERT ON {MOLS_TABLE_NAME}
+        BEGIN
+            INSERT INTO {TABLE_NAME} (target_id, mol_count, updated_at)
+            VALUES (NEW.target_id, 1, julianday('now'))
+            ON CONFLICT (target_id) DO UPDATE
+            SET mol_count = mol_count + 1, updated_at = julianday('now');
+        END
+    """
+    cursor.execute(query)
+    query = f"""
+        CREATE TRIGGER IF NOT EXISTS {MOLS_TABLE_NAME}_delete_{TABLE_NAME}
+        AFTER DELETE ON {MOLS_TABLE_NAME}
+        BEGIN
+            UPDATE {TABLE_NAME}
+            SET mol_count = mol_count - 1, updated_at = julianday('now')
+            WHERE target_id = OLD.target_id;
+            DELETE FROM {TABLE_NAME}
+            WHERE target_id = OLD.target_id AND mol_count <= 0;
+        END
+    """
+    cursor.execute(query)
+    query = f"""
+        CREATE TRIGGER IF NOT EXISTS {MOLS_TABLE_NAME}_update_{TABLE_NAME}
+        AFTER UPDATE OF target_id ON {MOLS_TABLE_NAME}
+        WHEN OLD.target_id IS NOT NEW.target_id
+        BEGIN
+            UPDATE {TABLE_NAME}
+            SET mol_count = mol_count - 1, updated_at = julianday('now')
+            WHERE target_id = OLD.target_id;
+            DELETE FROM {TABLE_NAME}
+            WHERE target_id = OLD.target_id AND mol_count <= 0;
+            INSERT INTO {TABLE_NAME} (target_id, mol_count, updated_at)
+            VALUES (NEW.target_id, 1, julianday('now'))
+            ON CONFLICT (target_id) DO UPDATE
+            SET mol_count = mol_count + 1, updated_at = julianday('now');
+        END
+    """
+    cursor.execute(query)
+
+
+def add_updated_at(connection: sqlite3.Connection) -> None:
+    """Adds the 'updated_at' column to the 'targets' table and updates its triggers.
+
+    Args:
+        connection (sqlite3.Connection): The SQLite connection object.
+    """
+    log.debug(f"Adding '{TABLE_NAME}' table 'updated_at' column")
+    cursor = connection.cursor()
+    cursor.execute(f"PRAGMA table_info({TABLE_NAME})")
+    if "updated_at" not in {row[1] for row in cursor.fetchall()}:
+        cursor.execute(f"ALTER TABLE {TABLE_NAME} ADD COLUMN updated_at REAL")
+        cursor.execute(f"UPDATE {TABLE_NAME} SET updated_at = julianday('now')")
+    for event in ("insert", "delete", "update"):
+        cursor.execute(f"DROP TRIGGER IF EXISTS {MOLS_TABLE_NAME}_{event}_{TABLE_NAME}")
+    _create_triggers(cursor)
+    connection.commit()
+    log.debug(f"Table '{TABLE_NAME}' 'updated_at' column added")
+
+
+def refresh(connection: sqlite3.Connection) -> None:
+    """Recomputes the 'targets' table from the 'mols' table.
+
+    The last change times are left unset, see `touch`.
+
+    Args:
+        connection (sqlite3.Connection): The SQLite connection object.
+    """
+    log.debug(f"Refreshing '{TABLE_NAME}' table")
+    cursor = connection.cursor()
+    cursor.execute(f"DELETE FROM {TABLE_NAME}")
+    query = f"""
+        INSERT INTO {TABLE_NAME} (target_id, mol_count)
+        SELECT target_id, COUNT(*) FROM {MOLS_TABLE_NAME} GROUP BY target_id
+    """
+    cursor.execute(query)
+    connection.commit()
+    log.debug(f"Table '{TABLE_NAME}' refreshed")
+
+
+def touch(connection: sqlite3.Connection) -> None:
+    """Sets the last change time of all the targets to now.
+
+    Args:
+        connection (sqlite3.Connection): The SQLite connection object.
+    """
+    log.debug(f"Touching '{TABLE_NAME}' table")
+    cursor = connection.cursor()
+    cursor.execute(f"UPDATE {TABLE_NAME} SET updated_at = julianday('now')")
+    connection.commit()
+    log.debug(f"Table '{TABLE_NAME}' touched")
@@ -4,6 +4,25 @@ import os
 
 # --- database settings ---
 DATABASE_NAME = "chembl.db"
+# bytes of the ChEMBL database memory-mapped, capped by the SQLite build limit
+CHEMBL_MMAP_SIZE = 16 * 1024**3
+CHEMBL_CACHE_SIZE_KIB = 256 * 1024  # page cache of each ChEMBL connection
+MGF_CACHE_SIZE_KIB = 64 * 1024  # page cache of each MG Fragments connection
+MGF_BUSY_TIMEOUT = 30  # seconds a MG Fragments connection waits for a lock
+MGF_POOL_SIZE = 4  # released MG Fragments connections kept open for reuse
+
+# --- database import ---
+IMPORT_CHUNK_SIZE = 5000  # molecules inserted per transaction
+IMPORT_N_READERS = 4  # concurrent ChEMBL readers
+IMPORT_QUEUE_SIZE = 8  # chunks buffered between the readers and the writer
+IMPORT_N_PARSERS = None  # molecule parsing processes, None uses all the CPUs
+
+# --- molecule explorer ---
+EXPLORER_CACHE_MAX_TARGETS = 8  # targets whose parsed molecules are kept in memory
+
+# --- reactive screening ---
+SCREENING_N_JOBS = None  # None uses all the available CPUs
+SCREENING_CHUNK_SIZE = 2000  # molecules screened by a worker in a single task
 
 # --- fragments generation ---
 FRAGMENTS_MIN_ATOMS = 5
@@ -13,3 +32,16 @@ FRAGMENTS_MAX_ROTABLE_BONDS = 1
 FRAGMENTS_OUTPUT_DIR = os.path.join("outputs", "fragments")
 FRAGMENTS_TOP_RES = 20
 REACTIVE_PATTERN_FILE = os.path.join("chem", "reactive_patterns.json")
+FRAGMENTS_N_JOBS = None  # None uses all the available CPUs
+FRAGMENTS_CHUNK_SIZE = 200  # molecules decomposed by a worker in a single task
+# molecules with more BRICS bonds are decomposed in a single pass, see brics_from_mol;
+# None always runs the full decomposition
+FRAGMENTS_MAX_BRICS_BONDS = None
+
+# --- clustering ---
+CLUSTERING_N_JOBS = None  # None uses all the available CPUs
+MCS_TIMEOUT = 5  # seconds
+# condensed distance vectors above this size are memory-mapped to a temporary file
+CLUSTERING_MEMMAP_MIN_BYTES = 2 * 1024**3
+CLUSTERING_MEMMAP_DIR = None  # None uses the system temporary directory
+MCS_CACHE_MAX_ENTRIES = 5_000_000
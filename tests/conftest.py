@@ -0,0 +1,98 @@
+"""Shared fixtures of the tests."""
+
+import os
+import random
+import sqlite3
+import sys
+
+import pytest
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(ROOT_DIR)
+
+import db_chembl
+import db_chembl.target_index
+import db_mg_fragments
+
+
+@pytest.fixture
+def mgf_db(tmp_path, monkeypatch):
+    """Use a temporary MG Fragments database, with an empty connection pool."""
+    monkeypatch.setattr(db_mg_fragments, "DB_PATH", str(tmp_path / "mgf.db"))
+    monkeypatch.setattr(db_mg_fragments, "_pool", [])
+    monkeypatch.setattr(db_mg_fragments.migrations, "_migrated", False)
+    yield
+    for connection in db_mg_fragments._pool:
+        connection.close()
+
+
+CHEMBL_SMILES = [
+    "c1ccccc1CC",
+    "c1ccncc1C",
+    "CCOC(=O)C",
+    "C1CCCCC1N",
+    "c1ccc2ccccc2c1",
+    "CC(C)CO.Cl",
+    "c1ccccc1O",
+    "NCCO",
+    "c1cnccn1",
+    "OC(=O)c1ccccc1CCOc1ccccc1",
+]
+
+
+def make_chembl_db(path, n_targets=3, n_assays=12, n_mols=60, n_activities=400):
+    """Create a small ChEMBL database holding the tables of the target lookup."""
+    rng = random.Random(0)
+    connection = sqlite3.connect(path)
+    connection.executescript(
+        """
+        CREATE TABLE target_dictionary (tid INTEGER PRIMARY KEY, chembl_id TEXT);
+        CREATE TABLE assays (assay_id INTEGER PRIMARY KEY, tid INTEGER);
+        CREATE TABLE activities (
+            activity_id INTEGER PRIMARY KEY, assay_id INTEGER, molregno INTEGER
+        );
+        CREATE TABLE molecule_dictionary (molregno INTEGER PRIMARY KEY, chembl_id TEXT);
+        CREATE TABLE compound_structures (
+            molregno INTEGER PRIMARY KEY, canonical_smiles TEXT
+        );
+        """
+    )
+    connection.executemany(
+        "INSERT INTO target_dictionary VALUES (?, ?)",
+        [(tid, f"CHEMBL{tid}") for tid in range(1, n_targets + 1)],
+    )
+    connection.executemany(
+        "INSERT INTO assays VALUES (?, ?)",
+        [(assay_id, assay_id % n_targets + 1) for assay_id in range(1, n_assays + 1)],
+    )
+    connection.executemany(
+        "INSERT INTO molecule_dictionary VALUES (?, ?)",
+        [(molregno, f"CHEMBL{1000 + molregno}") for molregno in range(1, n_mols + 1)],
+    )
+    connection.executemany(
+        "INSERT INTO compound_structures VALUES (?, ?)",
+        [(molregno, rng.choice(CHEMBL_SMILES)) for molregno in range(1, n_mols + 1)],
+    )
+    connection.executemany(
+        "INSERT INTO activities VALUES (?, ?, ?)",
+        [
+            (activity_id, rng.randint(1, n_assays), rng.randint(1, n_mols))
+            for activity_id in range(n_activities)
+        ],
+    )
+    connection.commit()
+    connection.close()
+
+
+@pytest.fixture
+def chembl_db(tmp_path, monkeypatch):
+    """Use a small temporary ChEMBL database, without target index."""
+    db_path = str(tmp_path / "chembl.db")
+    make_chembl_db(db_path)
+    index_path = str(tmp_path / "chembl_target_index.db")
+    for module in (db_chembl, db_chembl.target_index):
+        monkeypatch.setattr(module, "DB_PATH", db_path)
+        monkeypatch.setattr(module, "TARGET_INDEX_DB_PATH", index_path)
+    db_chembl.reset_db_connections()
+    yield db_path
+    db_chembl.reset_db_connections()
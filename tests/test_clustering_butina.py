@@ -0,0 +1,92 @@
+"""Tests of the Taylor-Butina clustering against a square distance matrix reference."""
+
+import numpy as np
+import pytest
+from rdkit.Chem import MolFromSmiles
+from rdkit.DataStructs.cDataStructs import BulkTanimotoSimilarity
+
+from chem.clustering import ClusteringMethod, butina, tanimoto
+
+SCAFFOLDS = ["c1ccccc1{}", "C1CCCCC1{}", "c1ccncc1{}", "O=C(N{})c1ccccc1", "C(C{})O"]
+SUBSTITUENTS = ["C", "O", "N", "Cl", "F", "Br", "CC", "OC", "C(=O)O", "C#N"]
+
+
+@pytest.fixture
+def mol_list():
+    """Get 50 small molecules sharing a few scaffolds."""
+    return [
+        MolFromSmiles(scaffold.format(substituent))
+        for scaffold in SCAFFOLDS
+        for substituent in SUBSTITUENTS
+    ]
+
+
+def square_distance(mol_list):
+    """Compute the square Tanimoto distance matrix of the molecules."""
+    fingerprints = tanimoto.get_fingerprints(mol_list)
+    return 1 - np.array(
+        [BulkTanimotoSimilarity(fp, fingerprints) for fp in fingerprints]
+    )
+
+
+def reference_clusters(dist_matrix, t):
+    """Cluster from the square matrix, the molecules with most neighbors (then lowest index) first."""
+    n = len(dist_matrix)
+    neighbors = [
+        [j for j in range(n) if j != i and dist_matrix[i, j] <= t] for i in range(n)
+    ]
+    order = sorted(range(n), key=lambda i: (-len(neighbors[i]), i))
+    labels = [0] * n
+    centroids = []
+    for i in order:
+        if labels[i]:
+            continue
+        centroids.append(i)
+        for j in [i] + neighbors[i]:
+            labels[j] = labels[j] or len(centroids)
+    return neighbors, labels, centroids
+
+
+@pytest.mark.parametrize("block_pairs", [2**20, 37])
+def test_neighbor_lists_match_square_matrix(mgf_db, mol_list, block_pairs):
+    fingerprints = tanimoto.get_fingerprints(mol_list)
+    for item in butina.neighbor_lists(fingerprints, 0.6, block_pairs=block_pairs):
+        if "result" in item:
+            neighbors = item["result"]
+    expected, _, _ = reference_clusters(square_distance(mol_list), 0.6)
+    assert [list(neighbor) for neighbor in neighbors] == expected
+
+
+def test_butina_clusters_on_neighbor_lists():
+    # 2 has the most neighbors; 0 and 4 tie, and the lowest index wins
+    neighbors = [[1], [0, 2], [1, 3, 5], [2], [5], [2, 4], []]
+    labels, centroid_indices = butina.butina_clusters(
+        [np.array(neighbor, dtype=np.int32) for neighbor in neighbors]
+    )
+    np.testing.assert_array_equal(labels, [2, 1, 1, 1, 3, 1, 4])
+    np.testing.assert_array_equal(centroid_indices, [2, 0, 4, 6])
+
+
+@pytest.mark.parametrize("t", [0.4, 0.6, 0.8])
+def test_butina_labels_match_reference(mgf_db, mol_list, t):
+    for item in butina.hierarchical_clustering(
+        mol_list, ClusteringMethod.DIST.value, t
+    ):
+        if "result" in item:
+            labels = item["result"]
+            centroid_indices = item["context"]["centroid_indices"]
+    _, expected_labels, expected_centroids = reference_clusters(
+        square_distance(mol_list), t
+    )
+    np.testing.assert_array_equal(labels, expected_labels)
+    np.testing.assert_array_equal(centroid_indices, expected_centroids)
+    assert 1 < len(centroid_indices) < len(mol_list)
+
+
+def test_butina_rejects_cluster_count(mol_list):
+    with pytest.raises(ValueError):
+        next(
+            butina.hierarchical_clustering(
+                mol_list, ClusteringMethod.MAX_CLUSTERS.value, 6
+            )
+        )
@@ -0,0 +1,58 @@
+"""Regression tests of the hierarchical clustering on condensed distance vectors."""
+
+import numpy as np
+import pytest
+from rdkit.Chem import MolFromSmiles
+from rdkit.Chem.rdFingerprintGenerator import GetMorganGenerator
+from rdkit.DataStructs.cDataStructs import BulkTanimotoSimilarity
+from scipy.cluster.hierarchy import fcluster, linkage
+from scipy.spatial.distance import squareform
+
+from chem.clustering import ClusteringMethod, tanimoto
+from chem.clustering.distance import condensed_linkage
+
+SCAFFOLDS = ["c1ccccc1{}", "C1CCCCC1{}", "c1ccncc1{}", "O=C(N{})c1ccccc1", "C(C{})O"]
+SUBSTITUENTS = ["C", "O", "N", "Cl", "F", "Br", "CC", "OC", "C(=O)O", "C#N"]
+
+
+@pytest.fixture
+def mol_list():
+    """Get 50 small molecules sharing a few scaffolds."""
+    return [
+        MolFromSmiles(scaffold.format(substituent))
+        for scaffold in SCAFFOLDS
+        for substituent in SUBSTITUENTS
+    ]
+
+
+def reference_labels(mol_list, cluster_method, t):
+    """Cluster the molecules from the square Tanimoto distance matrix."""
+    generator = GetMorganGenerator(
+        radius=tanimoto.FINGERPRINT_RADIUS, fpSize=tanimoto.FINGERPRINT_SIZE
+    )
+    fingerprints = [generator.GetFingerprint(mol) for mol in mol_list]
+    dist_matrix = 1 - np.array(
+        [BulkTanimotoSimilarity(fp, fingerprints) for fp in fingerprints]
+    )
+    np.fill_diagonal(dist_matrix, 0)
+    linkage_matrix = linkage(squareform(dist_matrix), method="average")
+    return fcluster(linkage_matrix, criterion=cluster_method, t=t)
+
+
+@pytest.mark.parametrize(
+    "cluster_method, t",
+    [(ClusteringMethod.DIST.value, 0.6), (ClusteringMethod.MAX_CLUSTERS.value, 6)],
+)
+def test_tanimoto_labels_match_reference(mgf_db, mol_list, cluster_method, t):
+    for item in tanimoto.hierarchical_clustering(mol_list, cluster_method, t):
+        if "result" in item:
+            labels = item["result"]
+    np.testing.assert_array_equal(labels, reference_labels(mol_list, cluster_method, t))
+    assert len(set(labels)) > 1
+
+
+def test_condensed_linkage_rejects_square_matrix():
+    dist_matrix = np.array([[0.0, 0.5, 0.2], [0.5, 0.0, 0.4], [0.2, 0.4, 0.0]])
+    with pytest.raises(ValueError):
+        condensed_linkage(dist_matrix, method="average")
+    assert condensed_linkage(squareform(dist_matrix), method="average").shape == (2, 4)
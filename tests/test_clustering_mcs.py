@@ -0,0 +1,155 @@
+"""Tests of the condensed MCS distance engine against the serial reference."""
+
+import numpy as np
+import pytest
+from rdkit.Chem import MolFromSmiles
+from scipy.cluster.hierarchy import fcluster, linkage
+from scipy.spatial.distance import squareform
+
+import settings
+from chem.clustering import ClusteringMethod, mcs
+
+SMILES = [
+    "c1ccccc1C",
+    "c1ccccc1O",
+    "c1ccncc1C",
+    "C1CCCCC1N",
+    "CCOC(=O)C",
+    "CC(=O)Nc1ccccc1",
+    "OC(=O)c1ccccc1",
+    "c1ccc2ccccc2c1",
+    "NCCO",
+    "ClCCCl",
+    "c1cnccn1",
+    "CC(C)CO",
+]
+
+
+@pytest.fixture
+def fragments():
+    """Get a dozen small molecules of various elements and rings."""
+    return [MolFromSmiles(smiles) for smiles in SMILES]
+
+
+def condensed_distance(fragments, **kwargs):
+    """Run `condensed_mcs_distance`, returning its logs and result."""
+    logs = []
+    for item in mcs.condensed_mcs_distance(fragments, **kwargs):
+        if "log" in item:
+            logs.append(item["log"])
+        elif "result" in item:
+            result = item["result"]
+    return logs, result
+
+
+def partition(labels):
+    """Get the clusters of the labels as sets of indices, whatever their numbering."""
+    return {frozenset(np.flatnonzero(labels == label)) for label in np.unique(labels)}
+
+
+@pytest.mark.parametrize("n_jobs, block_pairs", [(1, 256), (1, 7), (2, 7)])
+def test_condensed_mcs_distance_matches_serial(fragments, n_jobs, block_pairs):
+    _, condensed = condensed_distance(
+        fragments, n_jobs=n_jobs, block_pairs=block_pairs, use_cache=False
+    )
+    np.testing.assert_array_equal(
+        condensed, squareform(mcs.pairwise_mcs_distance(fragments), checks=False)
+    )
+
+
+def test_condensed_mcs_distance_reads_cache(mgf_db, fragments):
+    n_pairs = len(fragments) * (len(fragments) - 1) // 2
+    logs, first = condensed_distance(fragments, n_jobs=1)
+    assert f"🗃️ Cached {n_pairs} new MCS pairs" in logs
+    logs, second = condensed_distance(fragments, n_jobs=1)
+    assert f"🗃️ Found {n_pairs} cached MCS pairs" in logs
+    assert "🗃️ Cached 0 new MCS pairs" in logs
+    np.testing.assert_array_equal(first, second)
+
+    # the cache is keyed by SMILES, so a reordered subset is read back as well
+    subset = fragments[::-2]
+    _, cached = condensed_distance(subset, n_jobs=1)
+    _, computed = condensed_distance(subset, n_jobs=1, use_cache=False)
+    np.testing.assert_array_equal(cached, computed)
+
+
+def test_condensed_mcs_distance_does_not_cache_timeouts(mgf_db, fragments, monkeypatch):
+    find_mcs = mcs.rdFMCS.FindMCS
+    slow = fragments[0]
+
+    class TimedOutResult:
+        """MCS search result stopped by the timeout."""
+
+        numAtoms = 1
+        canceled = True
+
+    def fake_find_mcs(mols, timeout):
+        if any(mol is slow for mol in mols):
+            return TimedOutResult()
+        return find_mcs(mols, timeout=timeout)
+
+    monkeypatch.setattr(mcs.rdFMCS, "FindMCS", fake_find_mcs)
+    n_pairs = len(fragments) * (len(fragments) - 1) // 2
+    n_slow = len(fragments) - 1
+    logs, _ = condensed_distance(fragments, n_jobs=1)
+    assert f"⏱️ {n_slow} MCS searches timed out after {settings.MCS_TIMEOUT}s" in logs
+    assert f"🗃️ Cached {n_pairs - n_slow} new MCS pairs" in logs
+
+    # the timed out pairs are searched again, and cached once complete
+    monkeypatch.setattr(mcs.rdFMCS, "FindMCS", find_mcs)
+    logs, condensed = condensed_distance(fragments, n_jobs=1)
+    assert f"🗃️ Found {n_pairs - n_slow} cached MCS pairs" in logs
+    assert f"🗃️ Cached {n_slow} new MCS pairs" in logs
+    np.testing.assert_array_equal(
+        condensed, squareform(mcs.pairwise_mcs_distance(fragments), checks=False)
+    )
+
+
+@pytest.mark.parametrize("method", mcs.EXACT_PRUNING_LINKAGES)
+@pytest.mark.parametrize("seed", range(5))
+def test_lower_bounds_above_threshold_keep_the_clusters(method, seed):
+    rng = np.random.default_rng(seed)
+    condensed = rng.random(40 * 39 // 2)
+    t = 0.4
+    # the pruned pairs are the ones above t, and get a lower bound still above t
+    pruned = condensed > t
+    bounded = condensed.copy()
+    bounded[pruned] = t + (condensed[pruned] - t) * rng.random(pruned.sum())
+    labels = fcluster(linkage(condensed, method=method), criterion="distance", t=t)
+    pruned_labels = fcluster(linkage(bounded, method=method), criterion="distance", t=t)
+    assert partition(pruned_labels) == partition(labels)
+
+
+def clustering_labels(fragments, *args, **kwargs):
+    """Run `hierarchical_clustering`, returning its logs and labels."""
+    logs = []
+    for item in mcs.hierarchical_clustering(fragments, *args, **kwargs):
+        if "log" in item:
+            logs.append(item["log"])
+        elif "result" in item:
+            labels = item["result"]
+    return logs, labels
+
+
+@pytest.mark.parametrize("method", mcs.EXACT_PRUNING_LINKAGES)
+@pytest.mark.parametrize("t", [0.3, 0.5, 0.7])
+def test_pruned_clusters_match_unpruned(mgf_db, fragments, method, t):
+    logs, labels = clustering_labels(
+        fragments, ClusteringMethod.DIST.value, t, linkage_method=method
+    )
+    assert any(
+        log.startswith("✂️ Pruned") and not log.startswith("✂️ Pruned 0/") for log in logs
+    )
+
+    _, condensed = condensed_distance(fragments, n_jobs=1, use_cache=False)
+    expected = fcluster(linkage(condensed, method=method), criterion="distance", t=t)
+    assert partition(labels) == partition(expected)
+
+
+def test_ward_linkage_is_not_pruned(mgf_db, fragments):
+    logs, labels = clustering_labels(fragments, ClusteringMethod.DIST.value, 0.5)
+    assert not any(log.startswith("✂️ Pruned") for log in logs)
+
+    _, condensed = condensed_distance(fragments, n_jobs=1, use_cache=False)
+    expected = fcluster(linkage(condensed, method="ward"), criterion="distance", t=0.5)
+    np.testing.assert_array_equal(labels, expected)
@@ -0,0 +1,65 @@
+"""Tests of the MG Fragments database connection pool."""
+
+import sqlite3
+import threading
+
+import pytest
+
+import db_mg_fragments
+import settings
+
+
+def in_thread(function):
+    """Run a function in a new thread, returning its result."""
+    results = []
+    thread = threading.Thread(target=lambda: results.append(function()))
+    thread.start()
+    thread.join()
+    return results[0]
+
+
+def test_released_connection_is_reused_across_threads(mgf_db):
+    def query():
+        connection = db_mg_fragments.get_db_connection()
+        connection.execute("SELECT COUNT(*) FROM mols").fetchone()
+        db_mg_fragments.close_db_connection(connection)
+        return connection
+
+    first = in_thread(query)
+    assert in_thread(query) is first
+    assert db_mg_fragments._pool == [first]
+
+
+def test_connections_in_use_are_not_shared(mgf_db):
+    first = db_mg_fragments.get_db_connection()
+    second = in_thread(db_mg_fragments.get_db_connection)
+    assert second is not first
+    db_mg_fragments.close_db_connection(first)
+    db_mg_fragments.close_db_connection(second)
+    # releasing twice does not hand out the same connection twice
+    db_mg_fragments.close_db_connection(second)
+    assert len(db_mg_fragments._pool) == 2
+
+
+def test_release_rolls_back_uncommitted_changes(mgf_db):
+    connection = db_mg_fragments.get_db_connection()
+    connection.execute(
+        "INSERT INTO mols (target_id, chembl_id, canonical_smiles) VALUES (?, ?, ?)",
+        ("CHEMBL1", "CHEMBL1001", "NCCO"),
+    )
+    assert connection.in_transaction
+    db_mg_fragments.close_db_connection(connection)
+
+    connection = db_mg_fragments.get_db_connection()
+    assert connection.execute("SELECT COUNT(*) FROM mols").fetchone()[0] == 0
+    db_mg_fragments.close_db_connection(connection)
+
+
+def test_pool_size_is_bounded(mgf_db, monkeypatch):
+    monkeypatch.setattr(settings, "MGF_POOL_SIZE", 2)
+    connections = [db_mg_fragments.get_db_connection() for _ in range(3)]
+    for connection in connections:
+        db_mg_fragments.close_db_connection(connection)
+    assert db_mg_fragments._pool == connections[:2]
+    with pytest.raises(sqlite3.ProgrammingError):
+        connections[2].execute("SELECT 1")
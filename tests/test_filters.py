@@ -0,0 +1,138 @@
+"""Tests of the reactive pattern screening and of its stored bitmasks."""
+
+import numpy as np
+import pytest
+
+import db_mg_fragments
+import db_mg_fragments.handlers.mols as db_mgf_mols_handlers
+from chem import filters as chem_filters
+from chem import utils as chem_utils
+from db_mg_fragments import importer
+
+SMILES = [
+    "CC=O",
+    "CC(=O)Cl",
+    "C=CC(=O)C",
+    "c1ccccc1C=O",
+    "O=C(Cl)c1ccccc1",
+    "CCOC(=O)C",
+    "NCCO",
+    "c1ccncc1",
+    "CCN=C=O",
+    "CCS(=O)(=O)Cl",
+    "ClCC(=O)N",
+    "C1CO1",
+    "C1CC",
+]
+
+
+@pytest.fixture
+def pattern_set():
+    """Get the reactive patterns of the repository."""
+    return chem_filters.ReactivePatternSet(chem_filters.get_reactive_pattern_list())
+
+
+def chain_pattern_set(n_patterns):
+    """Get a pattern set of carbon chains of growing length."""
+    return chem_filters.ReactivePatternSet(
+        chem_filters.ReactivePattern(name=f"C{k}", smarts="C" * (k % 6 + 1))
+        for k in range(n_patterns)
+    )
+
+
+def run(generator):
+    """Run a screening generator, returning its logs and result."""
+    logs = []
+    for item in generator:
+        if "log" in item:
+            logs.append(item["log"])
+        elif "result" in item:
+            result = item["result"]
+    return logs, result
+
+
+@pytest.mark.parametrize("n_patterns", [1, 8, 62, 63])
+def test_bitmasks_round_trip(n_patterns):
+    hits = np.random.default_rng(n_patterns).random((50, n_patterns)) < 0.5
+    hits[0] = True
+    hits[1] = False
+    bitmasks = chem_filters.hits_to_bitmasks(hits)
+    assert bitmasks[0] == 2**n_patterns - 1
+    assert bitmasks[1] == 0
+    # the bitmasks fit the signed 64-bit integers of SQLite
+    assert all(0 <= bitmask < 2**63 for bitmask in bitmasks)
+    np.testing.assert_array_equal(
+        chem_filters.bitmasks_to_hits(bitmasks, n_patterns), hits
+    )
+
+
+@pytest.mark.parametrize("n_jobs, chunk_size", [(1, 2000), (2, 3), (2, 5)])
+def test_screen_reactive_matches_hit_matrix(pattern_set, n_jobs, chunk_size):
+    mols = [chem_utils.mol_from_smiles(smiles) for smiles in SMILES]
+    # the molecules can be given as Mol, binary pickles, SMILES or None
+    inputs = [
+        [mol, chem_utils.mol_to_pickle(mol) if mol else None, smiles][k % 3]
+        for k, (mol, smiles) in enumerate(zip(mols, SMILES))
+    ] + [None]
+    expected = chem_filters.ReactivePatternSet(pattern_set).hit_matrix(mols + [None])
+    assert 0 < expected.any(axis=1).sum() < len(SMILES)
+    assert not expected[-2:].any()
+
+    _, hits = run(
+        chem_filters.screen_reactive(
+            inputs, pattern_set, n_jobs=n_jobs, chunk_size=chunk_size
+        )
+    )
+    np.testing.assert_array_equal(hits, expected)
+
+
+@pytest.fixture
+def stored_target(mgf_db):
+    """Store the molecules as a parsed target, returning their ChEMBL IDs."""
+    chembl_ids = [f"CHEMBL{1000 + k}" for k in range(len(SMILES))]
+    mols = importer.parse_mols(
+        {"target_id": "CHEMBL1", "chembl_id": chembl_id, "canonical_smiles": smiles}
+        for chembl_id, smiles in zip(chembl_ids, SMILES)
+    )
+    connection = db_mg_fragments.get_db_connection()
+    for _ in db_mgf_mols_handlers.insert_many(connection, mols):
+        pass
+    db_mg_fragments.close_db_connection(connection)
+    return chembl_ids
+
+
+@pytest.mark.parametrize("n_patterns", [None, 63])
+def test_stored_hit_matrix_stores_bitmasks(stored_target, pattern_set, n_patterns):
+    if n_patterns:
+        pattern_set = chain_pattern_set(n_patterns)
+    expected = pattern_set.hit_matrix(
+        chem_utils.mol_from_smiles(smiles) for smiles in SMILES
+    )
+    chembl_ids = stored_target[::-1]
+
+    logs, hits = run(chem_filters.stored_hit_matrix("CHEMBL1", chembl_ids, pattern_set))
+    assert "🗃️ Found 0 screened molecules" in logs
+    np.testing.assert_array_equal(hits, expected[::-1])
+
+    logs, hits = run(chem_filters.stored_hit_matrix("CHEMBL1", chembl_ids, pattern_set))
+    assert f"🗃️ Found {len(SMILES)} screened molecules" in logs
+    np.testing.assert_array_equal(hits, expected[::-1])
+
+    # another pattern set screens the molecules again
+    logs, _ = run(
+        chem_filters.stored_hit_matrix("CHEMBL1", chembl_ids, chain_pattern_set(3))
+    )
+    assert "🗃️ Found 0 screened molecules" in logs
+
+
+def test_stored_hit_matrix_skips_store_above_63_patterns(stored_target):
+    pattern_set = chain_pattern_set(64)
+    expected = pattern_set.hit_matrix(
+        chem_utils.mol_from_smiles(smiles) for smiles in SMILES
+    )
+    for _ in range(2):
+        logs, hits = run(
+            chem_filters.stored_hit_matrix("CHEMBL1", stored_target, pattern_set)
+        )
+        assert not any(log.startswith("🗃️") for log in logs)
+        np.testing.assert_array_equal(hits, expected)
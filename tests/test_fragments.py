@@ -0,0 +1,247 @@
+"""Tests of the BRICS fragmentation engine against a serial reference."""
+
+import numpy as np
+import pytest
+from rdkit.Chem import BRICS, MolFromSmiles, MolToSmiles
+
+import db_mg_fragments
+import db_mg_fragments.handlers.fragments as db_mgf_fragments_handlers
+import settings
+from chem import filters as chem_filters
+from chem import fragments as chem_fragments
+
+SMILES = [
+    "CC(=O)Nc1ccc(OCC(=O)N2CCOCC2)cc1",
+    "O=C(NCc1ccccc1)c1ccc(N2CCNCC2)nc1",
+    "COc1ccc(CN2CCC(NC(=O)c3ccco3)CC2)cc1",
+    "Cc1ccc(S(=O)(=O)N2CCCC2)cc1",
+    "O=C(O)c1ccccc1Oc1ccccc1",
+    "CCOC(=O)c1ccc(NC(=O)C2CC2)cc1",
+    "c1ccc(-c2nc3ccccc3[nH]2)cc1",
+    "CC(C)Nc1nc(N)nc(Cl)n1",
+    "O=C(Nc1ccccc1)N1CCOCC1",
+    "CC(=O)Nc1ccc(OCC(=O)N2CCOCC2)cc1",
+    "c1ccccc1",
+    "CCN(CC)CCOC(=O)c1ccc(N)cc1",
+]
+
+
+@pytest.fixture
+def mol_list():
+    """Get a dozen drug-like molecules, with a duplicate and one without BRICS bond."""
+    return [MolFromSmiles(smiles) for smiles in SMILES] + [None]
+
+
+def reference_fragments(mol_list, fragment_filter=None, **brics_options):
+    """Get the unique fragments of molecules, in order, one molecule at a time."""
+    fragments = {}
+    for mol in mol_list:
+        if mol is None:
+            continue
+        for smiles in chem_fragments.brics_from_mol(mol, **brics_options):
+            frag_mol = MolFromSmiles(smiles)
+            if fragment_filter is None or fragment_filter.accepts(frag_mol):
+                fragments[smiles] = None
+    return list(fragments)
+
+
+def brics_fragments(mol_list, **kwargs):
+    """Run `brics_fragments`, returning its logs, streamed fragments and result."""
+    logs, streamed = [], []
+    for item in chem_fragments.brics_fragments(mol_list, **kwargs):
+        if "log" in item:
+            logs.append(item["log"])
+        if "fragments" in item:
+            streamed.extend(item["fragments"])
+        elif "result" in item:
+            result = item["result"]
+    return logs, streamed, result
+
+
+FILTERS = [
+    None,
+    chem_fragments.FragmentFilter(min_atoms=5),
+    chem_fragments.FragmentFilter(min_atoms=3, max_atoms=12),
+    chem_fragments.FragmentFilter(flexibility=chem_filters.Flexibility.RIGID),
+    chem_fragments.FragmentFilter(
+        max_atoms=20, flexibility=chem_filters.Flexibility.FLEXIBLE, max_rotable_bonds=2
+    ),
+]
+
+
+@pytest.mark.parametrize("fragment_filter", FILTERS)
+@pytest.mark.parametrize("n_jobs, chunk_size", [(1, 200), (1, 3), (2, 3)])
+def test_brics_fragments_match_reference(mol_list, fragment_filter, n_jobs, chunk_size):
+    logs, streamed, result = brics_fragments(
+        mol_list, fragment_filter=fragment_filter, n_jobs=n_jobs, chunk_size=chunk_size
+    )
+    assert result == reference_fragments(mol_list, fragment_filter)
+    assert sorted(streamed) == sorted(result)
+    assert logs[-1] == f"✅ Generated {len(result)} unique fragments"
+
+
+def test_brics_fragments_size_limits(mol_list):
+    _, _, result = brics_fragments(
+        mol_list, min_size=2, max_size=6, n_jobs=2, chunk_size=3
+    )
+    assert result == reference_fragments(mol_list, min_size=2, max_size=6)
+
+
+def run(generator):
+    """Run a fragments generator, returning its result."""
+    for item in generator:
+        if "result" in item:
+            result = item["result"]
+    return result
+
+
+@pytest.fixture
+def parents(mol_list):
+    """Get the (parent SMILES, molecule) pairs of the molecules."""
+    return [(smiles, mol) for smiles, mol in zip(SMILES, mol_list)]
+
+
+@pytest.mark.parametrize("fragment_filter", FILTERS)
+def test_stored_brics_fragments_match_engine(mgf_db, parents, fragment_filter):
+    _, _, expected = brics_fragments(
+        [mol for _, mol in parents], fragment_filter=fragment_filter, n_jobs=1
+    )
+    for _ in range(2):
+        result = run(
+            chem_fragments.stored_brics_fragments(
+                parents, fragment_filter=fragment_filter, n_jobs=1
+            )
+        )
+        assert result == sorted(expected)
+
+
+def test_stored_brics_fragments_use_the_filter_index(mgf_db, parents):
+    run(chem_fragments.stored_brics_fragments(parents, n_jobs=1))
+    fragment_filter = chem_fragments.FragmentFilter(
+        min_atoms=5, flexibility=chem_filters.Flexibility.RIGID
+    )
+    where, args = fragment_filter.sql_where(alias="f")
+    options = chem_fragments._brics_options(1, 0, settings.FRAGMENTS_MAX_BRICS_BONDS)
+
+    statements = []
+    connection = db_mg_fragments.get_db_connection()
+    connection.set_trace_callback(statements.append)
+    db_mgf_fragments_handlers.get_by_parents(
+        connection, SMILES, chem_fragments._brics_params(options), where, args
+    )
+    connection.set_trace_callback(None)
+    (query,) = [
+        statement for statement in statements if "FROM fragments f" in statement
+    ]
+    plan = [row[3] for row in connection.execute(f"EXPLAIN QUERY PLAN {query}")]
+    db_mg_fragments.close_db_connection(connection)
+    assert any(
+        detail.startswith("SEARCH f USING INDEX fragments_num_rot_bonds_num_atoms_idx")
+        for detail in plan
+    )
+    assert not any(detail.startswith("SCAN pf") for detail in plan)
+
+
+@pytest.mark.parametrize("fragment_filter", FILTERS[1:])
+def test_fragment_pool_mask_matches_accepts(mol_list, fragment_filter):
+    smiles_list = reference_fragments(mol_list)
+    frag_mols = [MolFromSmiles(smiles) for smiles in smiles_list]
+    pool = chem_fragments.FragmentPool(
+        [
+            (smiles, *chem_filters.mol_descriptors(frag_mol))
+            for smiles, frag_mol in zip(smiles_list, frag_mols)
+        ]
+    )
+    assert pool.mask(fragment_filter).tolist() == [
+        fragment_filter.accepts(frag_mol) for frag_mol in frag_mols
+    ]
+
+
+@pytest.mark.parametrize("fragment_filter", FILTERS[1:])
+def test_stored_fragment_pool_masks_the_sql_candidates(
+    mgf_db, parents, fragment_filter
+):
+    candidate_filter = chem_fragments.FragmentFilter(
+        flexibility=fragment_filter.flexibility,
+        max_rotable_bonds=fragment_filter.max_rotable_bonds,
+    )
+    pool = run(
+        chem_fragments.stored_fragment_pool(
+            parents, fragment_filter=candidate_filter, n_jobs=1
+        )
+    )
+    assert pool.smiles == run(
+        chem_fragments.stored_brics_fragments(
+            parents, fragment_filter=candidate_filter, n_jobs=1
+        )
+    )
+    indices = np.flatnonzero(pool.mask(fragment_filter))
+    assert [pool.smiles[k] for k in indices] == run(
+        chem_fragments.stored_brics_fragments(
+            parents, fragment_filter=fragment_filter, n_jobs=1
+        )
+    )
+    assert [MolToSmiles(mol) for mol in pool.mols(indices)] == [
+        MolToSmiles(MolFromSmiles(pool.smiles[k])) for k in indices
+    ]
+
+
+def test_filtered_fragments_from_mol_matches_filter(mol_list):
+    fragment_filter = chem_fragments.FragmentFilter(
+        min_atoms=3, max_atoms=20, flexibility=chem_filters.Flexibility.RIGID
+    )
+    for mol in mol_list[:-1]:
+        assert [
+            MolToSmiles(frag_mol)
+            for frag_mol in chem_fragments.filtered_fragments_from_mol(
+                mol, 3, 20, "rigid"
+            )
+        ] == [
+            MolToSmiles(MolFromSmiles(smiles))
+            for smiles in reference_fragments([mol], fragment_filter)
+        ]
+
+
+def n_brics_bonds(mol):
+    """Count the BRICS bonds of a molecule."""
+    return len(list(BRICS.FindBRICSBonds(mol)))
+
+
+@pytest.mark.parametrize("max_bonds", [0, 2, 5, 6])
+def test_max_bonds_threshold(mol_list, max_bonds):
+    for mol in mol_list[:-1]:
+        single_pass = n_brics_bonds(mol) > max_bonds
+        assert chem_fragments.brics_from_mol(
+            mol, max_bonds=max_bonds
+        ) == chem_fragments.brics_from_mol(mol, single_pass=single_pass)
+
+    expected = [
+        smiles
+        for smiles, mol in zip(SMILES, mol_list)
+        if n_brics_bonds(mol) > max_bonds
+    ]
+    message = (
+        f"✂️ {len(set(expected))} molecules with more than {max_bonds} BRICS bonds "
+        "decomposed in a single pass"
+    )
+    for n_jobs in (1, 2):
+        logs, _, _ = brics_fragments(
+            mol_list, max_bonds=max_bonds, n_jobs=n_jobs, chunk_size=3
+        )
+        assert (message in logs) == bool(expected)
+
+        single_pass_parents = []
+        for item in chem_fragments.brics_decompositions(
+            list(zip(SMILES, mol_list)),
+            max_bonds=max_bonds,
+            n_jobs=n_jobs,
+            chunk_size=3,
+        ):
+            single_pass_parents.extend(item.get("single_pass", []))
+        assert sorted(single_pass_parents) == sorted(expected)
+
+
+def test_full_decomposition_by_default(mol_list):
+    logs, _, result = brics_fragments(mol_list, n_jobs=1)
+    assert not any(log.startswith("✂️") for log in logs)
+    assert result == reference_fragments(mol_list)
@@ -0,0 +1,128 @@
+"""Tests of the import pipeline from ChEMBL into the MG Fragments database."""
+
+import sqlite3
+
+import pytest
+
+import db_mg_fragments
+import db_mg_fragments.handlers.mols as db_mgf_mols_handlers
+from chem import filters as chem_filters
+from chem import utils as chem_utils
+from db_mg_fragments import importer
+
+TARGET_IDS = ["CHEMBL1", "CHEMBL2", "CHEMBL3"]
+
+
+def expected_mols(chembl_db_path, target_id):
+    """Get the (ChEMBL ID, SMILES) pairs of a target with a direct join."""
+    connection = sqlite3.connect(chembl_db_path)
+    rows = connection.execute(
+        """
+        SELECT DISTINCT md.chembl_id, cs.canonical_smiles
+        FROM target_dictionary td
+        JOIN assays ass ON ass.tid = td.tid
+        JOIN activities act ON act.assay_id = ass.assay_id
+        JOIN molecule_dictionary md ON md.molregno = act.molregno
+        JOIN compound_structures cs ON cs.molregno = act.molregno
+        WHERE td.chembl_id = ?
+        """,
+        (target_id,),
+    ).fetchall()
+    connection.close()
+    return set(rows)
+
+
+def run(generator):
+    """Run a pipeline generator, returning its logs and result."""
+    logs = []
+    for item in generator:
+        if "log" in item:
+            logs.append(item["log"])
+        elif "result" in item:
+            result = item["result"]
+    return logs, result
+
+
+def test_parse_mols():
+    mols = [
+        {"canonical_smiles": "CC(C)CO.Cl"},
+        {"canonical_smiles": "c1ccccc1O"},
+        {"canonical_smiles": "C1CC"},
+    ]
+    salt, phenol, invalid = importer.parse_mols(mols)
+
+    assert salt["parent_smiles"] == "CC(C)CO"
+    parent = chem_utils.mol_from_pickle(salt["parent_mol_pickle"])
+    assert chem_utils.smiles_from_mol(parent) == "CC(C)CO"
+    assert salt["num_atoms"] == parent.GetNumAtoms() == 5
+    assert chem_utils.mol_from_pickle(salt["mol_pickle"]).GetNumAtoms() == 6
+
+    assert phenol["parent_smiles"] == "c1ccccc1O"
+    assert phenol["mol_pickle"] == phenol["parent_mol_pickle"]
+    assert phenol["num_rings"] == 1
+
+    assert invalid["mol_pickle"] is None and invalid["parent_mol_pickle"] is None
+    assert all(invalid[key] is None for key in chem_filters.Descriptors._fields)
+
+
+@pytest.mark.parametrize("n_readers, n_parsers", [(1, 1), (3, 1), (2, 2)])
+def test_import_targets(mgf_db, chembl_db, n_readers, n_parsers):
+    logs, mol_counts = run(
+        importer.import_targets(
+            TARGET_IDS, n_readers=n_readers, chunk_size=7, n_parsers=n_parsers
+        )
+    )
+
+    for target_id in TARGET_IDS:
+        expected = expected_mols(chembl_db, target_id)
+        assert expected
+        assert mol_counts[target_id] == len(expected)
+        assert any(log.startswith(f"✅ Target ID: {target_id} ") for log in logs)
+
+        rows = list(db_mgf_mols_handlers.get_by_target(target_id))
+        assert {(row["chembl_id"], row["canonical_smiles"]) for row in rows} == expected
+        for row in rows:
+            parent_smiles = chem_utils.remove_counterions_from_smiles(
+                row["canonical_smiles"]
+            )
+            assert row["parent_smiles"] == parent_smiles
+            parent = chem_utils.mol_from_pickle(row["parent_mol_pickle"])
+            assert row["num_atoms"] == parent.GetNumAtoms()
+
+
+def test_import_targets_is_idempotent(mgf_db, chembl_db):
+    run(importer.import_targets(TARGET_IDS, n_parsers=1))
+    run(importer.import_targets(TARGET_IDS[:1], n_parsers=1))
+
+    connection = db_mg_fragments.get_db_connection()
+    n_mols = connection.execute("SELECT COUNT(*) FROM mols").fetchone()[0]
+    db_mg_fragments.close_db_connection(connection)
+    assert n_mols == sum(
+        len(expected_mols(chembl_db, target_id)) for target_id in TARGET_IDS
+    )
+
+
+def test_backfill_parsed_mols(mgf_db, chembl_db):
+    # molecules imported before the parsed columns were added
+    connection = db_mg_fragments.get_db_connection()
+    for _ in db_mgf_mols_handlers.insert_many(
+        connection,
+        [
+            {"target_id": "CHEMBL1", "chembl_id": chembl_id, "canonical_smiles": smiles}
+            for chembl_id, smiles in [
+                ("CHEMBL1001", "CC(C)CO.Cl"),
+                ("CHEMBL1002", "NCCO"),
+            ]
+        ],
+    ):
+        pass
+    assert db_mgf_mols_handlers.count_unparsed(connection) == 2
+
+    logs, n_parsed = run(importer.backfill_parsed_mols(chunk_size=1, n_parsers=1))
+    assert n_parsed == 2
+    assert db_mgf_mols_handlers.count_unparsed(connection) == 0
+    parent_smiles = {
+        row["parent_smiles"] for row in db_mgf_mols_handlers.get_by_target("CHEMBL1")
+    }
+    assert parent_smiles == {"CC(C)CO", "NCCO"}
+    db_mg_fragments.close_db_connection(connection)
@@ -0,0 +1,114 @@
+"""Tests of the schema migrations of existing MG Fragments databases."""
+
+import sqlite3
+
+import pytest
+
+import db_mg_fragments
+import db_mg_fragments.handlers.mols as db_mgf_mols_handlers
+import db_mg_fragments.handlers.targets as db_mgf_targets_handlers
+from db_mg_fragments import importer, migrations
+
+SMILES = [
+    "c1ccccc1CC",
+    "CCOC(=O)C",
+    "CC(C)CO.Cl",
+    "NCCO",
+    "c1ccncc1C",
+    "OC(=O)c1ccccc1",
+]
+MOLS = [
+    {
+        "target_id": f"CHEMBL{k % 3 + 1}",
+        "chembl_id": f"CHEMBL{100 + k}",
+        "canonical_smiles": smiles,
+    }
+    for k, smiles in enumerate(SMILES)
+]
+
+
+def make_db(path, version):
+    """Create a database at a schema version, holding the molecules of `MOLS`."""
+    connection = sqlite3.connect(path)
+    for migration in migrations.MIGRATIONS[:version]:
+        migration(connection)
+    connection.execute(f"PRAGMA user_version = {version}")
+    for mol in MOLS:
+        db_mgf_mols_handlers.insert(connection, mol)
+    connection.close()
+
+
+def schema(connection):
+    """Get the definitions of the tables, indexes and triggers of a database."""
+    rows = connection.execute(
+        "SELECT type, name, sql FROM sqlite_master ORDER BY type, name"
+    )
+    return [tuple(row) for row in rows]
+
+
+@pytest.fixture
+def latest_schema(tmp_path):
+    """Get the schema of a new database migrated to the latest version."""
+    connection = sqlite3.connect(tmp_path / "new.db")
+    for migration in migrations.MIGRATIONS:
+        migration(connection)
+    res = schema(connection)
+    connection.close()
+    return res
+
+
+@pytest.mark.parametrize("version", range(1, len(migrations.MIGRATIONS) + 1))
+def test_migrate_existing_db(mgf_db, latest_schema, version):
+    make_db(db_mg_fragments.DB_PATH, version)
+
+    connection = db_mg_fragments.get_db_connection()
+    assert migrations.get_version(connection) == len(migrations.MIGRATIONS)
+    assert schema(connection) == latest_schema
+    rows = connection.execute(
+        "SELECT target_id, chembl_id, canonical_smiles FROM mols ORDER BY chembl_id"
+    ).fetchall()
+    assert [dict(row) for row in rows] == MOLS
+    db_mg_fragments.close_db_connection(connection)
+
+    assert db_mgf_targets_handlers.get_all() == [
+        {"target_id": target_id, "mol_count": 2}
+        for target_id in ("CHEMBL1", "CHEMBL2", "CHEMBL3")
+    ]
+
+
+def test_migrated_db_is_usable(mgf_db):
+    make_db(db_mg_fragments.DB_PATH, 1)
+    connection = db_mg_fragments.get_db_connection()
+    version = db_mgf_targets_handlers.get_version("CHEMBL1")
+
+    # the molecules imported at v1 are parsed by the backfill, which bumps the
+    # versions of their targets
+    for _ in importer.backfill_parsed_mols(n_parsers=1):
+        pass
+    assert db_mgf_mols_handlers.count_unparsed(connection) == 0
+    parent_smiles = connection.execute(
+        "SELECT parent_smiles FROM mols WHERE chembl_id = 'CHEMBL102'"
+    ).fetchone()[0]
+    assert parent_smiles == "CC(C)CO"
+    assert db_mgf_targets_handlers.get_version("CHEMBL1") != version
+
+    version = db_mgf_targets_handlers.get_version("CHEMBL1")
+    db_mgf_mols_handlers.insert(
+        connection,
+        {"target_id": "CHEMBL1", "chembl_id": "CHEMBL999", "canonical_smiles": "CCN"},
+    )
+    assert db_mgf_targets_handlers.get_version("CHEMBL1")[0] == version[0] + 1
+    db_mg_fragments.close_db_connection(connection)
+
+
+def test_migrations_are_idempotent(tmp_path, latest_schema):
+    path = tmp_path / "old.db"
+    make_db(path, len(migrations.MIGRATIONS))
+    connection = sqlite3.connect(path)
+    for migration in migrations.MIGRATIONS:
+        migration(connection)
+    assert schema(connection) == latest_schema
+    assert connection.execute("SELECT COUNT(*) FROM mols").fetchone()[0] == len(MOLS)
+    (mol_count,) = connection.execute("SELECT SUM(mol_count) FROM targets").fetchone()
+    assert mol_count == len(MOLS)
+    connection.close()
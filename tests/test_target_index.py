@@ -0,0 +1,60 @@
+"""Tests of the ChEMBL target to molecule index."""
+
+import os
+
+import db_chembl
+from db_chembl import target_index
+from db_chembl import utils as db_chembl_utils
+
+TARGET_IDS = ["CHEMBL1", "CHEMBL2", "CHEMBL3", "CHEMBL404"]
+
+
+def target_mols(target_id):
+    """Get the molecules of a target from the connection of the current thread."""
+    connection = db_chembl.get_db_connection()
+    rows = {
+        tuple(row)
+        for row in db_chembl_utils.get_mols_from_target_id(connection, target_id)
+    }
+    db_chembl.close_db_connection(connection)
+    return rows
+
+
+def test_target_index_matches_join(chembl_db):
+    connection = db_chembl.get_db_connection()
+    assert not target_index.is_available(connection)
+    joined = {target_id: target_mols(target_id) for target_id in TARGET_IDS}
+    assert joined["CHEMBL1"] and not joined["CHEMBL404"]
+
+    target_index.build()
+
+    # the build resets the connections, so the index is attached to the next one
+    connection = db_chembl.get_db_connection()
+    assert target_index.is_available(connection)
+    assert not os.path.exists(f"{target_index.TARGET_INDEX_DB_PATH}.tmp")
+    for target_id in TARGET_IDS:
+        assert target_mols(target_id) == joined[target_id]
+
+
+def test_target_index_lookup_is_a_range_scan(chembl_db):
+    target_index.build()
+    connection = db_chembl.get_db_connection()
+    plan = connection.execute(
+        f"""
+        EXPLAIN QUERY PLAN
+        SELECT target_id, chembl_id, canonical_smiles
+        FROM {db_chembl.TARGET_INDEX_SCHEMA}.{target_index.TABLE_NAME}
+        WHERE target_id = ?
+        """,
+        ("CHEMBL1",),
+    ).fetchall()
+    (detail,) = [row["detail"] for row in plan]
+    assert detail.startswith("SEARCH ")
+    assert detail.endswith("USING PRIMARY KEY (target_id=?)")
+
+
+def test_target_index_rebuild(chembl_db):
+    target_index.build()
+    before = target_mols("CHEMBL1")
+    target_index.build()
+    assert target_mols("CHEMBL1") == before